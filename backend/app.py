@@ -8,16 +8,20 @@ import logging
 
 # Import models and routes
 from app.models import db, User, DatabaseConfig
-from app.routes import auth, database_config, invoice, customer, purchase_order, supplier, invoice_copy
+from app.routes import auth, database_config, invoice, customer, purchase_order, supplier, invoice_copy, batch, jobs, item
+from app.utils.uploads import SpooledUploadRequest
 
 def create_app():
     app = Flask(__name__)
+    # Uploads are parsed from memory rather than saved to disk first
+    app.request_class = SpooledUploadRequest
     
     # Configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:////app/data/backoffice.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Largest accepted upload; files are parsed in chunks, so this bounds request size rather than parse memory
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_BYTES', 64 * 1024 * 1024))  # 64MB default
     
     # Initialize extensions
     db.init_app(app)
@@ -40,6 +44,9 @@ def create_app():
     app.register_blueprint(purchase_order.bp, url_prefix='/api/po')
     app.register_blueprint(supplier.bp, url_prefix='/api/supplier')
     app.register_blueprint(invoice_copy.bp, url_prefix='/api/invoice-copy')
+    app.register_blueprint(batch.bp, url_prefix='/api/batch')
+    app.register_blueprint(jobs.bp, url_prefix='/api/jobs')
+    app.register_blueprint(item.bp, url_prefix='/api/item')
     
     # Create tables and run migrations
     with app.app_context():
@@ -45,6 +45,8 @@ class DatabaseConfig(db.Model):
     encrypt_connection = db.Column(db.Boolean, default=True)
     trust_server_certificate = db.Column(db.Boolean, default=True)
     tls_min_protocol = db.Column(db.String(20), nullable=True)  # Optional: 'TLSv1.0', 'TLSv1.1', 'TLSv1.2'
+    # Resolve preview UPCs from a local SQLite copy of Items_tbl
+    catalog_mirror_enabled = db.Column(db.Boolean, default=False)
     
     def __repr__(self):
         return f'<DatabaseConfig {self.name}>'
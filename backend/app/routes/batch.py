@@ -0,0 +1,58 @@
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from flask_login import login_required, current_user
+import json
+from app.services.service_registry import get_database_service
+from app.services.batch_import_service import BatchImportService, BATCH_TRANSACTION_GROUP_SIZE, BATCH_MAX_DOCUMENTS
+
+bp = Blueprint('batch', __name__)
+
+@bp.route('/import', methods=['POST'])
+@login_required
+def import_batch():
+    """Create many invoices / purchase orders from an NDJSON body, streaming one result line per document"""
+    try:
+        database_config_id = request.args.get('database_config_id')
+
+        if not database_config_id:
+            return jsonify({'error': 'Database configuration ID is required'}), 400
+
+        try:
+            group_size = int(request.args.get('group_size', BATCH_TRANSACTION_GROUP_SIZE))
+        except ValueError:
+            return jsonify({'error': 'group_size must be an integer'}), 400
+
+        if group_size < 1:
+            return jsonify({'error': 'group_size must be at least 1'}), 400
+
+        # Get database service (cached per user and config)
+        db_service = get_database_service(current_user.id, database_config_id)
+
+        if not db_service:
+            return jsonify({'error': 'Database configuration not found'}), 404
+
+        batch_service = BatchImportService(db_service)
+        # The body is read line by line rather than loaded whole
+        documents, errors = batch_service.parse(request.stream, BATCH_MAX_DOCUMENTS)
+
+        if not documents and not errors:
+            return jsonify({'error': 'No documents provided'}), 400
+
+        if len(documents) + len(errors) > BATCH_MAX_DOCUMENTS:
+            return jsonify({'error': f'A batch may contain at most {BATCH_MAX_DOCUMENTS} documents'}), 400
+
+        current_app.logger.info(f"Batch import: {len(documents)} documents, {len(errors)} invalid lines, group size {group_size}")
+
+        def generate():
+            for result in batch_service.run(documents, errors, group_size):
+                yield json.dumps(result, default=str) + '\n'
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            # Let nginx pass result lines through as they are produced
+            headers={'X-Accel-Buffering': 'no'}
+        )
+
+    except Exception as e:
+        current_app.logger.error(f"Error starting batch import: {e}")
+        return jsonify({'error': 'Failed to start batch import', 'details': str(e)}), 500
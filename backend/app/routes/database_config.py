@@ -2,7 +2,12 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from app.models import db, DatabaseConfig
 from app.services.database_service import DatabaseService
+from app.services.service_registry import get_database_service, invalidate_config
+from app.services.circuit_breaker import get_health
+from app.services.catalog_mirror import get_mirror
+from app.services.item_cache import item_cache
 from datetime import datetime
+import threading
 
 bp = Blueprint('database_config', __name__)
 
@@ -26,12 +31,35 @@ def get_database_configs():
                 'encrypt_connection': getattr(config, 'encrypt_connection', True),
                 'trust_server_certificate': getattr(config, 'trust_server_certificate', True),
                 'tls_min_protocol': getattr(config, 'tls_min_protocol', None),
-                'has_password': bool(config.password)  # Indicate if password exists
+                'catalog_mirror_enabled': bool(getattr(config, 'catalog_mirror_enabled', False)),
+                'has_password': bool(config.password),  # Indicate if password exists
+                'health': get_health(config.id)
             } for config in configs]
         }), 200
     except Exception as e:
         return jsonify({'error': 'Failed to get database configs', 'details': str(e)}), 500
 
+@bp.route('/configs/health', methods=['GET'])
+@login_required
+def get_database_health():
+    """Cached reachability of each SQL Server target, without contacting any of them"""
+    try:
+        configs = DatabaseConfig.query.filter_by(user_id=current_user.id).all()
+        return jsonify({
+            'health': {str(config.id): get_health(config.id) for config in configs}
+        }), 200
+    except Exception as e:
+        return jsonify({'error': 'Failed to get database health', 'details': str(e)}), 500
+
+@bp.route('/item-cache', methods=['GET'])
+@login_required
+def get_item_cache_stats():
+    """Hit/miss counters for the in-process UPC lookup cache"""
+    try:
+        return jsonify({'item_cache': item_cache.stats()}), 200
+    except Exception as e:
+        return jsonify({'error': 'Failed to get item cache stats', 'details': str(e)}), 500
+
 @bp.route('/configs', methods=['POST'])
 @login_required
 def create_database_config():
@@ -68,7 +96,8 @@ def create_database_config():
             driver=data.get('driver', 'ODBC Driver 18 for SQL Server').strip(),
             encrypt_connection=data.get('encrypt_connection', True),
             trust_server_certificate=data.get('trust_server_certificate', True),
-            tls_min_protocol=data.get('tls_min_protocol', None)
+            tls_min_protocol=data.get('tls_min_protocol', None),
+            catalog_mirror_enabled=bool(data.get('catalog_mirror_enabled', False))
         )
         
         db.session.add(config)
@@ -109,6 +138,8 @@ def update_database_config(config_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
+        old_target = (config.server, config.port, config.database)
+        
         # Update fields
         if 'name' in data and data['name'].strip():
             # Check if new name conflicts with existing configs
@@ -154,8 +185,16 @@ def update_database_config(config_id):
         if 'tls_min_protocol' in data:
             config.tls_min_protocol = data.get('tls_min_protocol', None)
         
+        if 'catalog_mirror_enabled' in data:
+            config.catalog_mirror_enabled = bool(data['catalog_mirror_enabled'])
+        
         db.session.commit()
         
+        # Drop the cached service and pooled connections built from the old settings;
+        # the catalog mirror only goes if it now points at a different database
+        target_changed = old_target != (config.server, config.port, config.database)
+        invalidate_config(config_id, drop_catalog=target_changed or not config.catalog_mirror_enabled)
+        
         return jsonify({
             'message': 'Database configuration updated successfully',
             'config': {
@@ -191,6 +230,8 @@ def delete_database_config(config_id):
         db.session.delete(config)
         db.session.commit()
         
+        invalidate_config(config_id, drop_catalog=True)
+        
         return jsonify({'message': 'Database configuration deleted successfully'}), 200
         
     except Exception as e:
@@ -230,4 +271,53 @@ def test_database_config(config_id):
             }), 400
             
     except Exception as e:
-        return jsonify({'error': 'Failed to test database connection', 'details': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to test database connection', 'details': str(e)}), 500
+
+@bp.route('/configs/<int:config_id>/catalog', methods=['GET'])
+@login_required
+def get_catalog_status(config_id):
+    """Status of the local catalog mirror for a config"""
+    try:
+        config = DatabaseConfig.query.filter_by(
+            id=config_id,
+            user_id=current_user.id
+        ).first()
+        
+        if not config:
+            return jsonify({'error': 'Database configuration not found'}), 404
+        
+        status = get_mirror(config_id).status()
+        status['enabled'] = bool(config.catalog_mirror_enabled)
+        return jsonify({'catalog': status}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get catalog status', 'details': str(e)}), 500
+
+@bp.route('/configs/<int:config_id>/catalog/sync', methods=['POST'])
+@login_required
+def sync_catalog(config_id):
+    """Start a catalog mirror sync in the background; {"full": true} rebuilds every block"""
+    try:
+        db_service = get_database_service(current_user.id, config_id)
+        if not db_service:
+            return jsonify({'error': 'Database configuration not found'}), 404
+        
+        if not db_service.config.catalog_mirror_enabled:
+            return jsonify({'error': 'Catalog mirror is not enabled for this configuration'}), 400
+        
+        mirror = get_mirror(config_id)
+        if mirror.status()['syncing']:
+            return jsonify({'message': 'Catalog sync already in progress', 'catalog': mirror.status()}), 202
+        
+        data = request.get_json(silent=True) or {}
+        threading.Thread(
+            target=mirror.sync,
+            args=(db_service, bool(data.get('full', False))),
+            name=f'catalog-sync-{config_id}',
+            daemon=True
+        ).start()
+        
+        return jsonify({'message': 'Catalog sync started', 'catalog': mirror.status()}), 202
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to start catalog sync', 'details': str(e)}), 500
@@ -1,8 +1,11 @@
+import asyncio
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
-from app.models import DatabaseConfig
-from app.services.database_service import DatabaseService
+from app.services.service_registry import get_database_service
+from app.services.async_database_service import AsyncDatabaseService
 from app.services.invoice_copy_service import InvoiceCopyService
+from app.services.job_queue import job_queue, JobError, SUCCEEDED
+from app.services.preview_store import preview_store, slim_preview
 
 bp = Blueprint('invoice_copy', __name__)
 
@@ -15,15 +18,10 @@ def get_invoices_list(config_id):
         per_page = request.args.get('per_page', 25, type=int)
         search = request.args.get('search', '').strip() or None
 
-        db_config = DatabaseConfig.query.filter_by(
-            id=config_id,
-            user_id=current_user.id
-        ).first()
+        db_service = get_database_service(current_user.id, config_id)
 
-        if not db_config:
+        if not db_service:
             return jsonify({'error': 'Database configuration not found'}), 404
-
-        db_service = DatabaseService(db_config)
         success, result, message = db_service.get_invoices_list(page, per_page, search)
 
         if not success:
@@ -45,15 +43,10 @@ def get_invoices_list(config_id):
 @login_required
 def get_invoice_detail(config_id, invoice_id):
     try:
-        db_config = DatabaseConfig.query.filter_by(
-            id=config_id,
-            user_id=current_user.id
-        ).first()
+        db_service = get_database_service(current_user.id, config_id)
 
-        if not db_config:
+        if not db_service:
             return jsonify({'error': 'Database configuration not found'}), 404
-
-        db_service = DatabaseService(db_config)
         success, result, message = db_service.get_invoice_with_details(invoice_id)
 
         if not success:
@@ -73,7 +66,7 @@ def get_invoice_detail(config_id, invoice_id):
 
 @bp.route('/prepare', methods=['POST'])
 @login_required
-def prepare_copy():
+async def prepare_copy():
     try:
         data = request.get_json()
 
@@ -88,24 +81,25 @@ def prepare_copy():
         if not all([source_config_id, source_invoice_id, dest_config_id, customer_id]):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        source_config = DatabaseConfig.query.filter_by(
-            id=source_config_id,
-            user_id=current_user.id
-        ).first()
-        dest_config = DatabaseConfig.query.filter_by(
-            id=dest_config_id,
-            user_id=current_user.id
-        ).first()
+        source_db = get_database_service(current_user.id, source_config_id)
+        dest_db = get_database_service(current_user.id, dest_config_id)
 
-        if not source_config:
+        if not source_db:
             return jsonify({'error': 'Source database configuration not found'}), 404
-        if not dest_config:
+        if not dest_db:
             return jsonify({'error': 'Destination database configuration not found'}), 404
 
-        source_db = DatabaseService(source_config)
-        dest_db = DatabaseService(dest_config)
+        source_async = AsyncDatabaseService(source_db)
+        dest_async = AsyncDatabaseService(dest_db)
+
+        # The source invoice, destination customer and next number are independent lookups
+        source_result, customer_result, next_number_result = await asyncio.gather(
+            source_async.get_invoice_with_details(source_invoice_id),
+            dest_async.get_customer_by_id(int(customer_id)),
+            dest_async.get_next_invoice_number()
+        )
 
-        success, source_data, message = source_db.get_invoice_with_details(source_invoice_id)
+        success, source_data, message = source_result
         if not success:
             return jsonify({'error': f'Failed to get source invoice: {message}'}), 404
 
@@ -116,15 +110,15 @@ def prepare_copy():
         if not upcs:
             return jsonify({'error': 'Source invoice has no line items with UPCs'}), 400
 
-        success, dest_items, message = dest_db.get_items_by_upcs(upcs)
+        success, dest_items, message = await dest_async.get_items_by_upcs(upcs, 'copy')
         if not success:
             return jsonify({'error': f'Failed to look up items in destination: {message}'}), 500
 
-        success, customer_data, message = dest_db.get_customer_by_id(int(customer_id))
+        success, customer_data, message = customer_result
         if not success:
             return jsonify({'error': f'Customer not found in destination: {message}'}), 404
 
-        success, next_number, message = dest_db.get_next_invoice_number()
+        success, next_number, message = next_number_result
         if not success:
             return jsonify({'error': f'Failed to get next invoice number: {message}'}), 500
 
@@ -141,9 +135,13 @@ def prepare_copy():
                 'missing_upcs': missing_upcs
             }), 400
 
+        # Full lines stay server-side; the browser gets what it renders plus a token for /create
+        preview_token = preview_store.put(current_user.id, dest_db.config.id, 'invoice_copy', preview)
+
         return jsonify({
             'success': True,
-            'preview': preview,
+            'preview': slim_preview(preview),
+            'preview_token': preview_token,
             'missing_upcs': missing_upcs,
             'customer': {
                 'id': customer_data['CustomerID'],
@@ -174,33 +172,66 @@ def create_copied_invoice():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
 
-        dest_config_id = data.get('dest_config_id')
-        invoice_data = data.get('invoice_data')
-        invoice_details = data.get('invoice_details')
-
-        if not all([dest_config_id, invoice_data, invoice_details]):
-            return jsonify({'error': 'Missing required data'}), 400
-
-        db_config = DatabaseConfig.query.filter_by(
-            id=dest_config_id,
-            user_id=current_user.id
-        ).first()
-
-        if not db_config:
+        preview_token = data.get('preview_token')
+
+        if preview_token:
+            # The preview was kept server-side at upload; only header edits come back
+            success, entry, message = preview_store.get(preview_token, current_user.id, 'invoice_copy')
+            if not success:
+                return jsonify({'error': message}), 404
+            try:
+                invoice_data = preview_store.header(entry, data.get('edits'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            invoice_details = entry['preview']['lines']
+            dest_config_id = entry['config_id']
+        else:
+            dest_config_id = data.get('dest_config_id')
+            invoice_data = data.get('invoice_data')
+            invoice_details = data.get('invoice_details')
+
+            if not all([dest_config_id, invoice_data, invoice_details]):
+                return jsonify({'error': 'Missing required data'}), 400
+
+        db_service = get_database_service(current_user.id, dest_config_id)
+
+        if not db_service:
             return jsonify({'error': 'Database configuration not found'}), 404
 
-        db_service = DatabaseService(db_config)
-        success, invoice_id, message = db_service.create_invoice(invoice_data, invoice_details)
-
-        if not success:
-            return jsonify({'error': message}), 500
+        # Commit in the background so a slow SQL Server does not hold this request;
+        # the client polls /api/jobs/<job_id> for the outcome
+        def commit():
+            # Previews may come from the item cache or catalog mirror; confirm the items live before writing
+            verified, stale_upcs, message = db_service.verify_items_live(invoice_details)
+            if not verified:
+                raise JobError(message)
+            if stale_upcs:
+                raise JobError(
+                    'Some items changed since the preview was built. Please upload the file again.',
+                    {'stale_upcs': stale_upcs}
+                )
+
+            invoice_id, message = db_service.commit_invoice(invoice_data, invoice_details)
+            return {
+                'success': True,
+                'message': message,
+                'invoice_id': invoice_id,
+                'invoice_number': invoice_data['invoice_number']
+            }
+
+        if preview_token and not preview_store.claim(preview_token):
+            return jsonify({'error': 'This preview is already being created'}), 409
+
+        # The preview is dropped once the document exists, or may exist after a commit whose outcome
+        # is unknown, and released again only if the commit definitely failed
+        on_finish = (lambda job: preview_store.finish(preview_token, job.status == SUCCEEDED or job.outcome_unknown)) if preview_token else None
+        job = job_queue.submit(current_user.id, db_service.config.id, 'invoice_copy', commit, on_finish)
 
         return jsonify({
             'success': True,
-            'message': message,
-            'invoice_id': invoice_id,
-            'invoice_number': invoice_data['invoice_number']
-        }), 201
+            'job_id': job.id,
+            'status': job.status
+        }), 202
 
     except Exception as e:
         current_app.logger.error(f"Error creating copied invoice: {e}")
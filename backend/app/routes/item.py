@@ -0,0 +1,49 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+from app.services.service_registry import get_database_service
+
+bp = Blueprint('item', __name__)
+
+@bp.route('/ext-descriptions', methods=['POST'])
+@login_required
+def get_ext_descriptions():
+    """Fetch extended (ntext) descriptions for specific items on demand"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        database_config_id = data.get('database_config_id')
+        product_ids = data.get('product_ids', [])
+        
+        if not database_config_id:
+            return jsonify({'error': 'Database configuration ID is required'}), 400
+        
+        if not product_ids:
+            return jsonify({'error': 'No product IDs provided'}), 400
+        
+        try:
+            product_ids = [int(product_id) for product_id in product_ids]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Product IDs must be integers'}), 400
+        
+        # Get database service (cached per user and config)
+        db_service = get_database_service(current_user.id, database_config_id)
+        
+        if not db_service:
+            return jsonify({'error': 'Database configuration not found'}), 404
+        
+        success, descriptions, message = db_service.get_item_ext_descriptions(product_ids)
+        
+        if not success:
+            return jsonify({'error': message}), 500
+        
+        return jsonify({
+            'success': True,
+            'ext_descriptions': {str(product_id): text for product_id, text in descriptions.items()}
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error getting extended descriptions: {e}")
+        return jsonify({'error': 'Failed to get extended descriptions', 'details': str(e)}), 500
@@ -0,0 +1,24 @@
+from flask import Blueprint, jsonify, current_app
+from flask_login import login_required, current_user
+from app.services.job_queue import job_queue
+
+bp = Blueprint('jobs', __name__)
+
+@bp.route('/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Status of a background commit job"""
+    try:
+        job = job_queue.get(job_id, current_user.id)
+
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'job': job
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Error getting job {job_id}: {e}")
+        return jsonify({'error': 'Failed to get job status', 'details': str(e)}), 500
@@ -2,23 +2,27 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import pandas as pd
-import os
+import asyncio
 from datetime import datetime
-from app.models import DatabaseConfig
-from app.services.database_service import DatabaseService
-from app.services.excel_service import ExcelService
+from app.services.service_registry import get_database_service
+from app.services.async_database_service import AsyncDatabaseService, run_blocking
+from app.services.upload_pipeline import UploadPipeline, ItemLookupError
+from app.services.parse_pool import ParseBusyError
 from app.services.purchase_order_service import PurchaseOrderService
+from app.services.job_queue import job_queue, JobError, SUCCEEDED
+from app.services.preview_store import preview_store, slim_preview
+from app.utils.upc import UpcIndex
 
 bp = Blueprint('purchase_order', __name__)
 
-ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv', 'tsv'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @bp.route('/upload', methods=['POST'])
 @login_required
-def upload_excel():
+async def upload_excel():
     """Upload and process Excel file for purchase order creation"""
     try:
         current_app.logger.info("Starting Excel upload process for purchase order")
@@ -48,42 +52,46 @@ def upload_excel():
         
         if not allowed_file(file.filename):
             current_app.logger.error(f"File type not allowed: {file.filename}")
-            return jsonify({'error': 'File type not allowed. Please upload .xlsx or .xls files'}), 400
+            return jsonify({'error': 'File type not allowed. Please upload .xlsx, .xls, .csv or .tsv files'}), 400
         
-        # Get database configuration
-        db_config = DatabaseConfig.query.filter_by(
-            id=database_config_id,
-            user_id=current_user.id
-        ).first()
+        # Get database service (cached per user and config)
+        db_service = get_database_service(current_user.id, database_config_id)
         
-        if not db_config:
+        if not db_service:
             current_app.logger.error(f"Database configuration not found: {database_config_id}")
             return jsonify({'error': 'Database configuration not found'}), 404
         
-        # Save uploaded file temporarily
+        # Parse the upload straight from its spooled request buffer (nothing is written under a shared name)
         filename = secure_filename(file.filename)
-        filepath = os.path.join('/tmp', filename)
-        file.save(filepath)
-        current_app.logger.info(f"File saved to: {filepath}")
+        current_app.logger.info(f"Received upload: {filename}")
         
         try:
-            # Process Excel file
-            current_app.logger.info("Processing Excel file")
-            excel_service = ExcelService()
-            success, excel_data, message = excel_service.process_excel_file(filepath)
+            # Stream the file in chunks, looking up each chunk's items while the next is parsed,
+            # with the supplier and next PO number queries in flight alongside
+            current_app.logger.info(f"Processing Excel file and getting supplier data for ID: {supplier_id}")
+            po_service = PurchaseOrderService(db_service)
+            pipeline = UploadPipeline(db_service, 'purchase_order')
+            async_db = AsyncDatabaseService(db_service)
+            try:
+                (success, built, rejected_rows, message), supplier_result, next_number_result = await asyncio.gather(
+                    run_blocking(pipeline.run, file.stream, filename, po_service.build_lines),
+                    async_db.get_supplier_by_id(int(supplier_id)),
+                    async_db.get_next_po_number()
+                )
+            except ItemLookupError as e:
+                current_app.logger.error(f"Database query failed: {e}")
+                return jsonify({'error': str(e)}), 500
+            except ParseBusyError as e:
+                current_app.logger.warning(f"Upload turned away: {e}")
+                return jsonify({'error': str(e)}), 503
             
             if not success:
                 current_app.logger.error(f"Excel processing failed: {message}")
-                return jsonify({'error': message}), 400
-            
-            current_app.logger.info(f"Excel processed successfully: {len(excel_data)} rows")
+                return jsonify({'error': message, 'rejected_rows': rejected_rows}), 400
             
-            # Get database service
-            db_service = DatabaseService(db_config)
+            current_app.logger.info(f"Excel processed successfully: {message}")
             
-            # Get supplier data
-            current_app.logger.info(f"Getting supplier data for ID: {supplier_id}")
-            success, supplier_data, message = db_service.get_supplier_by_id(int(supplier_id))
+            success, supplier_data, message = supplier_result
             
             if not success:
                 current_app.logger.error(f"Supplier query failed: {message}")
@@ -91,33 +99,12 @@ def upload_excel():
             
             current_app.logger.info(f"Found supplier: {supplier_data.get('BusinessName', 'N/A')}")
             
-            # Extract UPCs from Excel data (clean them first)
-            upcs = []
-            for row in excel_data:
-                if row['UPC']:
-                    upc = str(row['UPC']).strip()
-                    # Remove period and everything after it (Excel formatting artifacts)
-                    if '.' in upc:
-                        upc = upc.split('.')[0]
-                    upcs.append(upc)
-            current_app.logger.info(f"Extracted {len(upcs)} UPCs: {upcs[:5]}...")  # Log first 5 UPCs
-            
-            # Get items from database
-            current_app.logger.info("Querying database for items")
-            success, items, message = db_service.get_items_by_upcs(upcs)
-            
-            if not success:
-                current_app.logger.error(f"Database query failed: {message}")
-                return jsonify({'error': message}), 500
-            
-            current_app.logger.info(f"Found {len(items)} items in database")
-            
-            # Create purchase order service
-            po_service = PurchaseOrderService(db_service)
+            # A failed prefetch falls back to querying inside the service
+            next_number = next_number_result[1] if next_number_result[0] else None
             
             # Process purchase order data
             current_app.logger.info("Processing purchase order data")
-            success, po_preview, missing_upcs, message = po_service.process_excel_data(excel_data, items, supplier_data)
+            success, po_preview, missing_upcs, message = po_service.build_preview(*built, supplier_data, next_number)
             
             if not success:
                 current_app.logger.error(f"Purchase order processing failed: {message}")
@@ -125,12 +112,17 @@ def upload_excel():
             
             current_app.logger.info(f"Purchase order preview created successfully: {message}")
             
+            # Full lines stay server-side; the browser gets what it renders plus a token for /create
+            preview_token = preview_store.put(current_user.id, db_service.config.id, 'purchase_order', po_preview)
+            
             # Return preview data
             return jsonify({
                 'success': True,
                 'message': message,
-                'preview': po_preview,
+                'preview': slim_preview(po_preview),
+                'preview_token': preview_token,
                 'missing_upcs': missing_upcs,
+                'rejected_rows': rejected_rows,
                 'supplier': {
                     'id': supplier_data['SupplierID'],
                     'account_no': supplier_data['AccountNo'],
@@ -139,16 +131,14 @@ def upload_excel():
                     'state': supplier_data.get('State', '')
                 },
                 'database_config': {
-                    'id': db_config.id,
-                    'name': db_config.name
+                    'id': db_service.config.id,
+                    'name': db_service.config.name
                 }
             }), 200
             
         finally:
-            # Clean up temp file
-            if os.path.exists(filepath):
-                os.unlink(filepath)
-                current_app.logger.info(f"Cleaned up temp file: {filepath}")
+            # Release the upload buffer (and its temp file if it spilled to disk)
+            file.close()
             
     except Exception as e:
         current_app.logger.error(f"Unexpected error in Excel upload: {str(e)}", exc_info=True)
@@ -164,37 +154,67 @@ def create_purchase_order():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        database_config_id = data.get('database_config_id')
-        po_data = data.get('po_data')
-        po_details = data.get('po_details')
+        preview_token = data.get('preview_token')
         
-        if not all([database_config_id, po_data, po_details]):
-            return jsonify({'error': 'Missing required data'}), 400
-        
-        # Get database configuration
-        db_config = DatabaseConfig.query.filter_by(
-            id=database_config_id,
-            user_id=current_user.id
-        ).first()
-        
-        if not db_config:
+        if preview_token:
+            # The preview was kept server-side at upload; only header edits come back
+            success, entry, message = preview_store.get(preview_token, current_user.id, 'purchase_order')
+            if not success:
+                return jsonify({'error': message}), 404
+            try:
+                po_data = preview_store.header(entry, data.get('edits'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            po_details = entry['preview']['lines']
+            database_config_id = entry['config_id']
+        else:
+            database_config_id = data.get('database_config_id')
+            po_data = data.get('po_data')
+            po_details = data.get('po_details')
+        
+            if not all([database_config_id, po_data, po_details]):
+                return jsonify({'error': 'Missing required data'}), 400
+        
+        # Get database service (cached per user and config)
+        db_service = get_database_service(current_user.id, database_config_id)
+        
+        if not db_service:
             return jsonify({'error': 'Database configuration not found'}), 404
         
-        # Get database service
-        db_service = DatabaseService(db_config)
+        # Commit in the background so a slow SQL Server does not hold this request;
+        # the client polls /api/jobs/<job_id> for the outcome
+        def commit():
+            # Previews may come from the item cache or catalog mirror; confirm the items live before writing
+            verified, stale_upcs, message = db_service.verify_items_live(po_details)
+            if not verified:
+                raise JobError(message)
+            if stale_upcs:
+                raise JobError(
+                    'Some items changed since the preview was built. Please upload the file again.',
+                    {'stale_upcs': stale_upcs}
+                )
+            
+            po_id, message = db_service.commit_purchase_order(po_data, po_details)
+            return {
+                'success': True,
+                'message': message,
+                'po_id': po_id,
+                'po_number': po_data['po_number']
+            }
         
-        # Create purchase order
-        success, po_id, message = db_service.create_purchase_order(po_data, po_details)
+        if preview_token and not preview_store.claim(preview_token):
+            return jsonify({'error': 'This preview is already being created'}), 409
         
-        if not success:
-            return jsonify({'error': message}), 500
+        # The preview is dropped once the document exists, or may exist after a commit whose outcome
+        # is unknown, and released again only if the commit definitely failed
+        on_finish = (lambda job: preview_store.finish(preview_token, job.status == SUCCEEDED or job.outcome_unknown)) if preview_token else None
+        job = job_queue.submit(current_user.id, db_service.config.id, 'purchase_order', commit, on_finish)
         
         return jsonify({
             'success': True,
-            'message': message,
-            'po_id': po_id,
-            'po_number': po_data['po_number']
-        }), 201
+            'job_id': job.id,
+            'status': job.status
+        }), 202
         
     except Exception as e:
         current_app.logger.error(f"Error creating purchase order: {e}")
@@ -205,18 +225,12 @@ def create_purchase_order():
 def get_next_po_number(database_config_id):
     """Get next purchase order number for a database"""
     try:
-        # Get database configuration
-        db_config = DatabaseConfig.query.filter_by(
-            id=database_config_id,
-            user_id=current_user.id
-        ).first()
+        # Get database service (cached per user and config)
+        db_service = get_database_service(current_user.id, database_config_id)
         
-        if not db_config:
+        if not db_service:
             return jsonify({'error': 'Database configuration not found'}), 404
         
-        # Get database service
-        db_service = DatabaseService(db_config)
-        
         # Get next purchase order number
         success, next_number, message = db_service.get_next_po_number()
         
@@ -252,35 +266,37 @@ def validate_upcs():
         if not upcs:
             return jsonify({'error': 'No UPCs provided'}), 400
         
-        # Get database configuration
-        db_config = DatabaseConfig.query.filter_by(
-            id=database_config_id,
-            user_id=current_user.id
-        ).first()
+        # Get database service (cached per user and config)
+        db_service = get_database_service(current_user.id, database_config_id)
         
-        if not db_config:
+        if not db_service:
             return jsonify({'error': 'Database configuration not found'}), 404
         
-        # Get database service
-        db_service = DatabaseService(db_config)
-        
         # Get items from database
-        success, items, message = db_service.get_items_by_upcs(upcs)
+        success, items, message = db_service.get_items_by_upcs(upcs, 'validate')
         
         if not success:
             return jsonify({'error': message}), 500
         
-        # Find missing UPCs
-        found_upcs = {item['ProductUPC'] for item in items}
-        missing_upcs = [upc for upc in upcs if upc not in found_upcs]
+        # Find missing UPCs, matching padded / truncated codes by normalized key
+        upc_index = UpcIndex(items)
+        missing_upcs = []
+        matches = []
+        for upc in upcs:
+            item, upc_match = upc_index.match(upc)
+            if item:
+                matches.append({'upc': upc, 'matched_upc': item['ProductUPC'], 'match': upc_match})
+            else:
+                missing_upcs.append(upc)
         
         return jsonify({
             'success': True,
             'found_items': len(items),
             'missing_upcs': missing_upcs,
+            'matches': matches,
             'items': items
         }), 200
         
     except Exception as e:
         current_app.logger.error(f"Error validating UPCs: {e}")
-        return jsonify({'error': 'Failed to validate UPCs', 'details': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to validate UPCs', 'details': str(e)}), 500
@@ -1,7 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
-from app.models import DatabaseConfig
-from app.services.database_service import DatabaseService
+from app.services.service_registry import get_database_service
 
 bp = Blueprint('supplier', __name__)
 
@@ -24,18 +23,12 @@ def search_suppliers():
         if not search_term:
             return jsonify({'error': 'Search term is required'}), 400
         
-        # Get database configuration
-        db_config = DatabaseConfig.query.filter_by(
-            id=database_config_id,
-            user_id=current_user.id
-        ).first()
+        # Get database service (cached per user and config)
+        db_service = get_database_service(current_user.id, database_config_id)
         
-        if not db_config:
+        if not db_service:
             return jsonify({'error': 'Database configuration not found'}), 404
         
-        # Get database service
-        db_service = DatabaseService(db_config)
-        
         # Search suppliers
         success, suppliers, message = db_service.search_suppliers_by_account(search_term)
         
@@ -62,18 +55,12 @@ def get_supplier(supplier_id):
         if not database_config_id:
             return jsonify({'error': 'Database configuration ID is required'}), 400
         
-        # Get database configuration
-        db_config = DatabaseConfig.query.filter_by(
-            id=database_config_id,
-            user_id=current_user.id
-        ).first()
+        # Get database service (cached per user and config)
+        db_service = get_database_service(current_user.id, database_config_id)
         
-        if not db_config:
+        if not db_service:
             return jsonify({'error': 'Database configuration not found'}), 404
         
-        # Get database service
-        db_service = DatabaseService(db_config)
-        
         # Get supplier
         success, supplier, message = db_service.get_supplier_by_id(supplier_id)
         
@@ -109,18 +96,12 @@ def validate_supplier():
         if not supplier_id:
             return jsonify({'error': 'Supplier ID is required'}), 400
         
-        # Get database configuration
-        db_config = DatabaseConfig.query.filter_by(
-            id=database_config_id,
-            user_id=current_user.id
-        ).first()
+        # Get database service (cached per user and config)
+        db_service = get_database_service(current_user.id, database_config_id)
         
-        if not db_config:
+        if not db_service:
             return jsonify({'error': 'Database configuration not found'}), 404
         
-        # Get database service
-        db_service = DatabaseService(db_config)
-        
         # Validate supplier
         success, supplier, message = db_service.get_supplier_by_id(supplier_id)
         
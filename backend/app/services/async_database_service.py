@@ -0,0 +1,69 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, List, Dict, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on blocking pyodbc calls in flight per worker process
+DB_ASYNC_WORKERS = int(os.environ.get('DB_ASYNC_WORKERS', 32))
+
+_executor = ThreadPoolExecutor(max_workers=DB_ASYNC_WORKERS, thread_name_prefix='db-async')
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the bounded executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+class AsyncDatabaseService:
+    """Awaitable facade over DatabaseService so independent queries can overlap"""
+
+    def __init__(self, database_service):
+        self.db_service = database_service
+        self.config = database_service.config
+
+    async def test_connection(self) -> Tuple[bool, str]:
+        return await run_blocking(self.db_service.test_connection)
+
+    async def get_items_by_upcs(self, upcs: List[str], profile: str = 'full') -> Tuple[bool, List[Dict[str, Any]], str]:
+        return await run_blocking(self.db_service.get_items_by_upcs, upcs, profile)
+
+    async def get_item_ext_descriptions(self, product_ids: List[int]) -> Tuple[bool, Dict[int, str], str]:
+        return await run_blocking(self.db_service.get_item_ext_descriptions, product_ids)
+
+    async def get_next_invoice_number(self) -> Tuple[bool, int, str]:
+        return await run_blocking(self.db_service.get_next_invoice_number)
+
+    async def reserve_invoice_numbers(self, count: int) -> Tuple[bool, int, str]:
+        return await run_blocking(self.db_service.reserve_invoice_numbers, count)
+
+    async def get_next_po_number(self) -> Tuple[bool, int, str]:
+        return await run_blocking(self.db_service.get_next_po_number)
+
+    async def create_invoice(self, invoice_data: Dict[str, Any], invoice_details: List[Dict[str, Any]]) -> Tuple[bool, int, str]:
+        return await run_blocking(self.db_service.create_invoice, invoice_data, invoice_details)
+
+    async def create_purchase_order(self, po_data: Dict[str, Any], po_details: List[Dict[str, Any]]) -> Tuple[bool, int, str]:
+        return await run_blocking(self.db_service.create_purchase_order, po_data, po_details)
+
+    async def search_customers_by_account(self, account_search: str) -> Tuple[bool, List[Dict[str, Any]], str]:
+        return await run_blocking(self.db_service.search_customers_by_account, account_search)
+
+    async def get_customer_by_id(self, customer_id: int) -> Tuple[bool, Dict[str, Any], str]:
+        return await run_blocking(self.db_service.get_customer_by_id, customer_id)
+
+    async def search_suppliers_by_account(self, account_search: str) -> Tuple[bool, List[Dict[str, Any]], str]:
+        return await run_blocking(self.db_service.search_suppliers_by_account, account_search)
+
+    async def get_supplier_by_id(self, supplier_id: int) -> Tuple[bool, Dict[str, Any], str]:
+        return await run_blocking(self.db_service.get_supplier_by_id, supplier_id)
+
+    async def get_invoices_list(self, page: int = 1, per_page: int = 25, search: str = None) -> Tuple[bool, Dict[str, Any], str]:
+        return await run_blocking(self.db_service.get_invoices_list, page, per_page, search)
+
+    async def get_invoice_with_details(self, invoice_id: int) -> Tuple[bool, Dict[str, Any], str]:
+        return await run_blocking(self.db_service.get_invoice_with_details, invoice_id)
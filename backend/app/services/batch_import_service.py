@@ -0,0 +1,295 @@
+import os
+import json
+from typing import Tuple, List, Dict, Any, Iterable, Iterator, Union
+import logging
+
+from app.services.excel_service import ExcelService
+from app.services.invoice_service import InvoiceService
+from app.services.purchase_order_service import PurchaseOrderService
+from app.utils.upc import UpcIndex
+
+logger = logging.getLogger(__name__)
+
+# Documents committed per transaction when the request does not choose a group size
+BATCH_TRANSACTION_GROUP_SIZE = int(os.environ.get('BATCH_TRANSACTION_GROUP_SIZE', 50))
+# Upper bound on documents accepted in one batch request
+BATCH_MAX_DOCUMENTS = int(os.environ.get('BATCH_MAX_DOCUMENTS', 2000))
+
+DOCUMENT_TYPES = {
+    'invoice': 'customer_id',
+    'purchase_order': 'supplier_id'
+}
+
+
+class BatchImportService:
+    """Create many invoices / purchase orders from one NDJSON request.
+
+    The batch shares one deduplicated item lookup, one lookup per distinct customer or
+    supplier, one block of invoice numbers and one connection for the inserts.
+    """
+
+    def __init__(self, database_service):
+        self.db_service = database_service
+        self.invoice_service = InvoiceService(database_service)
+        self.po_service = PurchaseOrderService(database_service)
+        self.excel_service = ExcelService()
+
+    def _clean_documents(self, documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Apply the Excel upload rules to every document's UPC / Cost / QTY lines in one pass.
+
+        Returns the documents with valid rows and error results for the ones left without any.
+        """
+        lines = [line if isinstance(line, dict) else {} for document in documents for line in document['lines']]
+        columns = {
+            'UPC': [None if line.get('UPC') is None else str(line.get('UPC')) for line in lines],
+            'Cost': [line.get('Cost') for line in lines],
+            'QTY': [line.get('QTY') for line in lines]
+        }
+        parsed, _ = self.excel_service._clean_and_validate_data(columns, first_row=1)
+        rows = parsed.records()
+
+        # Rows are numbered across the batch; hand each document its own, renumbered from 1
+        cleaned, errors = [], []
+        position = 0
+        first_line = 1
+        for document in documents:
+            line_count = len(document.pop('lines'))
+            document_rows = []
+            while position < len(rows) and rows[position]['row_number'] < first_line + line_count:
+                rows[position]['row_number'] -= first_line - 1
+                document_rows.append(rows[position])
+                position += 1
+            first_line += line_count
+
+            if not document_rows:
+                errors.append({'index': document['index'], 'success': False, 'error': "No valid UPC / Cost / QTY lines"})
+                continue
+            # Unlike blank sheet rows, an empty line in a request is an error
+            accepted = {row['row_number'] for row in document_rows}
+            document['rows'] = document_rows
+            document['rejected_lines'] = [line_number for line_number in range(1, line_count + 1) if line_number not in accepted]
+            cleaned.append(document)
+        return cleaned, errors
+
+    def _parse_document(self, index: int, raw_line: Union[str, bytes]) -> Tuple[Dict[str, Any], str]:
+        try:
+            data = json.loads(raw_line)
+        except ValueError as e:
+            return {}, f"Invalid JSON: {str(e)}"
+        if not isinstance(data, dict):
+            return {}, "Each line must be a JSON object"
+
+        document_type = data.get('type', 'invoice')
+        if document_type not in DOCUMENT_TYPES:
+            return {}, f"Unknown document type: {document_type}"
+
+        party_field = DOCUMENT_TYPES[document_type]
+        try:
+            party_id = int(data.get(party_field))
+        except (TypeError, ValueError):
+            return {}, f"{party_field} is required and must be an integer"
+
+        if not isinstance(data.get('lines'), list) or not data['lines']:
+            return {}, "lines must be a non-empty list"
+
+        return {
+            'index': index,
+            'ref': data.get('ref'),
+            'type': document_type,
+            'party_id': party_id,
+            'lines': data['lines']
+        }, ""
+
+    def parse(self, raw_lines: Iterable[Union[str, bytes]],
+              max_documents: int = BATCH_MAX_DOCUMENTS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Parse NDJSON lines into documents; returns documents and per-line error results.
+
+        Lines are read one at a time (e.g. straight from the request stream) and reading stops
+        once more than `max_documents` non-empty lines have been seen.
+        """
+        documents = []
+        errors = []
+        for index, raw_line in enumerate(raw_lines, start=1):
+            if not raw_line.strip():
+                continue
+            if len(documents) + len(errors) >= max_documents:
+                errors.append({'index': index, 'success': False, 'error': f"More than {max_documents} documents"})
+                break
+            document, error = self._parse_document(index, raw_line)
+            if error:
+                errors.append({'index': index, 'success': False, 'error': error})
+            else:
+                documents.append(document)
+
+        documents, line_errors = self._clean_documents(documents)
+        errors.extend(line_errors)
+        return documents, sorted(errors, key=lambda error: error['index'])
+
+    def _result(self, document: Dict[str, Any], **fields) -> Dict[str, Any]:
+        result = {'index': document['index'], 'ref': document['ref'], 'type': document['type']}
+        if document.get('missing_upcs'):
+            result['missing_upcs'] = [missing['upc'] for missing in document['missing_upcs']]
+        if document['rejected_lines']:
+            result['rejected_lines'] = document['rejected_lines']
+        result.update(fields)
+        return result
+
+    def _fetch_parties(self, documents: List[Dict[str, Any]]) -> Dict[Tuple[str, int], Tuple[bool, Dict[str, Any], str]]:
+        """Look up each distinct customer / supplier once"""
+        parties = {}
+        for document in documents:
+            key = (document['type'], document['party_id'])
+            if key in parties:
+                continue
+            if document['type'] == 'invoice':
+                parties[key] = self.db_service.get_customer_by_id(document['party_id'])
+            else:
+                parties[key] = self.db_service.get_supplier_by_id(document['party_id'])
+        return parties
+
+    def _document_items(self, document: Dict[str, Any], upc_index: UpcIndex,
+                        positions: Dict[int, int]) -> List[Dict[str, Any]]:
+        """The batch's items that the document's UPCs match, in lookup order (so shared keys resolve the same way)"""
+        matched = {}
+        for upc in dict.fromkeys(row['UPC'] for row in document['rows']):
+            item, _ = upc_index.match(upc)
+            if item is not None:
+                matched[id(item)] = item
+        return sorted(matched.values(), key=lambda item: positions[id(item)])
+
+    def _build_previews(self, documents: List[Dict[str, Any]], items: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Attach a preview to each document; yields a failure result for the ones that cannot be built"""
+        parties = self._fetch_parties(documents)
+        # Indexed once per batch; each document is built against just the items its UPCs match
+        upc_index = UpcIndex(items)
+        positions = {id(item): position for position, item in enumerate(items)}
+        for document in documents:
+            success, party, message = parties[(document['type'], document['party_id'])]
+            if not success:
+                label = 'Customer' if document['type'] == 'invoice' else 'Supplier'
+                yield self._result(document, success=False, error=f"{label} not found: {message}")
+                continue
+
+            # Numbers are assigned once the batch knows how many documents are valid
+            document_items = self._document_items(document, upc_index, positions)
+            if document['type'] == 'invoice':
+                success, preview, missing_upcs, message = self.invoice_service.process_excel_data(document['rows'], document_items, party, 0)
+                number_field = 'invoice_number'
+            else:
+                success, preview, missing_upcs, message = self.po_service.process_excel_data(document['rows'], document_items, party, 0)
+                number_field = 'po_number'
+            document['missing_upcs'] = missing_upcs
+            if not success:
+                yield self._result(document, success=False, error=message)
+                continue
+            # The 0 passed above only stops the preview from querying a number of its own
+            preview[number_field] = None
+            document['preview'] = preview
+
+    def _assign_numbers(self, documents: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Number invoices and POs from blocks reserved for this batch"""
+        invoices = [document for document in documents if document['type'] == 'invoice']
+        purchase_orders = [document for document in documents if document['type'] == 'purchase_order']
+
+        if invoices:
+            success, first_number, message = self.db_service.reserve_invoice_numbers(len(invoices))
+            for offset, document in enumerate(invoices):
+                if success:
+                    document['preview']['invoice_number'] = str(first_number + offset)
+                else:
+                    document['preview'] = None
+                    yield self._result(document, success=False, error=f"Failed to get invoice number: {message}")
+
+        if purchase_orders:
+            success, first_number, message = self.db_service.reserve_po_numbers(len(purchase_orders))
+            for offset, document in enumerate(purchase_orders):
+                if success:
+                    document['preview']['po_number'] = str(first_number + offset)
+                else:
+                    document['preview'] = None
+                    yield self._result(document, success=False, error=f"Failed to get PO number: {message}")
+
+    def run(self, documents: List[Dict[str, Any]], errors: List[Dict[str, Any]],
+            group_size: int = BATCH_TRANSACTION_GROUP_SIZE) -> Iterator[Dict[str, Any]]:
+        """Create the parsed documents, yielding one result per document and a final summary"""
+        total = len(documents) + len(errors)
+        counts = {'created': 0, 'failed': 0, 'outcome_unknown': 0}
+        reported = set()
+        try:
+            for result in self._create(documents, errors, group_size):
+                if result.get('success'):
+                    counts['created'] += 1
+                elif result.get('outcome_unknown'):
+                    counts['outcome_unknown'] += 1
+                else:
+                    counts['failed'] += 1
+                reported.add(result['index'])
+                yield result
+        except Exception as e:
+            # The stream still ends with a result for every document and the summary
+            logger.error(f"Batch import aborted after {len(reported)} of {total} documents: {e}")
+            for document in documents:
+                if document['index'] not in reported:
+                    counts['failed'] += 1
+                    yield self._result(document, success=False, error=f"Batch import failed: {str(e)}")
+
+        logger.info(f"Batch import finished: {counts['created']} created, {counts['failed']} failed, "
+                    f"{counts['outcome_unknown']} unknown of {total}")
+        yield {'summary': {'documents': total, **counts}}
+
+    def _create(self, documents: List[Dict[str, Any]], errors: List[Dict[str, Any]],
+                group_size: int) -> Iterator[Dict[str, Any]]:
+        for error in errors:
+            yield error
+
+        def fail_all(pending: List[Dict[str, Any]], message: str) -> Iterator[Dict[str, Any]]:
+            for document in pending:
+                yield self._result(document, success=False, error=message)
+
+        # One lookup for every distinct UPC in the batch
+        upcs = list(dict.fromkeys(row['UPC'] for document in documents for row in document['rows']))
+        types = {document['type'] for document in documents}
+        profile = types.pop() if len(types) == 1 else 'full'
+        success, items, message = self.db_service.get_items_by_upcs(upcs, profile) if documents else (True, [], "")
+        if not success:
+            yield from fail_all(documents, f"Item lookup failed: {message}")
+            documents = []
+
+        yield from self._build_previews(documents, items if success else [])
+        pending = [document for document in documents if 'preview' in document]
+
+        # Lookups may be served from the item cache or catalog mirror; confirm them before writing
+        verified, stale_upcs, message = self.db_service.verify_items_live(
+            [line for document in pending for line in document['preview']['lines']]
+        )
+        if not verified:
+            yield from fail_all(pending, message)
+            pending = []
+        elif stale_upcs:
+            stale = set(stale_upcs)
+            for document in pending:
+                document_stale = [line['ProductUPC'] for line in document['preview']['lines'] if line['ProductUPC'] in stale]
+                if document_stale:
+                    yield self._result(document, success=False, stale_upcs=document_stale,
+                                       error='Some items changed during the import. Please submit the document again.')
+                    document['preview'] = None
+            pending = [document for document in pending if document['preview']]
+
+        yield from self._assign_numbers(pending)
+        ready = []
+        by_index = {}
+        for document in pending:
+            preview = document['preview']
+            # Documents without a number have already been reported as failed
+            if not preview or not preview.get('invoice_number' if document['type'] == 'invoice' else 'po_number'):
+                continue
+            if document['type'] == 'invoice':
+                header, details = self.invoice_service.prepare_invoice_data(preview)
+            else:
+                header, details = self.po_service.prepare_po_data(preview)
+            ready.append({'index': document['index'], 'type': document['type'], 'header': header, 'details': details})
+            by_index[document['index']] = document
+
+        for outcome in self.db_service.create_documents(ready, group_size):
+            document = by_index[outcome.pop('index')]
+            yield self._result(document, **outcome)
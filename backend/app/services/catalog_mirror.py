@@ -0,0 +1,243 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, date
+from decimal import Decimal
+from typing import Tuple, List, Dict, Any, Optional
+import logging
+
+from app.utils.upc import gtin_key
+
+logger = logging.getLogger(__name__)
+
+# Where per-config catalog mirrors live; defaults to the app's persistent data volume
+CATALOG_MIRROR_DIR = os.environ.get('CATALOG_MIRROR_DIR', '/app/data/catalog')
+# Seconds after a sync before a lookup triggers a background refresh
+CATALOG_SYNC_INTERVAL = float(os.environ.get('CATALOG_SYNC_INTERVAL', 300))
+# Width of a ProductID range compared by one checksum (Items_tbl IDs step by 10)
+CATALOG_BLOCK_SIZE = int(os.environ.get('CATALOG_BLOCK_SIZE', 10000))
+
+# SQLite's default host-parameter limit is 999 on older builds
+_SQLITE_MAX_PARAMS = 900
+_BOOLEAN_COLUMNS = {'SPPromoted', 'Discontinued'}
+# Bumped when the local items table changes shape; older mirrors are rebuilt on the next sync
+_SCHEMA_VERSION = '2'
+
+
+def _to_sqlite(value):
+    """Convert pyodbc values to types sqlite3 can store"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class CatalogMirror:
+    """Local SQLite copy of Items_tbl (joined with Units_tbl) for one database config"""
+
+    def __init__(self, config_id: int, directory: str = CATALOG_MIRROR_DIR):
+        self.config_id = config_id
+        self.path = os.path.join(directory, f'catalog_{config_id}.db')
+        self._sync_lock = threading.Lock()
+        self._last_sync_started = 0.0
+        self.last_error = None
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS blocks (block_id INTEGER PRIMARY KEY, checksum INTEGER, row_count INTEGER)")
+        return conn
+
+    def _get_meta(self, conn: sqlite3.Connection, key: str) -> Optional[str]:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _ensure_items_table(self, conn: sqlite3.Connection, columns: List[str]):
+        """Create the items table for this column set, rebuilding it if the columns changed"""
+        column_list = ','.join(columns)
+        if self._get_meta(conn, 'columns') == column_list:
+            return
+        conn.execute("DROP TABLE IF EXISTS items")
+        conn.execute("DELETE FROM blocks")
+        column_defs = ', '.join(f'"{column}"' for column in columns)
+        conn.execute(f"CREATE TABLE items (block_id INTEGER NOT NULL, gtin_key TEXT, {column_defs})")
+        conn.execute("CREATE INDEX ix_items_upc ON items (ProductUPC)")
+        conn.execute("CREATE INDEX ix_items_gtin_key ON items (gtin_key)")
+        conn.execute("CREATE INDEX ix_items_block ON items (block_id)")
+        self._set_meta(conn, 'columns', column_list)
+
+    def is_ready(self) -> bool:
+        """True once at least one full sync has completed"""
+        if not os.path.exists(self.path):
+            return False
+        conn = self._connect()
+        try:
+            return self._get_meta(conn, 'last_sync') is not None
+        finally:
+            conn.close()
+
+    def status(self) -> Dict[str, Any]:
+        status = {
+            'ready': False,
+            'syncing': self._sync_lock.locked(),
+            'last_sync': None,
+            'item_count': 0,
+            'last_error': self.last_error
+        }
+        if os.path.exists(self.path):
+            conn = self._connect()
+            try:
+                status['last_sync'] = self._get_meta(conn, 'last_sync')
+                status['ready'] = status['last_sync'] is not None
+                status['item_count'] = int(self._get_meta(conn, 'item_count') or 0)
+            finally:
+                conn.close()
+        return status
+
+    def sync(self, db_service, full: bool = False) -> Tuple[bool, Dict[str, int], str]:
+        """Bring the mirror up to date, re-fetching only ProductID blocks whose checksum changed"""
+        if not self._sync_lock.acquire(blocking=False):
+            return False, {}, "Catalog sync already in progress"
+        try:
+            self._last_sync_started = time.monotonic()
+            success, remote_blocks, message = db_service.get_item_block_checksums(CATALOG_BLOCK_SIZE)
+            if not success:
+                self.last_error = message
+                return False, {}, message
+
+            conn = self._connect()
+            try:
+                if self._get_meta(conn, 'schema_version') != _SCHEMA_VERSION:
+                    # Re-fetch every block into a freshly created items table; lookups go live meanwhile
+                    conn.execute("DROP TABLE IF EXISTS items")
+                    conn.execute("DELETE FROM meta WHERE key IN ('columns', 'last_sync')")
+                    conn.execute("DELETE FROM blocks")
+                    self._set_meta(conn, 'schema_version', _SCHEMA_VERSION)
+                    conn.commit()
+
+                local_blocks = {
+                    row[0]: (row[1], row[2]) for row in conn.execute("SELECT block_id, checksum, row_count FROM blocks")
+                }
+                # A full rebuild re-fetches every remote block; blocks gone from the server are removed either way
+                changed = [block_id for block_id, state in remote_blocks.items() if full or local_blocks.get(block_id) != state]
+                removed = [block_id for block_id in local_blocks if block_id not in remote_blocks]
+
+                for block_id in changed:
+                    start_id = block_id * CATALOG_BLOCK_SIZE
+                    success, items, message = db_service.get_items_in_id_range(start_id, start_id + CATALOG_BLOCK_SIZE)
+                    if not success:
+                        self.last_error = message
+                        return False, {}, message
+
+                    if items:
+                        columns = list(items[0].keys())
+                        self._ensure_items_table(conn, columns)
+                        placeholders = ','.join(['?'] * (len(columns) + 2))
+                        conn.execute("DELETE FROM items WHERE block_id = ?", (block_id,))
+                        conn.executemany(
+                            f"INSERT INTO items VALUES ({placeholders})",
+                            [
+                                [block_id, gtin_key(item.get('ProductUPC'))] + [_to_sqlite(item[column]) for column in columns]
+                                for item in items
+                            ]
+                        )
+                    checksum, row_count = remote_blocks[block_id]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO blocks (block_id, checksum, row_count) VALUES (?, ?, ?)",
+                        (block_id, checksum, row_count)
+                    )
+                    conn.commit()
+
+                has_items = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items'").fetchone()
+                for block_id in removed:
+                    if has_items:
+                        conn.execute("DELETE FROM items WHERE block_id = ?", (block_id,))
+                    conn.execute("DELETE FROM blocks WHERE block_id = ?", (block_id,))
+
+                item_count = sum(row_count for _, row_count in remote_blocks.values())
+                self._set_meta(conn, 'last_sync', datetime.utcnow().isoformat())
+                self._set_meta(conn, 'item_count', item_count)
+                conn.commit()
+            finally:
+                conn.close()
+
+            self.last_error = None
+            result = {'changed_blocks': len(changed), 'removed_blocks': len(removed), 'item_count': item_count}
+            logger.info(f"Catalog mirror for config {self.config_id} synced: {result}")
+            return True, result, f"Synced {len(changed)} changed blocks"
+
+        except Exception as e:
+            logger.error(f"Catalog sync failed for config {self.config_id}: {e}")
+            self.last_error = str(e)
+            return False, {}, f"Catalog sync failed: {str(e)}"
+        finally:
+            self._sync_lock.release()
+
+    def refresh_in_background(self, db_service):
+        """Start a background sync if the mirror is older than CATALOG_SYNC_INTERVAL"""
+        if self._sync_lock.locked() or time.monotonic() - self._last_sync_started < CATALOG_SYNC_INTERVAL:
+            return
+        # Claim the interval up front so concurrent lookups do not start duplicate threads
+        self._last_sync_started = time.monotonic()
+        thread = threading.Thread(target=self.sync, args=(db_service,), name=f'catalog-sync-{self.config_id}', daemon=True)
+        thread.start()
+
+    def get_items_by_keys(self, keys: List[str], columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Resolve normalized UPC keys (see app.utils.upc.gtin_key) against the local mirror"""
+        conn = self._connect()
+        try:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items'").fetchone():
+                return []
+            conn.row_factory = sqlite3.Row
+            select = ', '.join(f'"{column}"' for column in columns) if columns else '*'
+            items = []
+            for i in range(0, len(keys), _SQLITE_MAX_PARAMS):
+                chunk = keys[i:i + _SQLITE_MAX_PARAMS]
+                placeholders = ','.join(['?'] * len(chunk))
+                for row in conn.execute(f"SELECT {select} FROM items WHERE gtin_key IN ({placeholders})", chunk):
+                    item = dict(row)
+                    item.pop('block_id', None)
+                    item.pop('gtin_key', None)
+                    for column in _BOOLEAN_COLUMNS & item.keys():
+                        item[column] = bool(item[column]) if item[column] is not None else None
+                    items.append(item)
+            return items
+        finally:
+            conn.close()
+
+    def delete(self):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.unlink(self.path + suffix)
+
+
+_mirrors: Dict[int, CatalogMirror] = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(config_id: int) -> CatalogMirror:
+    with _mirrors_lock:
+        mirror = _mirrors.get(config_id)
+        if mirror is None:
+            mirror = CatalogMirror(config_id)
+            _mirrors[config_id] = mirror
+        return mirror
+
+
+def drop_mirror(config_id: int):
+    """Forget and delete the mirror for a config (its target may have changed)"""
+    with _mirrors_lock:
+        mirror = _mirrors.pop(config_id, None)
+    if mirror is None:
+        mirror = CatalogMirror(config_id)
+    try:
+        mirror.delete()
+    except OSError as e:
+        logger.warning(f"Could not delete catalog mirror for config {config_id}: {e}")
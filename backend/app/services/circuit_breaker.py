@@ -0,0 +1,177 @@
+import pyodbc
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Consecutive connection failures before a target is marked unreachable
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('DB_BREAKER_FAILURE_THRESHOLD', 3))
+# Seconds an open breaker waits before the background monitor probes the target
+BREAKER_RESET_TIMEOUT = float(os.environ.get('DB_BREAKER_RESET_TIMEOUT', 30))
+# Login timeout for background probes, kept short so a dead host is detected quickly
+BREAKER_PROBE_TIMEOUT = int(os.environ.get('DB_BREAKER_PROBE_TIMEOUT', 5))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# ODBC SQLSTATEs for connection failures (08xxx) and timeouts (HYT00/HYT01)
+_TIMEOUT_SQLSTATES = {'HYT00', 'HYT01'}
+
+
+def is_connection_error(error: Exception) -> bool:
+    """True if a pyodbc error means the server is unreachable or timed out, not a bad query"""
+    if not isinstance(error, pyodbc.Error):
+        return False
+    sqlstate = str(error.args[0]) if error.args else ''
+    return sqlstate.startswith('08') or sqlstate in _TIMEOUT_SQLSTATES
+
+
+class CircuitOpenError(pyodbc.OperationalError):
+    """Raised instead of connecting while a target's breaker is open"""
+    pass
+
+
+class CircuitBreaker:
+    """Failure counter and open/half-open/closed state for one SQL Server target"""
+
+    def __init__(self, config_id: int, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.config_id = config_id
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.connection_string = None
+
+        self.state = CLOSED
+        self.failures = 0
+        self.last_error = None
+        self.opened_at = None       # wall-clock time, for reporting
+        self.retry_at = 0.0         # monotonic time of the next background probe
+        self.last_checked = None
+        self._lock = threading.Lock()
+
+    def before_call(self, connection_string: str):
+        """Fail fast while the target is known to be unreachable"""
+        with self._lock:
+            self.connection_string = connection_string
+            if self.state == CLOSED:
+                return
+            last_error = self.last_error
+
+        raise CircuitOpenError('08001', f"Database is unavailable (circuit {self.state}): {last_error}")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Database config {self.config_id} is reachable again, closing circuit")
+            self.state = CLOSED
+            self.failures = 0
+            self.last_error = None
+            self.opened_at = None
+            self.last_checked = datetime.utcnow()
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self.last_checked = datetime.utcnow()
+            should_open = self.state == HALF_OPEN or self.failures >= self.failure_threshold
+            if should_open:
+                if self.state != OPEN:
+                    logger.warning(f"Opening circuit for database config {self.config_id} after {self.failures} failures: {error}")
+                    self.opened_at = datetime.utcnow()
+                self.state = OPEN
+                self.retry_at = time.monotonic() + self.reset_timeout
+
+        if should_open:
+            _monitor.ensure_started()
+
+    def _begin_probe(self) -> bool:
+        with self._lock:
+            if self.state != OPEN or time.monotonic() < self.retry_at or not self.connection_string:
+                return False
+            self.state = HALF_OPEN
+            return True
+
+    def probe(self):
+        """Half-open check run by the background monitor; requests never wait on it"""
+        if not self._begin_probe():
+            return
+        try:
+            with pyodbc.connect(self.connection_string, timeout=BREAKER_PROBE_TIMEOUT) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            self.record_success()
+        except Exception as e:
+            logger.info(f"Probe for database config {self.config_id} failed: {e}")
+            self.record_failure(e)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'available': self.state == CLOSED,
+                'failures': self.failures,
+                'last_error': self.last_error,
+                'opened_at': self.opened_at.isoformat() if self.opened_at else None,
+                'last_checked': self.last_checked.isoformat() if self.last_checked else None
+            }
+
+
+class _HealthMonitor:
+    """Daemon thread that probes open breakers once their reset timeout has passed"""
+
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-health-monitor', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with _breakers_lock:
+                breakers = list(_breakers.values())
+            for breaker in breakers:
+                try:
+                    breaker.probe()
+                except Exception as e:
+                    logger.error(f"Health probe crashed for database config {breaker.config_id}: {e}")
+
+
+_breakers: Dict[int, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_monitor = _HealthMonitor()
+
+
+def get_breaker(config_id: int) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(config_id)
+        if breaker is None:
+            breaker = CircuitBreaker(config_id)
+            _breakers[config_id] = breaker
+        return breaker
+
+
+def get_health(config_id: int) -> Dict[str, Any]:
+    """Cached health state for a config; targets never contacted report as closed"""
+    with _breakers_lock:
+        breaker = _breakers.get(config_id)
+    if breaker is None:
+        return CircuitBreaker(config_id).to_dict()
+    return breaker.to_dict()
+
+
+def reset_breaker(config_id: int) -> Optional[CircuitBreaker]:
+    with _breakers_lock:
+        return _breakers.pop(config_id, None)
@@ -0,0 +1,234 @@
+import pyodbc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing and lifetime settings (seconds), overridable from the environment
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 0))
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+POOL_MAX_AGE = float(os.environ.get('DB_POOL_MAX_AGE', 1800))
+POOL_VALIDATE_AFTER = float(os.environ.get('DB_POOL_VALIDATE_AFTER', 30))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', 30))
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+    pass
+
+
+class _PooledConnection:
+    """A pyodbc connection plus the bookkeeping the pool needs"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def age(self, now: float) -> float:
+        return now - self.created_at
+
+    def idle(self, now: float) -> float:
+        return now - self.last_used
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of pyodbc connections for a single SQL Server target"""
+
+    def __init__(self, connection_string: str, min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 max_idle: float = POOL_MAX_IDLE, max_age: float = POOL_MAX_AGE,
+                 validate_after: float = POOL_VALIDATE_AFTER):
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max(1, max_size)
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.validate_after = validate_after
+
+        self._idle = []          # Most recently returned connection is last
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _open(self, timeout: int) -> _PooledConnection:
+        """Open a new physical connection (full TCP + TLS + login handshake)"""
+        return _PooledConnection(pyodbc.connect(self.connection_string, timeout=timeout))
+
+    def _is_expired(self, pooled: _PooledConnection, now: float) -> bool:
+        if self.max_age and pooled.age(now) > self.max_age:
+            return True
+        # Idle eviction never shrinks the pool below its minimum size
+        if self.max_idle and pooled.idle(now) > self.max_idle and len(self._idle) + self._in_use > self.min_size:
+            return True
+        return False
+
+    def _is_alive(self, pooled: _PooledConnection) -> bool:
+        """Validate a connection that has been idle for a while before handing it out"""
+        try:
+            cursor = pooled.conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error as e:
+            logger.info(f"Discarding dead pooled connection: {e}")
+            return False
+
+    def _evict_expired(self, now: float) -> list:
+        """Remove expired idle connections; caller must hold the lock and close the result"""
+        expired = []
+        for pooled in list(self._idle):
+            if self._is_expired(pooled, now):
+                self._idle.remove(pooled)
+                expired.append(pooled)
+        return expired
+
+    def acquire(self, timeout: int = 30) -> _PooledConnection:
+        """Check out a connection, opening a new one if the pool has room"""
+        deadline = time.monotonic() + POOL_CHECKOUT_TIMEOUT
+
+        while True:
+            pooled = None
+            with self._cond:
+                if self._closed:
+                    raise PoolExhaustedError("Connection pool is closed")
+
+                expired = self._evict_expired(time.monotonic())
+
+                if self._idle:
+                    pooled = self._idle.pop()
+                    self._in_use += 1
+                    create = False
+                elif self._in_use < self.max_size:
+                    # Reserve the slot before connecting outside the lock
+                    self._in_use += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            f"No database connection available after {POOL_CHECKOUT_TIMEOUT:.0f}s "
+                            f"(pool size {self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                    create = None
+
+            for stale in expired:
+                stale.close()
+
+            if create is None:
+                continue
+
+            if create:
+                try:
+                    return self._open(timeout)
+                except Exception:
+                    self._release_slot()
+                    raise
+
+            if pooled.idle(time.monotonic()) < self.validate_after or self._is_alive(pooled):
+                return pooled
+
+            # Validation failed: drop it and try again
+            pooled.close()
+            self._release_slot()
+
+    def release(self, pooled: _PooledConnection, discard: bool = False):
+        """Return a connection to the pool, or close it if it is broken or expired"""
+        now = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            keep = not discard and not self._closed and not (self.max_age and pooled.age(now) > self.max_age)
+            if keep:
+                pooled.last_used = now
+                self._idle.append(pooled)
+            self._cond.notify()
+
+        if not keep:
+            pooled.close()
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: int = 30):
+        """Borrow a connection; commit on success, roll back on error, then return it"""
+        pooled = self.acquire(timeout)
+        discard = False
+        try:
+            yield pooled.conn
+            pooled.conn.commit()
+        except Exception as e:
+            try:
+                pooled.conn.rollback()
+            except pyodbc.Error:
+                discard = True
+            # Connection-level failures leave the session in an unknown state
+            if isinstance(e, (pyodbc.OperationalError, pyodbc.InterfaceError)):
+                discard = True
+            raise
+        finally:
+            try:
+                if not discard and pooled.conn.autocommit:
+                    pooled.conn.autocommit = False
+            except pyodbc.Error:
+                discard = True
+            self.release(pooled, discard=discard)
+
+    def close(self):
+        """Close all idle connections; in-use connections are closed when returned"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for pooled in idle:
+            pooled.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'max_size': self.max_size
+            }
+
+
+_pools: Dict[int, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config_id: int, connection_string: str) -> ConnectionPool:
+    """Get the pool for a DatabaseConfig id, rebuilding it if the connection settings changed"""
+    stale = None
+    with _pools_lock:
+        pool = _pools.get(config_id)
+        if pool is None or pool.connection_string != connection_string:
+            stale = pool
+            pool = ConnectionPool(connection_string)
+            _pools[config_id] = pool
+
+    if stale is not None:
+        stale.close()
+    return pool
+
+
+def close_pool(config_id: int) -> Optional[ConnectionPool]:
+    """Close and forget the pool for a DatabaseConfig id"""
+    with _pools_lock:
+        pool = _pools.pop(config_id, None)
+    if pool is not None:
+        pool.close()
+    return pool
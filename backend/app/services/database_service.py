@@ -1,16 +1,127 @@
 import pyodbc
 import pandas as pd
 from sqlalchemy import create_engine, text
-from typing import Tuple, List, Dict, Any
+from typing import Tuple, List, Dict, Any, Iterator
 import logging
+import os
+import json
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from app.services.connection_pool import get_pool
+from app.services.circuit_breaker import get_breaker, is_connection_error
+from app.services.catalog_mirror import get_mirror
+from app.services.item_cache import item_cache
+from app.utils.upc import lookup_keys, key_variants, gtin_key
+from app.services.line_columns import NULL_VALUES
+from app.services.invoice_number_allocator import get_invoice_allocator
+from app.services.po_number_cache import get_po_number_cache
 
 logger = logging.getLogger(__name__)
 
+# Allowed IN-list sizes for UPC lookups. The last bucket is padded up to the next
+# size so SQL Server reuses a handful of cached plans instead of compiling one per
+# list length; the largest size stays well under the 2,100 parameter limit.
+UPC_BUCKET_SIZES = (10, 50, 200, 1000)
+UPC_LOOKUP_WORKERS = int(os.environ.get('UPC_LOOKUP_WORKERS', 4))
+# Above this many distinct UPCs the whole set is sent at once (OPENJSON payload or a
+# bulk-loaded #upcs temp table) and joined server-side instead of bucketed IN lists;
+# kept below the largest bucket so 1,000-parameter IN lists are only a fallback
+UPC_SET_BASED_THRESHOLD = int(os.environ.get('UPC_SET_BASED_THRESHOLD', 200))
+# Items_tbl.ProductUPC is nvarchar(20); longer values can never match
+UPC_MAX_LENGTH = 20
+
+# SELECT expression for every item column a lookup can return
+ITEM_COLUMN_SQL = {
+    'ProductID': 'i.ProductID', 'CateID': 'i.CateID', 'SubCateID': 'i.SubCateID',
+    'ProductSKU': 'i.ProductSKU', 'ProductUPC': 'i.ProductUPC',
+    'ProductDescription': 'i.ProductDescription', 'ItemSize': 'i.ItemSize',
+    'UnitPrice': 'i.UnitPrice', 'UnitCost': 'i.UnitCost', 'ItemWeight': 'i.ItemWeight',
+    'ItemTaxID': 'i.ItemTaxID', 'SPPromoted': 'i.SPPromoted',
+    'SPPromotionDescription': 'i.SPPromotionDescription', 'Discontinued': 'i.Discontinued',
+    'UnitID': 'i.UnitID', 'CountInUnit': 'i.CountInUnit', 'ProductMessage': 'i.ProductMessage',
+    'OriginalPrice': 'i.UnitPrice as OriginalPrice', 'UnitQty2': 'i.UnitQty2',
+    'UnitQty3': 'i.UnitQty3', 'UnitQty4': 'i.UnitQty4', 'QuantOnHand': 'i.QuantOnHand',
+    'QuantOnOrder': 'i.QuantOnOrder', 'LastReceived': 'i.LastReceived', 'LastSold': 'i.LastSold',
+    'ReorderLevel': 'i.ReorderLevel', 'ReorderQuant': 'i.ReorderQuant',
+    'ExtDescription': 'i.ExtDescription', 'UnitDesc': 'u.UnitDesc'
+}
+# Item fields re-checked live before committing a client-sent line (service-built lines list their own ITEM_FIELDS)
+LIVE_CHECK_FIELDS = (
+    'ProductUPC', 'ProductSKU', 'ProductDescription', 'ItemSize', 'CateID', 'SubCateID', 'ItemWeight', 'UnitDesc'
+)
+_LIVE_CHECK_NUMERIC_FIELDS = {'CateID', 'SubCateID', 'ItemWeight', 'ItemTaxID', 'UnitCost', 'OriginalPrice'}
+# ntext columns force the driver onto its slow row-by-row fetch path; they are only
+# fetched on demand through get_item_ext_descriptions
+ITEM_LOB_COLUMNS = ('ExtDescription',)
+ITEM_COLUMNS = ', '.join(ITEM_COLUMN_SQL.values())
+
+# Columns each caller actually renders; ProductID and ProductUPC are always needed for matching
+ITEM_PROFILES = {
+    'invoice': (
+        'ProductID', 'ProductUPC', 'CateID', 'SubCateID', 'ProductSKU', 'ProductDescription',
+        'ItemSize', 'UnitCost', 'OriginalPrice', 'ItemWeight', 'ItemTaxID', 'SPPromoted',
+        'SPPromotionDescription', 'ProductMessage', 'CountInUnit', 'UnitDesc'
+    ),
+    'purchase_order': (
+        'ProductID', 'ProductUPC', 'CateID', 'SubCateID', 'ProductSKU', 'ProductDescription',
+        'ItemSize', 'ItemWeight', 'UnitDesc'
+    ),
+    'copy': (
+        'ProductID', 'ProductUPC', 'CateID', 'SubCateID', 'ProductSKU', 'ProductDescription',
+        'ItemSize', 'ItemWeight', 'ItemTaxID', 'SPPromoted', 'SPPromotionDescription',
+        'ProductMessage', 'CountInUnit', 'UnitDesc'
+    ),
+    'validate': (
+        'ProductID', 'ProductUPC', 'ProductDescription', 'ItemSize', 'UnitPrice', 'UnitCost', 'Discontinued'
+    ),
+    'full': tuple(column for column in ITEM_COLUMN_SQL if column not in ITEM_LOB_COLUMNS)
+}
+
+# Detail lines sent per fast_executemany parameter array
+DETAIL_INSERT_CHUNK_SIZE = int(os.environ.get('DETAIL_INSERT_CHUNK_SIZE', 1000))
+
+# Bound parameter types for the detail inserts, in column order. ('str', n) is the
+# minimum declared length; it grows to the longest value actually being sent.
+INVOICE_DETAIL_COLUMN_TYPES = (
+    'int', 'int', 'int', 'int', ('str', 20),
+    ('str', 20), ('str', 50), ('str', 10), 'float', 'float',
+    'float', 'float', 'float', 'float', 'float',
+    'float', 'int', 'int', 'int', ('str', 50),
+    ('str', 50), ('str', 50), 'float',
+    'float', 'float', 'float', ('str', 50), 'float',
+    ('str', 50), 'float', 'int'
+)
+PO_DETAIL_COLUMN_TYPES = (
+    'int', 'int', 'int', 'int', ('str', 50), 'float',
+    ('str', 20), ('str', 20), ('str', 20), ('str', 50), ('str', 10),
+    ('str', 20), 'int', 'float', 'float', ('str', 10),
+    'float', 'float', 'datetime', 'int', 'int'
+)
+
+_lookup_executor = ThreadPoolExecutor(max_workers=UPC_LOOKUP_WORKERS, thread_name_prefix='upc-lookup')
+
+def _live_check_value(field: str, value):
+    """Normalize a line value and its live Items_tbl value the way preview lines convert item fields"""
+    if field in _LIVE_CHECK_NUMERIC_FIELDS:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return 0.0
+        return round(number, 4) if number == number else 0.0
+    if value is None or value in NULL_VALUES:
+        return ''
+    return str(value)
+
+class CommitOutcomeUnknownError(Exception):
+    """The connection failed while COMMIT was in flight, so the write may or may not have been applied"""
+    pass
+
 class DatabaseService:
     def __init__(self, database_config):
         self.config = database_config
         self.connection_string = self._build_connection_string()
+        self._server_capabilities = None
     
     def _safe_int_for_db(self, value):
         """Convert value to int, using 0 for NULL values"""
@@ -75,6 +186,21 @@ class DatabaseService:
         
         return conn_str
     
+    @contextmanager
+    def _connection(self, timeout: int = 30):
+        """Borrow a pooled connection for this database config (commits on success, rolls back on error)"""
+        breaker = get_breaker(self.config.id)
+        # Fails fast while the circuit is open instead of waiting out the login timeout
+        breaker.before_call(self.connection_string)
+        try:
+            with get_pool(self.config.id, self.connection_string).connection(timeout) as conn:
+                yield conn
+        except pyodbc.Error as e:
+            if is_connection_error(e):
+                breaker.record_failure(e)
+            raise
+        breaker.record_success()
+    
     def test_connection(self) -> Tuple[bool, str]:
         """Test database connection"""
         try:
@@ -86,8 +212,12 @@ class DatabaseService:
                 cursor = conn.cursor()
                 cursor.execute("SELECT 1")
                 cursor.fetchone()
-                return True, "Connection successful"
+            # An explicit test bypasses the breaker but updates its state
+            get_breaker(self.config.id).record_success()
+            return True, "Connection successful"
         except pyodbc.Error as e:
+            if is_connection_error(e):
+                get_breaker(self.config.id).record_failure(e)
             logger.error(f"Database connection failed: {e}")
             logger.error(f"Connection string was: {safe_conn_str}")
             return False, f"Connection failed: {str(e)}"
@@ -95,67 +225,362 @@ class DatabaseService:
             logger.error(f"Unexpected error during connection test: {e}")
             return False, f"Unexpected error: {str(e)}"
     
-    def get_items_by_upcs(self, upcs: List[str]) -> Tuple[bool, List[Dict[str, Any]], str]:
-        """Get items from Items_tbl by UPC codes"""
+    def _item_select(self, profile: str) -> str:
+        """SELECT ... FROM clause for a projection profile; Units_tbl is joined only when needed"""
+        columns = ITEM_PROFILES[profile]
+        query = f"SELECT {', '.join(ITEM_COLUMN_SQL[column] for column in columns)} FROM Items_tbl i"
+        if 'UnitDesc' in columns:
+            query += " LEFT JOIN Units_tbl u ON i.UnitID = u.UnitID"
+        return query
+    
+    def _query_items_bucket(self, bucket: List[str], profile: str = 'full') -> List[Dict[str, Any]]:
+        """Look up one bucket of UPCs, padded to a fixed IN-list size"""
+        size = next(size for size in UPC_BUCKET_SIZES if size >= len(bucket))
+        # Repeating a UPC does not change the result but keeps the statement text identical
+        params = bucket + [bucket[-1]] * (size - len(bucket))
+        placeholders = ','.join(['?'] * size)
+        
+        query = f"""
+        {self._item_select(profile)}
+        WHERE i.ProductUPC IN ({placeholders})
+        """
+        
+        with self._connection(timeout=30) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def _get_server_capabilities(self) -> Dict[str, int]:
+        """Server major version and database compatibility level (cached per service)"""
+        if self._server_capabilities is None:
+            query = """
+            SELECT
+                @@MICROSOFTVERSION / 16777216 AS MajorVersion,
+                (SELECT compatibility_level FROM sys.databases WHERE name = DB_NAME()) AS CompatibilityLevel
+            """
+            with self._connection(timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                row = cursor.fetchone()
+                self._server_capabilities = {
+                    'major_version': int(row.MajorVersion or 0),
+                    'compatibility_level': int(row.CompatibilityLevel or 0)
+                }
+        return self._server_capabilities
+    
+    def _choose_upc_lookup_strategy(self, upc_count: int) -> str:
+        """Pick the UPC lookup strategy from the list size and what the server supports"""
+        if upc_count <= UPC_SET_BASED_THRESHOLD:
+            return 'buckets'
         try:
+            capabilities = self._get_server_capabilities()
+        except pyodbc.Error as e:
+            logger.warning(f"Could not detect server version, using bucketed UPC lookup: {e}")
+            return 'buckets'
+        # OPENJSON needs SQL Server 2016+ and database compatibility level 130+
+        if capabilities['major_version'] >= 13 and capabilities['compatibility_level'] >= 130:
+            return 'openjson'
+        # SQL Server 2012/2014 targets: bulk-load a temp table and join against it
+        return 'temp_table'
+    
+    def _query_items_openjson(self, upcs: List[str], profile: str = 'full') -> List[Dict[str, Any]]:
+        """Look up all UPCs with a single JSON array parameter"""
+        query = f"""
+        {self._item_select(profile)}
+        WHERE i.ProductUPC IN (
+            SELECT j.UPC FROM OPENJSON(?) WITH (UPC nvarchar(20) '$') j
+        )
+        """
+        
+        with self._connection(timeout=30) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (json.dumps(upcs),))
+            
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def _query_items_temp_table(self, upcs: List[str], profile: str = 'full') -> List[Dict[str, Any]]:
+        """Look up all UPCs by bulk-loading them into a #upcs temp table and joining"""
+        query = f"""
+        {self._item_select(profile)}
+        WHERE i.ProductUPC IN (SELECT UPC FROM #upcs)
+        """
+        
+        with self._connection(timeout=30) as conn:
+            cursor = conn.cursor()
+            # A pooled session may still hold the table if an earlier lookup failed mid-way
+            cursor.execute("IF OBJECT_ID('tempdb..#upcs') IS NOT NULL DROP TABLE #upcs")
+            cursor.execute("CREATE TABLE #upcs (UPC nvarchar(20) NOT NULL)")
+            try:
+                cursor.fast_executemany = True
+                cursor.setinputsizes([(pyodbc.SQL_WVARCHAR, UPC_MAX_LENGTH, 0)])
+                cursor.executemany("INSERT INTO #upcs (UPC) VALUES (?)", [(upc,) for upc in upcs])
+                cursor.fast_executemany = False
+                cursor.execute("CREATE CLUSTERED INDEX IX_upcs ON #upcs (UPC)")
+                
+                cursor.execute(query)
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                try:
+                    cursor.execute("DROP TABLE #upcs")
+                except pyodbc.Error as e:
+                    # Never mask the lookup's own error; the next lookup on this session drops the table
+                    logger.warning(f"Could not drop #upcs temp table: {e}")
+    
+    def _lookup_items(self, keys: List[str], profile: str = 'full', raw_upcs: List[str] = ()) -> List[Dict[str, Any]]:
+        """Resolve normalized UPC keys from the catalog mirror when ready, otherwise from SQL Server.
+
+        raw_upcs are the uploaded codes (trimmed) behind the keys; the live query also sends them as-is.
+        """
+        if getattr(self.config, 'catalog_mirror_enabled', False):
+            mirror = get_mirror(self.config.id)
+            mirror.refresh_in_background(self)
+            if mirror.is_ready():
+                return mirror.get_items_by_keys(keys, ITEM_PROFILES[profile])
+            # First sync still running: fall through to a live lookup
+
+        # ProductUPC has no normalized column server-side, so send every padded form of each key,
+        # plus each code as uploaded for catalogs storing dashes, spaces or other zero padding
+        unique_upcs = [
+            upc for upc in dict.fromkeys([upc for key in keys for upc in key_variants(key)] + list(raw_upcs))
+            if upc and len(upc) <= UPC_MAX_LENGTH
+        ]
+        strategy = self._choose_upc_lookup_strategy(len(unique_upcs))
+        logger.info(f"Looking up {len(unique_upcs)} UPCs using {strategy} strategy")
+        
+        if strategy == 'openjson':
+            items = self._query_items_openjson(unique_upcs, profile)
+        elif strategy == 'temp_table':
+            items = self._query_items_temp_table(unique_upcs, profile)
+        else:
+            # Split into buckets that stay under SQL Server's 2,100 parameter limit
+            bucket_size = UPC_BUCKET_SIZES[-1]
+            buckets = [unique_upcs[i:i + bucket_size] for i in range(0, len(unique_upcs), bucket_size)]
+            
+            if len(buckets) == 1:
+                items = self._query_items_bucket(buckets[0], profile)
+            else:
+                # Each bucket borrows its own pooled connection
+                items = []
+                for bucket_items in _lookup_executor.map(lambda bucket: self._query_items_bucket(bucket, profile), buckets):
+                    items.extend(bucket_items)
+        
+        return items
+    
+    def get_items_by_upcs(self, upcs: List[str], profile: str = 'full') -> Tuple[bool, List[Dict[str, Any]], str]:
+        """Get items from Items_tbl by UPC codes, selecting only the columns of a projection profile"""
+        try:
+            if profile not in ITEM_PROFILES:
+                return False, [], f"Unknown item profile: {profile}"
+            
             if not upcs:
                 return True, [], "No UPCs provided"
             
-            # Create placeholders for parameterized query
-            placeholders = ','.join(['?' for _ in upcs])
+            # One normalized key per code (plus a check-digit completion for truncated codes),
+            # de-duplicated, dropping values too long to ever match ProductUPC
+            raw_by_key = {}
+            for upc in upcs:
+                for key, _ in lookup_keys(upc):
+                    raw_by_key.setdefault(key, set()).add(str(upc).strip())
+            keys = [key for key in raw_by_key if len(key) <= UPC_MAX_LENGTH]
+            if not keys:
+                return True, [], "Found 0 items"
+            
+            # Repeat uploads of the same file are served from the in-process cache
+            cached, missing_keys = item_cache.get_many(self.config.id, profile, keys)
+            items = [item for matches in cached.values() for item in matches]
+            if missing_keys:
+                raw_upcs = [upc for key in missing_keys for upc in sorted(raw_by_key[key])]
+                fetched = self._lookup_items(missing_keys, profile, raw_upcs)
+                item_cache.put_many(self.config.id, profile, missing_keys, fetched)
+                items.extend(fetched)
             
+            return True, items, f"Found {len(items)} items"
+                
+        except pyodbc.Error as e:
+            logger.error(f"Database query failed: {e}")
+            return False, [], f"Database query failed: {str(e)}"
+        except Exception as e:
+            logger.error(f"Unexpected error during items query: {e}")
+            return False, [], f"Unexpected error: {str(e)}"
+
+    def get_item_ext_descriptions(self, product_ids: List[int]) -> Tuple[bool, Dict[int, str], str]:
+        """Fetch the ntext ExtDescription for specific items, on demand"""
+        try:
+            ids = list(dict.fromkeys(int(product_id) for product_id in product_ids))
+            if not ids:
+                return True, {}, "No product IDs provided"
+            
+            descriptions = {}
+            bucket_size = UPC_BUCKET_SIZES[-1]
+            with self._connection(timeout=30) as conn:
+                cursor = conn.cursor()
+                for i in range(0, len(ids), bucket_size):
+                    bucket = ids[i:i + bucket_size]
+                    size = next(size for size in UPC_BUCKET_SIZES if size >= len(bucket))
+                    params = bucket + [bucket[-1]] * (size - len(bucket))
+                    cursor.execute(
+                        f"SELECT ProductID, CAST(ExtDescription AS nvarchar(max)) AS ExtDescription "
+                        f"FROM Items_tbl WHERE ProductID IN ({','.join(['?'] * size)})",
+                        params
+                    )
+                    for row in cursor.fetchall():
+                        descriptions[int(row.ProductID)] = row.ExtDescription or ''
+            
+            return True, descriptions, f"Found {len(descriptions)} descriptions"
+            
+        except pyodbc.Error as e:
+            logger.error(f"Failed to get item extended descriptions: {e}")
+            return False, {}, f"Database query failed: {str(e)}"
+        except Exception as e:
+            logger.error(f"Unexpected error getting item extended descriptions: {e}")
+            return False, {}, f"Unexpected error: {str(e)}"
+
+    def get_item_block_checksums(self, block_size: int) -> Tuple[bool, Dict[int, Tuple[int, int]], str]:
+        """Checksum and row count of the item columns per ProductID block, for catalog mirror sync"""
+        try:
+            block_size = int(block_size)
+            # Same columns as ITEM_COLUMNS; ntext is not checksummable so ExtDescription is cast
             query = f"""
-            SELECT 
-                i.ProductID, i.CateID, i.SubCateID, i.ProductSKU, i.ProductUPC,
-                i.ProductDescription, i.ItemSize, i.UnitPrice, i.UnitCost, 
-                i.ItemWeight, i.ItemTaxID, i.SPPromoted, i.SPPromotionDescription,
-                i.Discontinued, i.UnitID, i.CountInUnit, i.ProductMessage,
-                i.UnitPrice as OriginalPrice, i.UnitQty2, i.UnitQty3, i.UnitQty4,
-                i.QuantOnHand, i.QuantOnOrder, i.LastReceived, i.LastSold,
-                i.ReorderLevel, i.ReorderQuant, i.ExtDescription,
-                u.UnitDesc
+            SELECT
+                i.ProductID / {block_size} AS BlockID,
+                CHECKSUM_AGG(BINARY_CHECKSUM(
+                    i.ProductID, i.CateID, i.SubCateID, i.ProductSKU, i.ProductUPC,
+                    i.ProductDescription, i.ItemSize, i.UnitPrice, i.UnitCost,
+                    i.ItemWeight, i.ItemTaxID, i.SPPromoted, i.SPPromotionDescription,
+                    i.Discontinued, i.UnitID, i.CountInUnit, i.ProductMessage,
+                    i.UnitQty2, i.UnitQty3, i.UnitQty4,
+                    i.QuantOnHand, i.QuantOnOrder, i.LastReceived, i.LastSold,
+                    i.ReorderLevel, i.ReorderQuant, CAST(i.ExtDescription AS nvarchar(max)),
+                    u.UnitDesc
+                )) AS BlockChecksum,
+                COUNT(*) AS ItemCount
             FROM Items_tbl i
             LEFT JOIN Units_tbl u ON i.UnitID = u.UnitID
-            WHERE i.ProductUPC IN ({placeholders})
+            GROUP BY i.ProductID / {block_size}
             """
-            
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
+
+            with self._connection(timeout=120) as conn:
                 cursor = conn.cursor()
-                cursor.execute(query, upcs)
-                
+                cursor.execute(query)
+                blocks = {int(row.BlockID): (int(row.BlockChecksum or 0), int(row.ItemCount)) for row in cursor.fetchall()}
+
+                return True, blocks, f"Found {len(blocks)} item blocks"
+
+        except pyodbc.Error as e:
+            logger.error(f"Failed to get item block checksums: {e}")
+            return False, {}, f"Database query failed: {str(e)}"
+        except Exception as e:
+            logger.error(f"Unexpected error getting item block checksums: {e}")
+            return False, {}, f"Unexpected error: {str(e)}"
+
+    def get_items_in_id_range(self, start_id: int, end_id: int) -> Tuple[bool, List[Dict[str, Any]], str]:
+        """Get items with start_id <= ProductID < end_id"""
+        try:
+            query = f"""
+            SELECT {ITEM_COLUMNS}
+            FROM Items_tbl i
+            LEFT JOIN Units_tbl u ON i.UnitID = u.UnitID
+            WHERE i.ProductID >= ? AND i.ProductID < ?
+            """
+
+            with self._connection(timeout=120) as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (start_id, end_id))
+
                 columns = [column[0] for column in cursor.description]
-                rows = cursor.fetchall()
-                
-                items = []
-                for row in rows:
-                    item = dict(zip(columns, row))
-                    items.append(item)
-                
+                items = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
                 return True, items, f"Found {len(items)} items"
-                
+
         except pyodbc.Error as e:
-            logger.error(f"Database query failed: {e}")
+            logger.error(f"Failed to get items in ID range: {e}")
             return False, [], f"Database query failed: {str(e)}"
         except Exception as e:
-            logger.error(f"Unexpected error during items query: {e}")
+            logger.error(f"Unexpected error getting items in ID range: {e}")
             return False, [], f"Unexpected error: {str(e)}"
-    
+
+    def verify_items_live(self, lines: List[Dict[str, Any]]) -> Tuple[bool, List[str], str]:
+        """Re-check cached or mirrored lines against Items_tbl before commit; returns UPCs whose item changed or vanished.
+
+        Each line is compared on the item fields it copied (its ITEM_FIELDS, or LIVE_CHECK_FIELDS for client-sent dicts).
+        """
+        try:
+            served_locally = getattr(self.config, 'catalog_mirror_enabled', False) or item_cache.max_entries > 0
+            if not served_locally or not lines:
+                return True, [], "Live re-check not needed"
+
+            checked = []
+            for line in lines:
+                try:
+                    product_id = int(line.get('ProductID'))
+                except (TypeError, ValueError):
+                    continue
+                checked.append((product_id, line, getattr(line, 'ITEM_FIELDS', None) or LIVE_CHECK_FIELDS))
+            if not checked:
+                return True, [], "Live re-check not needed"
+
+            fields = list(dict.fromkeys(field for _, _, line_fields in checked for field in line_fields))
+            product_ids = list(dict.fromkeys(product_id for product_id, _, _ in checked))
+            select = ', '.join(['i.ProductID'] + [ITEM_COLUMN_SQL[field] for field in fields])
+            bucket_size = UPC_BUCKET_SIZES[-1]
+            live = {}
+            with self._connection(timeout=30) as conn:
+                cursor = conn.cursor()
+                for i in range(0, len(product_ids), bucket_size):
+                    bucket = product_ids[i:i + bucket_size]
+                    size = next(size for size in UPC_BUCKET_SIZES if size >= len(bucket))
+                    params = bucket + [bucket[-1]] * (size - len(bucket))
+                    cursor.execute(
+                        f"SELECT {select} FROM Items_tbl i LEFT JOIN Units_tbl u ON i.UnitID = u.UnitID "
+                        f"WHERE i.ProductID IN ({','.join(['?'] * size)})",
+                        params
+                    )
+                    columns = [column[0] for column in cursor.description]
+                    for row in cursor.fetchall():
+                        item = dict(zip(columns, row))
+                        live[int(item['ProductID'])] = item
+
+            stale_upcs = []
+            stale_keys = []
+            for product_id, line, line_fields in checked:
+                item = live.get(product_id)
+                if item is not None and all(
+                    _live_check_value(field, line.get(field)) == _live_check_value(field, item.get(field))
+                    for field in line_fields
+                ):
+                    continue
+                upc = str(line.get('ProductUPC') or '')
+                if upc not in stale_upcs:
+                    stale_upcs.append(upc)
+                stale_keys.append(gtin_key(upc))
+                if item is not None:
+                    stale_keys.append(gtin_key(str(item.get('ProductUPC') or '')))
+
+            if stale_upcs:
+                # Cached and mirrored rows are behind; drop them so the next preview sees the change
+                item_cache.invalidate(self.config.id, stale_keys)
+                if getattr(self.config, 'catalog_mirror_enabled', False):
+                    get_mirror(self.config.id).refresh_in_background(self)
+                return True, stale_upcs, f"{len(stale_upcs)} items changed since preview"
+            return True, [], "All items verified"
+
+        except pyodbc.Error as e:
+            logger.error(f"Live item re-check failed: {e}")
+            return False, [], f"Database query failed: {str(e)}"
+        except Exception as e:
+            logger.error(f"Unexpected error during live item re-check: {e}")
+            return False, [], f"Unexpected error: {str(e)}"
+
     def get_next_invoice_number(self) -> Tuple[bool, int, str]:
-        """Get the next invoice number by incrementing the highest existing number"""
+        """Get the next invoice number from the cached high-water mark (full scan only when cold or drifted)"""
         try:
-            query = """
-            SELECT MAX(CAST(InvoiceNumber AS INT)) as MaxInvoiceNumber
-            FROM Invoices_tbl 
-            WHERE ISNUMERIC(InvoiceNumber) = 1
-            """
-            
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
+            with self._connection(timeout=30) as conn:
                 cursor = conn.cursor()
-                cursor.execute(query)
-                result = cursor.fetchone()
-                
-                max_number = result.MaxInvoiceNumber if result.MaxInvoiceNumber else 0
-                next_number = max_number + 1
+                next_number = get_invoice_allocator(self.config.id).peek_next(cursor)
                 
                 return True, next_number, f"Next invoice number: {next_number}"
                 
@@ -166,131 +591,233 @@ class DatabaseService:
             logger.error(f"Unexpected error getting next invoice number: {e}")
             return False, 1, f"Unexpected error: {str(e)}"
     
-    def create_invoice(self, invoice_data: Dict[str, Any], invoice_details: List[Dict[str, Any]]) -> Tuple[bool, int, str]:
-        """Create a new invoice with details"""
+    def reserve_invoice_numbers(self, count: int) -> Tuple[bool, int, str]:
+        """Reserve a block of consecutive invoice numbers for a batch import; returns the first"""
         try:
-            with pyodbc.connect(self.connection_string, timeout=60) as conn:
+            if count < 1:
+                return False, 0, "Count must be at least 1"
+            
+            with self._connection(timeout=30) as conn:
                 cursor = conn.cursor()
+                first_number = get_invoice_allocator(self.config.id).reserve_block(cursor, count)
                 
-                # Start transaction
-                conn.autocommit = False
+                return True, first_number, f"Reserved invoice numbers {first_number}-{first_number + count - 1}"
                 
+        except pyodbc.Error as e:
+            logger.error(f"Failed to reserve invoice numbers: {e}")
+            return False, 0, f"Database query failed: {str(e)}"
+        except Exception as e:
+            logger.error(f"Unexpected error reserving invoice numbers: {e}")
+            return False, 0, f"Unexpected error: {str(e)}"
+    
+    def _bulk_insert(self, conn, query: str, rows: List[tuple], column_types: tuple):
+        """Insert rows as chunked parameter arrays (fast_executemany) instead of one round trip per row"""
+        if not rows:
+            return
+        
+        input_sizes = []
+        for index, column_type in enumerate(column_types):
+            if column_type == 'int':
+                input_sizes.append((pyodbc.SQL_INTEGER, 0, 0))
+            elif column_type == 'float':
+                input_sizes.append((pyodbc.SQL_FLOAT, 0, 0))
+            elif column_type == 'datetime':
+                input_sizes.append((pyodbc.SQL_TYPE_TIMESTAMP, 23, 3))
+            else:
+                # Never declare a string shorter than the data, or the driver raises a truncation error
+                longest = max(len(row[index]) for row in rows)
+                input_sizes.append((pyodbc.SQL_WVARCHAR, max(column_type[1], longest), 0))
+        
+        cursor = conn.cursor()
+        try:
+            cursor.fast_executemany = True
+            cursor.setinputsizes(input_sizes)
+            for start in range(0, len(rows), DETAIL_INSERT_CHUNK_SIZE):
+                cursor.executemany(query, rows[start:start + DETAIL_INSERT_CHUNK_SIZE])
+        finally:
+            cursor.close()
+    
+    def insert_invoice(self, conn, invoice_data: Dict[str, Any], invoice_details: List[Dict[str, Any]]) -> Tuple[int, bool]:
+        """Insert an invoice inside the caller's open transaction; raises on failure.
+
+        Returns the new InvoiceID and whether its number had to be reassigned. The caller
+        commits, confirms invoice_data['invoice_number'] with the allocator and then
+        calls _unlock_invoice_numbers (after a rollback as well).
+        """
+        cursor = conn.cursor()
+        
+        # Lock number assignment until the caller commits or rolls back, and move off
+        # a number someone else committed since the preview was built
+        invoice_number, reassigned = get_invoice_allocator(self.config.id).assign(cursor, invoice_data.get('invoice_number'))
+        invoice_data['invoice_number'] = invoice_number
+        
+        # Insert invoice header with customer information and proper NULL handling
+        insert_invoice_query = """
+        INSERT INTO Invoices_tbl (
+            InvoiceNumber, InvoiceDate, InvoiceType, InvoiceTitle,
+            CustomerID, BusinessName, AccountNo, 
+            PoNumber, ShipDate, Shipto, ShipAddress1, ShipAddress2, ShipContact,
+            ShipCity, ShipState, ShipZipCode, ShipPhoneNo,
+            DriverID, TermID, SalesRepID, ShipperID, TrackingNo, ShippingCost,
+            TotQtyOrd, TotQtyShp, TotQtyRtrnd, NoLines, TotalWeight,
+            InvoiceSubtotal, TotalTaxes, InvoiceTotal, 
+            Notes, Header, Footer, Imported, Pos, Void
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        
+        cursor.execute(insert_invoice_query, (
+            self._safe_string_for_db(invoice_data.get('invoice_number')),        # String
+            self._safe_string_for_db(invoice_data.get('invoice_date')),          # String
+            self._safe_string_for_db(invoice_data.get('invoice_type', 'Purchase')), # String
+            self._safe_string_for_db(invoice_data.get('invoice_title', 'Excel Import')), # String
+            self._safe_int_for_db(invoice_data.get('customer_id')),              # Integer
+            self._safe_string_for_db(invoice_data.get('business_name')),         # String
+            self._safe_string_for_db(invoice_data.get('account_no')),            # String
+            self._safe_string_for_db(invoice_data.get('po_number')),             # String - PO Number
+            datetime.now(),                                                      # Date - Today's date
+            self._safe_string_for_db(invoice_data.get('ship_to')),               # String
+            self._safe_string_for_db(invoice_data.get('ship_address1')),         # String
+            self._safe_string_for_db(invoice_data.get('ship_address2')),         # String
+            self._safe_string_for_db(invoice_data.get('ship_contact')),          # String
+            self._safe_string_for_db(invoice_data.get('ship_city')),             # String
+            self._safe_string_for_db(invoice_data.get('ship_state')),            # String
+            self._safe_string_for_db(invoice_data.get('ship_zipcode')),          # String
+            self._safe_string_for_db(invoice_data.get('ship_phone')),            # String
+            self._safe_int_for_db(invoice_data.get('driver_id')),                # Integer
+            self._safe_int_for_db(invoice_data.get('term_id')),                  # Integer
+            self._safe_int_for_db(invoice_data.get('sales_rep_id')),             # Integer
+            self._safe_int_for_db(invoice_data.get('shipper_id')),               # Integer
+            self._safe_string_for_db(invoice_data.get('tracking_no')),           # String
+            self._safe_float_for_db(invoice_data.get('shipping_cost')),          # Money/Float
+            self._safe_float_for_db(invoice_data.get('total_qty_ordered')),      # Float
+            self._safe_float_for_db(invoice_data.get('total_qty_shipped')),      # Float
+            0,                                                                   # TotQtyRtrnd = 0
+            self._safe_int_for_db(invoice_data.get('no_lines')),                 # Integer
+            self._safe_float_for_db(invoice_data.get('total_weight')),           # Float
+            self._safe_float_for_db(invoice_data.get('invoice_subtotal')),       # Float
+            self._safe_float_for_db(invoice_data.get('total_taxes')),            # Float
+            self._safe_float_for_db(invoice_data.get('invoice_total')),          # Float
+            self._safe_string_for_db(''),                                        # Notes - empty string
+            self._safe_string_for_db(''),                                        # Header - empty string
+            self._safe_string_for_db(''),                                        # Footer - empty string
+            1,  # Imported = True
+            0,  # Pos = False
+            0   # Void = False
+        ))
+        
+        # Get the inserted InvoiceID
+        cursor.execute("SELECT @@IDENTITY")
+        invoice_id = cursor.fetchone()[0]
+        
+        # Insert invoice details with additional fields and proper NULL handling
+        insert_detail_query = """
+        INSERT INTO InvoicesDetails_tbl (
+            InvoiceID, CateID, SubCateID, ProductID, ProductSKU,
+            ProductUPC, ProductDescription, ItemSize, UnitPrice, OriginalPrice,
+            UnitCost, QtyOrdered, QtyShipped, ExtendedPrice, ExtendedCost,
+            ItemWeight, ItemTaxID, Taxable, SPPromoted, SPPromotionDescription,
+            LineMessage, UnitDesc, UnitQty, 
+            RememberPrice, Discount, ds_Percent, Packing, ExtendedDisc,
+            PromotionDescription, PromotionAmount, Void
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        
+        detail_rows = [
+            (
+                invoice_id,                                                        # Integer (auto-generated)
+                self._safe_int_for_db(detail.get('CateID')),                     # Integer
+                self._safe_int_for_db(detail.get('SubCateID')),                  # Integer
+                self._safe_int_for_db(detail.get('ProductID')),                  # Integer
+                self._safe_string_for_db(detail.get('ProductSKU')),              # String
+                self._safe_string_for_db(detail.get('ProductUPC')),              # String
+                self._safe_string_for_db(detail.get('ProductDescription')),      # String
+                self._safe_string_for_db(detail.get('ItemSize')),                # String
+                self._safe_float_for_db(detail.get('UnitPrice')),                # Float
+                self._safe_float_for_db(detail.get('OriginalPrice')),            # Float
+                self._safe_float_for_db(detail.get('UnitCost')),                 # Float
+                self._safe_float_for_db(detail.get('QtyOrdered')),               # Float
+                self._safe_float_for_db(detail.get('QtyShipped')),               # Float
+                self._safe_float_for_db(detail.get('ExtendedPrice')),            # Float
+                self._safe_float_for_db(detail.get('ExtendedCost')),             # Float
+                self._safe_float_for_db(detail.get('ItemWeight')),               # Float
+                self._safe_int_for_db(detail.get('ItemTaxID')),                  # Integer
+                1 if detail.get('Taxable', False) else 0,                        # Boolean as int
+                1 if detail.get('SPPromoted', False) else 0,                     # Boolean as int
+                self._safe_string_for_db(detail.get('SPPromotionDescription')),  # String
+                self._safe_string_for_db(detail.get('LineMessage')),             # String
+                self._safe_string_for_db(detail.get('UnitDesc')),                # String
+                self._safe_float_for_db(detail.get('UnitQty')),                  # Float
+                0.0,                                                             # RememberPrice = 0
+                0.0,                                                             # Discount = 0
+                0.0,                                                             # ds_Percent = 0
+                self._safe_string_for_db(''),                                   # Packing = blank
+                0.0,                                                             # ExtendedDisc = 0
+                self._safe_string_for_db(''),                                   # PromotionDescription = blank
+                0.0,                                                             # PromotionAmount = 0
+                0  # Void = False
+            )
+            for detail in invoice_details
+        ]
+        self._bulk_insert(conn, insert_detail_query, detail_rows, INVOICE_DETAIL_COLUMN_TYPES)
+        
+        return invoice_id, reassigned
+    
+    def _commit(self, conn):
+        """Commit; a lost connection at this point is reported as an unknown outcome, never as retryable"""
+        try:
+            conn.commit()
+        except pyodbc.Error as e:
+            if is_connection_error(e):
+                raise CommitOutcomeUnknownError(f"Connection lost while committing: {str(e)}") from e
+            raise
+    
+    def _rollback_invoices(self, conn):
+        """Roll back; numbers seen inside the transaction may never have been committed"""
+        conn.rollback()
+        get_invoice_allocator(self.config.id).discard()
+    
+    def _unlock_invoice_numbers(self, conn):
+        """Release the invoice-number lock after commit or rollback (a lost connection has already dropped it)"""
+        try:
+            cursor = conn.cursor()
+            try:
+                get_invoice_allocator(self.config.id).unlock(cursor)
+            finally:
+                cursor.close()
+        except pyodbc.Error as e:
+            logger.warning(f"Could not release invoice number lock: {e}")
+    
+    def commit_invoice(self, invoice_data: Dict[str, Any], invoice_details: List[Dict[str, Any]]) -> Tuple[int, str]:
+        """Insert and commit an invoice in its own transaction; returns the InvoiceID and a message, raises on failure"""
+        with self._connection(timeout=60) as conn:
+            # Start transaction
+            conn.autocommit = False
+            
+            try:
                 try:
-                    # Insert invoice header with customer information and proper NULL handling
-                    insert_invoice_query = """
-                    INSERT INTO Invoices_tbl (
-                        InvoiceNumber, InvoiceDate, InvoiceType, InvoiceTitle,
-                        CustomerID, BusinessName, AccountNo, 
-                        PoNumber, ShipDate, Shipto, ShipAddress1, ShipAddress2, ShipContact,
-                        ShipCity, ShipState, ShipZipCode, ShipPhoneNo,
-                        DriverID, TermID, SalesRepID, ShipperID, TrackingNo, ShippingCost,
-                        TotQtyOrd, TotQtyShp, TotQtyRtrnd, NoLines, TotalWeight,
-                        InvoiceSubtotal, TotalTaxes, InvoiceTotal, 
-                        Notes, Header, Footer, Imported, Pos, Void
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """
-                    
-                    cursor.execute(insert_invoice_query, (
-                        self._safe_string_for_db(invoice_data.get('invoice_number')),        # String
-                        self._safe_string_for_db(invoice_data.get('invoice_date')),          # String
-                        self._safe_string_for_db(invoice_data.get('invoice_type', 'Purchase')), # String
-                        self._safe_string_for_db(invoice_data.get('invoice_title', 'Excel Import')), # String
-                        self._safe_int_for_db(invoice_data.get('customer_id')),              # Integer
-                        self._safe_string_for_db(invoice_data.get('business_name')),         # String
-                        self._safe_string_for_db(invoice_data.get('account_no')),            # String
-                        self._safe_string_for_db(invoice_data.get('po_number')),             # String - PO Number
-                        datetime.now(),                                                      # Date - Today's date
-                        self._safe_string_for_db(invoice_data.get('ship_to')),               # String
-                        self._safe_string_for_db(invoice_data.get('ship_address1')),         # String
-                        self._safe_string_for_db(invoice_data.get('ship_address2')),         # String
-                        self._safe_string_for_db(invoice_data.get('ship_contact')),          # String
-                        self._safe_string_for_db(invoice_data.get('ship_city')),             # String
-                        self._safe_string_for_db(invoice_data.get('ship_state')),            # String
-                        self._safe_string_for_db(invoice_data.get('ship_zipcode')),          # String
-                        self._safe_string_for_db(invoice_data.get('ship_phone')),            # String
-                        self._safe_int_for_db(invoice_data.get('driver_id')),                # Integer
-                        self._safe_int_for_db(invoice_data.get('term_id')),                  # Integer
-                        self._safe_int_for_db(invoice_data.get('sales_rep_id')),             # Integer
-                        self._safe_int_for_db(invoice_data.get('shipper_id')),               # Integer
-                        self._safe_string_for_db(invoice_data.get('tracking_no')),           # String
-                        self._safe_float_for_db(invoice_data.get('shipping_cost')),          # Money/Float
-                        self._safe_float_for_db(invoice_data.get('total_qty_ordered')),      # Float
-                        self._safe_float_for_db(invoice_data.get('total_qty_shipped')),      # Float
-                        0,                                                                   # TotQtyRtrnd = 0
-                        self._safe_int_for_db(invoice_data.get('no_lines')),                 # Integer
-                        self._safe_float_for_db(invoice_data.get('total_weight')),           # Float
-                        self._safe_float_for_db(invoice_data.get('invoice_subtotal')),       # Float
-                        self._safe_float_for_db(invoice_data.get('total_taxes')),            # Float
-                        self._safe_float_for_db(invoice_data.get('invoice_total')),          # Float
-                        self._safe_string_for_db(''),                                        # Notes - empty string
-                        self._safe_string_for_db(''),                                        # Header - empty string
-                        self._safe_string_for_db(''),                                        # Footer - empty string
-                        1,  # Imported = True
-                        0,  # Pos = False
-                        0   # Void = False
-                    ))
-                    
-                    # Get the inserted InvoiceID
-                    cursor.execute("SELECT @@IDENTITY")
-                    invoice_id = cursor.fetchone()[0]
-                    
-                    # Insert invoice details with additional fields and proper NULL handling
-                    insert_detail_query = """
-                    INSERT INTO InvoicesDetails_tbl (
-                        InvoiceID, CateID, SubCateID, ProductID, ProductSKU,
-                        ProductUPC, ProductDescription, ItemSize, UnitPrice, OriginalPrice,
-                        UnitCost, QtyOrdered, QtyShipped, ExtendedPrice, ExtendedCost,
-                        ItemWeight, ItemTaxID, Taxable, SPPromoted, SPPromotionDescription,
-                        LineMessage, UnitDesc, UnitQty, 
-                        RememberPrice, Discount, ds_Percent, Packing, ExtendedDisc,
-                        PromotionDescription, PromotionAmount, Void
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """
-                    
-                    for detail in invoice_details:
-                        cursor.execute(insert_detail_query, (
-                            invoice_id,                                                        # Integer (auto-generated)
-                            self._safe_int_for_db(detail.get('CateID')),                     # Integer
-                            self._safe_int_for_db(detail.get('SubCateID')),                  # Integer
-                            self._safe_int_for_db(detail.get('ProductID')),                  # Integer
-                            self._safe_string_for_db(detail.get('ProductSKU')),              # String
-                            self._safe_string_for_db(detail.get('ProductUPC')),              # String
-                            self._safe_string_for_db(detail.get('ProductDescription')),      # String
-                            self._safe_string_for_db(detail.get('ItemSize')),                # String
-                            self._safe_float_for_db(detail.get('UnitPrice')),                # Float
-                            self._safe_float_for_db(detail.get('OriginalPrice')),            # Float
-                            self._safe_float_for_db(detail.get('UnitCost')),                 # Float
-                            self._safe_float_for_db(detail.get('QtyOrdered')),               # Float
-                            self._safe_float_for_db(detail.get('QtyShipped')),               # Float
-                            self._safe_float_for_db(detail.get('ExtendedPrice')),            # Float
-                            self._safe_float_for_db(detail.get('ExtendedCost')),             # Float
-                            self._safe_float_for_db(detail.get('ItemWeight')),               # Float
-                            self._safe_int_for_db(detail.get('ItemTaxID')),                  # Integer
-                            1 if detail.get('Taxable', False) else 0,                        # Boolean as int
-                            1 if detail.get('SPPromoted', False) else 0,                     # Boolean as int
-                            self._safe_string_for_db(detail.get('SPPromotionDescription')),  # String
-                            self._safe_string_for_db(detail.get('LineMessage')),             # String
-                            self._safe_string_for_db(detail.get('UnitDesc')),                # String
-                            self._safe_float_for_db(detail.get('UnitQty')),                  # Float
-                            0.0,                                                             # RememberPrice = 0
-                            0.0,                                                             # Discount = 0
-                            0.0,                                                             # ds_Percent = 0
-                            self._safe_string_for_db(''),                                   # Packing = blank
-                            0.0,                                                             # ExtendedDisc = 0
-                            self._safe_string_for_db(''),                                   # PromotionDescription = blank
-                            0.0,                                                             # PromotionAmount = 0
-                            0  # Void = False
-                        ))
-                    
-                    # Commit transaction
-                    conn.commit()
-                    
-                    return True, invoice_id, f"Invoice {invoice_data['invoice_number']} created successfully"
-                    
+                    requested_number = invoice_data.get('invoice_number')
+                    invoice_id, reassigned = self.insert_invoice(conn, invoice_data, invoice_details)
+                    invoice_number = invoice_data['invoice_number']
                 except Exception as e:
-                    conn.rollback()
+                    self._rollback_invoices(conn)
                     raise e
                 
+                # Commit transaction, then record the number before other writers may take the lock
+                self._commit(conn)
+                get_invoice_allocator(self.config.id).confirm(invoice_number)
+            finally:
+                self._unlock_invoice_numbers(conn)
+            
+            if reassigned:
+                return invoice_id, f"Invoice number {requested_number} was already taken; invoice {invoice_number} created successfully"
+            return invoice_id, f"Invoice {invoice_number} created successfully"
+    
+    def create_invoice(self, invoice_data: Dict[str, Any], invoice_details: List[Dict[str, Any]]) -> Tuple[bool, int, str]:
+        """Create a new invoice with details"""
+        try:
+            invoice_id, message = self.commit_invoice(invoice_data, invoice_details)
+            return True, invoice_id, message
+            
         except pyodbc.Error as e:
             logger.error(f"Failed to create invoice: {e}")
             return False, 0, f"Database error: {str(e)}"
@@ -315,7 +842,7 @@ class DatabaseService:
             
             search_term = f"%{account_search}%"
             
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
+            with self._connection(timeout=30) as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, (search_term,))
                 
@@ -351,7 +878,7 @@ class DatabaseService:
             WHERE CustomerID = ?
             """
             
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
+            with self._connection(timeout=30) as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, (customer_id,))
                 
@@ -374,7 +901,7 @@ class DatabaseService:
     def execute_query(self, query: str, params: List[Any] = None) -> Tuple[bool, List[Dict[str, Any]], str]:
         """Execute a generic query and return results"""
         try:
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
+            with self._connection(timeout=30) as conn:
                 cursor = conn.cursor()
                 
                 if params:
@@ -417,7 +944,7 @@ class DatabaseService:
             
             search_term = f"%{account_search}%"
             
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
+            with self._connection(timeout=30) as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, (search_term,))
                 
@@ -450,7 +977,7 @@ class DatabaseService:
             WHERE SupplierID = ?
             """
             
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
+            with self._connection(timeout=30) as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, (supplier_id,))
                 
@@ -473,39 +1000,38 @@ class DatabaseService:
     def get_next_po_number(self) -> Tuple[bool, int, str]:
         """Get the next purchase order number by incrementing the highest existing number"""
         try:
-            # First, try to get all PO numbers and filter/convert them safely
-            query = """
-            SELECT PoNumber
-            FROM PurchaseOrders_tbl 
-            WHERE PoNumber IS NOT NULL AND PoNumber != ''
-            """
-            
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
-                cursor = conn.cursor()
-                cursor.execute(query)
-                results = cursor.fetchall()
-                
-                max_number = 0
-                
-                # Process each PO number to find the highest valid integer
-                for row in results:
-                    po_number = row.PoNumber
-                    if po_number:
-                        # Try to convert to int, skip if it fails or overflows
-                        try:
-                            # Only consider numeric values that can fit in a 32-bit int
-                            if po_number.isdigit() and len(po_number) <= 10:
-                                num_value = int(po_number)
-                                # Check if it's within reasonable bounds (avoid overflow)
-                                if 0 <= num_value <= 2147483647:  # Max 32-bit signed int
-                                    max_number = max(max_number, num_value)
-                        except (ValueError, OverflowError):
-                            # Skip invalid numbers
-                            continue
-                
-                next_number = max_number + 1
+            max_number = get_po_number_cache(self.config.id).get_cached_max()
+            if max_number is None:
+                # Only purely numeric PO numbers that fit a 32-bit int count
+                if self._supports_try_cast():
+                    numeric_value = "TRY_CAST(PoNumber AS bigint)"
+                else:
+                    # SQL Server 2012 databases at compatibility level < 110 have no TRY_CAST;
+                    # the CASE guard keeps CAST away from non-numeric values
+                    numeric_value = "CASE WHEN PoNumber NOT LIKE '%[^0-9]%' THEN CAST(PoNumber AS bigint) END"
+                query = f"""
+                SELECT MAX(n.Value) AS MaxPoNumber
+                FROM (
+                    SELECT {numeric_value} AS Value
+                    FROM PurchaseOrders_tbl
+                    WHERE PoNumber NOT LIKE '%[^0-9]%' AND LEN(PoNumber) BETWEEN 1 AND 10
+                ) n
+                WHERE n.Value <= 2147483647
+                """
                 
-                return True, next_number, f"Next PO number: {next_number}"
+                with self._connection(timeout=30) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(query)
+                    result = cursor.fetchone()
+                    
+                    max_number = int(result.MaxPoNumber) if result.MaxPoNumber else 0
+                    get_po_number_cache(self.config.id).store_max(max_number)
+                    # Numbers reserved by a running batch import are not in the table yet
+                    max_number = get_po_number_cache(self.config.id).get_cached_max()
+            
+            next_number = max_number + 1
+            
+            return True, next_number, f"Next PO number: {next_number}"
                 
         except pyodbc.Error as e:
             logger.error(f"Failed to get next PO number: {e}")
@@ -513,6 +1039,27 @@ class DatabaseService:
         except Exception as e:
             logger.error(f"Unexpected error getting next PO number: {e}")
             return False, 1, f"Unexpected error: {str(e)}"
+    
+    def reserve_po_numbers(self, count: int) -> Tuple[bool, int, str]:
+        """Reserve a block of consecutive PO numbers for a batch import; returns the first"""
+        if count < 1:
+            return False, 0, "Count must be at least 1"
+        
+        success, next_number, message = self.get_next_po_number()
+        if not success:
+            return False, 0, message
+        
+        first_number = get_po_number_cache(self.config.id).reserve_block(next_number, count)
+        return True, first_number, f"Reserved PO numbers {first_number}-{first_number + count - 1}"
+    
+    def _supports_try_cast(self) -> bool:
+        """TRY_CAST needs SQL Server 2012+ and database compatibility level 110+"""
+        try:
+            capabilities = self._get_server_capabilities()
+        except pyodbc.Error as e:
+            logger.warning(f"Could not detect server version, assuming no TRY_CAST: {e}")
+            return False
+        return capabilities['major_version'] >= 11 and capabilities['compatibility_level'] >= 110
 
     def get_invoices_list(self, page: int = 1, per_page: int = 25, search: str = None) -> Tuple[bool, Dict[str, Any], str]:
         """Get paginated list of invoices with optional search by InvoiceNumber"""
@@ -540,7 +1087,7 @@ class DatabaseService:
 
             params_list = params + [offset, per_page]
 
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
+            with self._connection(timeout=30) as conn:
                 cursor = conn.cursor()
 
                 cursor.execute(count_query, params)
@@ -607,7 +1154,7 @@ class DatabaseService:
             WHERE InvoiceID = ?
             """
 
-            with pyodbc.connect(self.connection_string, timeout=30) as conn:
+            with self._connection(timeout=30) as conn:
                 cursor = conn.cursor()
 
                 cursor.execute(header_query, (invoice_id,))
@@ -643,107 +1190,215 @@ class DatabaseService:
             logger.error(f"Unexpected error getting invoice details: {e}")
             return False, {}, f"Unexpected error: {str(e)}"
 
+    def insert_purchase_order(self, conn, po_data: Dict[str, Any], po_details: List[Dict[str, Any]]) -> int:
+        """Insert a purchase order inside the caller's open transaction and return its PoID; raises on failure"""
+        cursor = conn.cursor()
+        
+        # Insert purchase order header with supplier information and proper NULL handling
+        insert_po_query = """
+        INSERT INTO PurchaseOrders_tbl (
+            PoDate, RequiredDate, PoNumber, SupplierID, BusinessName, AccountNo,
+            PoTitle, Status, Shipto, ShipAddress1, ShipAddress2, ShipContact,
+            ShipCity, ShipState, ShipZipCode, ShipPhoneNo, EmployeeID, TermID,
+            PoTotal, NoLines, ShipperID, TotQtyOrd, TotQtyRcv, 
+            Notes, PoHeader, PoFooter
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        
+        cursor.execute(insert_po_query, (
+            datetime.now(),                                                 # PoDate - today's date
+            datetime.now(),                                                 # RequiredDate - today's date
+            self._safe_string_for_db(po_data.get('po_number')),            # String
+            self._safe_int_for_db(po_data.get('supplier_id')),             # Integer
+            self._safe_string_for_db(po_data.get('business_name')),        # String
+            self._safe_string_for_db(po_data.get('account_no')),           # String
+            self._safe_string_for_db(po_data.get('po_title', 'Excel Import')), # String
+            self._safe_int_for_db(po_data.get('status', 0)),               # Integer (0 = new)
+            self._safe_string_for_db(po_data.get('ship_to')),              # String
+            self._safe_string_for_db(po_data.get('ship_address1')),        # String
+            self._safe_string_for_db(po_data.get('ship_address2')),        # String
+            self._safe_string_for_db(po_data.get('ship_contact')),         # String
+            self._safe_string_for_db(po_data.get('ship_city')),            # String
+            self._safe_string_for_db(po_data.get('ship_state')),           # String
+            self._safe_string_for_db(po_data.get('ship_zipcode')),         # String
+            self._safe_string_for_db(po_data.get('ship_phone')),           # String
+            self._safe_int_for_db(po_data.get('employee_id')),             # Integer
+            self._safe_int_for_db(po_data.get('term_id')),                 # Integer
+            self._safe_float_for_db(po_data.get('po_total')),              # Money/Float
+            self._safe_int_for_db(po_data.get('no_lines')),                # Integer
+            self._safe_int_for_db(po_data.get('shipper_id')),              # Integer
+            self._safe_float_for_db(po_data.get('total_qty_ordered')),     # Float
+            self._safe_float_for_db(po_data.get('total_qty_received')),    # Float
+            self._safe_string_for_db(''),                                  # Notes - empty string
+            self._safe_string_for_db(''),                                  # PoHeader - empty string
+            self._safe_string_for_db('')                                   # PoFooter - empty string
+        ))
+        
+        # Get the inserted PoID
+        cursor.execute("SELECT @@IDENTITY")
+        po_id = cursor.fetchone()[0]
+        
+        # Insert purchase order details with proper NULL handling
+        insert_detail_query = """
+        INSERT INTO PurchaseOrdersDetails_tbl (
+            PoID, ProductID, CateID, SubCateID, UnitDesc, UnitQty,
+            ProductSKU, ProductUPC, SupplierSKU, ProductDescription, ItemSize,
+            ExpDate, ReasonID, QtyOrdered, QtyReceived, ItemWeight,
+            UnitCost, ExtendedCost, DateReceived, Committedln, Flag
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        
+        # smalldatetime has no seconds; whole seconds keep the bound timestamp exact
+        date_received = datetime.now().replace(microsecond=0)
+        detail_rows = [
+            (
+                po_id,                                                          # Integer (auto-generated)
+                self._safe_int_for_db(detail.get('ProductID')),               # Integer
+                self._safe_int_for_db(detail.get('CateID')),                  # Integer
+                self._safe_int_for_db(detail.get('SubCateID')),               # Integer
+                self._safe_string_for_db(detail.get('UnitDesc')),             # String
+                self._safe_float_for_db(detail.get('UnitQty')),               # Float
+                self._safe_string_for_db(detail.get('ProductSKU')),           # String
+                self._safe_string_for_db(detail.get('ProductUPC')),           # String
+                self._safe_string_for_db(detail.get('SupplierSKU')),          # String
+                self._safe_string_for_db(detail.get('ProductDescription')),   # String
+                self._safe_string_for_db(detail.get('ItemSize')),             # String
+                self._safe_string_for_db(detail.get('ExpDate')),              # String
+                self._safe_int_for_db(detail.get('ReasonID')),                # Integer
+                self._safe_float_for_db(detail.get('QtyOrdered')),            # Float
+                self._safe_float_for_db(detail.get('QtyReceived')),           # Float
+                self._safe_string_for_db(detail.get('ItemWeight')),           # String
+                self._safe_float_for_db(detail.get('UnitCost')),              # Money/Float
+                self._safe_float_for_db(detail.get('ExtendedCost')),          # Money/Float
+                date_received,                                                # Date - today's date
+                1 if detail.get('Committedln', False) else 0,                # Boolean as int
+                1 if detail.get('Flag', False) else 0                        # Boolean as int
+            )
+            for detail in po_details
+        ]
+        self._bulk_insert(conn, insert_detail_query, detail_rows, PO_DETAIL_COLUMN_TYPES)
+        
+        return po_id
+    
+    def commit_purchase_order(self, po_data: Dict[str, Any], po_details: List[Dict[str, Any]]) -> Tuple[int, str]:
+        """Insert and commit a purchase order in its own transaction; returns the PoID and a message, raises on failure"""
+        with self._connection(timeout=60) as conn:
+            # Start transaction
+            conn.autocommit = False
+            
+            try:
+                po_id = self.insert_purchase_order(conn, po_data, po_details)
+            except Exception as e:
+                conn.rollback()
+                raise e
+            
+            # Commit transaction
+            self._commit(conn)
+            
+            get_po_number_cache(self.config.id).advance(po_data.get('po_number'))
+            
+            return po_id, f"Purchase order {po_data['po_number']} created successfully"
+    
     def create_purchase_order(self, po_data: Dict[str, Any], po_details: List[Dict[str, Any]]) -> Tuple[bool, int, str]:
         """Create a new purchase order with details"""
         try:
-            with pyodbc.connect(self.connection_string, timeout=60) as conn:
-                cursor = conn.cursor()
-                
-                # Start transaction
+            po_id, message = self.commit_purchase_order(po_data, po_details)
+            return True, po_id, message
+            
+        except pyodbc.Error as e:
+            logger.error(f"Failed to create purchase order: {e}")
+            return False, 0, f"Database error: {str(e)}"
+        except Exception as e:
+            logger.error(f"Unexpected error creating purchase order: {e}")
+            return False, 0, f"Unexpected error: {str(e)}"
+    
+    def _insert_document(self, conn, document: Dict[str, Any]) -> int:
+        if document['type'] == 'invoice':
+            invoice_id, _ = self.insert_invoice(conn, document['header'], document['details'])
+            return invoice_id
+        return self.insert_purchase_order(conn, document['header'], document['details'])
+    
+    def _document_created(self, document: Dict[str, Any], document_id: int) -> Dict[str, Any]:
+        """Record a committed document's number and build its result"""
+        if document['type'] == 'invoice':
+            number = document['header']['invoice_number']
+            get_invoice_allocator(self.config.id).confirm(number)
+        else:
+            number = document['header'].get('po_number')
+            get_po_number_cache(self.config.id).advance(number)
+        return {'index': document['index'], 'success': True, 'id': document_id, 'number': number}
+    
+    def _document_outcome_unknown(self, document: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        logger.error(f"Commit outcome unknown for batch document {document['index']}: {error}")
+        return {
+            'index': document['index'], 'success': False, 'outcome_unknown': True,
+            'error': f"{str(error)}. The document may have been created; check the database before submitting it again."
+        }
+    
+    def _document_failed(self, document: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        if isinstance(error, pyodbc.Error):
+            message = f"Database error: {str(error)}"
+        else:
+            message = f"Unexpected error: {str(error)}"
+        return {'index': document['index'], 'success': False, 'error': message}
+    
+    def create_documents(self, documents: List[Dict[str, Any]], group_size: int) -> Iterator[Dict[str, Any]]:
+        """Insert invoices / purchase orders on one connection, committing every `group_size` documents.
+
+        Each document is {'index', 'type': 'invoice' | 'purchase_order', 'header', 'details'}.
+        Results are yielded once their group has committed. A failed group is rolled back
+        and retried one document per transaction, so a bad document only fails itself.
+        """
+        group_size = max(1, group_size)
+        reported = 0
+        try:
+            with self._connection(timeout=60) as conn:
                 conn.autocommit = False
                 
-                try:
-                    # Insert purchase order header with supplier information and proper NULL handling
-                    insert_po_query = """
-                    INSERT INTO PurchaseOrders_tbl (
-                        PoDate, RequiredDate, PoNumber, SupplierID, BusinessName, AccountNo,
-                        PoTitle, Status, Shipto, ShipAddress1, ShipAddress2, ShipContact,
-                        ShipCity, ShipState, ShipZipCode, ShipPhoneNo, EmployeeID, TermID,
-                        PoTotal, NoLines, ShipperID, TotQtyOrd, TotQtyRcv, 
-                        Notes, PoHeader, PoFooter
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """
-                    
-                    cursor.execute(insert_po_query, (
-                        datetime.now(),                                                 # PoDate - today's date
-                        datetime.now(),                                                 # RequiredDate - today's date
-                        self._safe_string_for_db(po_data.get('po_number')),            # String
-                        self._safe_int_for_db(po_data.get('supplier_id')),             # Integer
-                        self._safe_string_for_db(po_data.get('business_name')),        # String
-                        self._safe_string_for_db(po_data.get('account_no')),           # String
-                        self._safe_string_for_db(po_data.get('po_title', 'Excel Import')), # String
-                        self._safe_int_for_db(po_data.get('status', 0)),               # Integer (0 = new)
-                        self._safe_string_for_db(po_data.get('ship_to')),              # String
-                        self._safe_string_for_db(po_data.get('ship_address1')),        # String
-                        self._safe_string_for_db(po_data.get('ship_address2')),        # String
-                        self._safe_string_for_db(po_data.get('ship_contact')),         # String
-                        self._safe_string_for_db(po_data.get('ship_city')),            # String
-                        self._safe_string_for_db(po_data.get('ship_state')),           # String
-                        self._safe_string_for_db(po_data.get('ship_zipcode')),         # String
-                        self._safe_string_for_db(po_data.get('ship_phone')),           # String
-                        self._safe_int_for_db(po_data.get('employee_id')),             # Integer
-                        self._safe_int_for_db(po_data.get('term_id')),                 # Integer
-                        self._safe_float_for_db(po_data.get('po_total')),              # Money/Float
-                        self._safe_int_for_db(po_data.get('no_lines')),                # Integer
-                        self._safe_int_for_db(po_data.get('shipper_id')),              # Integer
-                        self._safe_float_for_db(po_data.get('total_qty_ordered')),     # Float
-                        self._safe_float_for_db(po_data.get('total_qty_received')),    # Float
-                        self._safe_string_for_db(''),                                  # Notes - empty string
-                        self._safe_string_for_db(''),                                  # PoHeader - empty string
-                        self._safe_string_for_db('')                                   # PoFooter - empty string
-                    ))
-                    
-                    # Get the inserted PoID
-                    cursor.execute("SELECT @@IDENTITY")
-                    po_id = cursor.fetchone()[0]
-                    
-                    # Insert purchase order details with proper NULL handling
-                    insert_detail_query = """
-                    INSERT INTO PurchaseOrdersDetails_tbl (
-                        PoID, ProductID, CateID, SubCateID, UnitDesc, UnitQty,
-                        ProductSKU, ProductUPC, SupplierSKU, ProductDescription, ItemSize,
-                        ExpDate, ReasonID, QtyOrdered, QtyReceived, ItemWeight,
-                        UnitCost, ExtendedCost, DateReceived, Committedln, Flag
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """
-                    
-                    for detail in po_details:
-                        cursor.execute(insert_detail_query, (
-                            po_id,                                                          # Integer (auto-generated)
-                            self._safe_int_for_db(detail.get('ProductID')),               # Integer
-                            self._safe_int_for_db(detail.get('CateID')),                  # Integer
-                            self._safe_int_for_db(detail.get('SubCateID')),               # Integer
-                            self._safe_string_for_db(detail.get('UnitDesc')),             # String
-                            self._safe_float_for_db(detail.get('UnitQty')),               # Float
-                            self._safe_string_for_db(detail.get('ProductSKU')),           # String
-                            self._safe_string_for_db(detail.get('ProductUPC')),           # String
-                            self._safe_string_for_db(detail.get('SupplierSKU')),          # String
-                            self._safe_string_for_db(detail.get('ProductDescription')),   # String
-                            self._safe_string_for_db(detail.get('ItemSize')),             # String
-                            self._safe_string_for_db(detail.get('ExpDate')),              # String
-                            self._safe_int_for_db(detail.get('ReasonID')),                # Integer
-                            self._safe_float_for_db(detail.get('QtyOrdered')),            # Float
-                            self._safe_float_for_db(detail.get('QtyReceived')),           # Float
-                            self._safe_string_for_db(detail.get('ItemWeight')),           # String
-                            self._safe_float_for_db(detail.get('UnitCost')),              # Money/Float
-                            self._safe_float_for_db(detail.get('ExtendedCost')),          # Money/Float
-                            datetime.now(),                                               # Date - today's date
-                            1 if detail.get('Committedln', False) else 0,                # Boolean as int
-                            1 if detail.get('Flag', False) else 0                        # Boolean as int
-                        ))
-                    
-                    # Commit transaction
-                    conn.commit()
+                for start in range(0, len(documents), group_size):
+                    group = documents[start:start + group_size]
+                    try:
+                        document_ids = [self._insert_document(conn, document) for document in group]
+                        self._commit(conn)
+                    except CommitOutcomeUnknownError as e:
+                        # The group may or may not exist; retrying it could write it twice
+                        for document in group:
+                            reported += 1
+                            yield self._document_outcome_unknown(document, e)
+                        raise
+                    except Exception as e:
+                        self._rollback_invoices(conn)
+                        logger.warning(f"Transaction group of {len(group)} documents failed, retrying one at a time: {e}")
+                        document_ids = None
+                    finally:
+                        self._unlock_invoice_numbers(conn)
                     
-                    return True, po_id, f"Purchase order {po_data['po_number']} created successfully"
+                    if document_ids is not None:
+                        for document, document_id in zip(group, document_ids):
+                            reported += 1
+                            yield self._document_created(document, document_id)
+                        continue
                     
-                except Exception as e:
-                    conn.rollback()
-                    raise e
+                    for document in group:
+                        try:
+                            document_id = self._insert_document(conn, document)
+                            self._commit(conn)
+                            result = self._document_created(document, document_id)
+                        except CommitOutcomeUnknownError as e:
+                            reported += 1
+                            yield self._document_outcome_unknown(document, e)
+                            raise
+                        except Exception as e:
+                            self._rollback_invoices(conn)
+                            logger.error(f"Failed to create batch document {document['index']}: {e}")
+                            result = self._document_failed(document, e)
+                        finally:
+                            self._unlock_invoice_numbers(conn)
+                        reported += 1
+                        yield result
                 
-        except pyodbc.Error as e:
-            logger.error(f"Failed to create purchase order: {e}")
-            return False, 0, f"Database error: {str(e)}"
         except Exception as e:
-            logger.error(f"Unexpected error creating purchase order: {e}")
-            return False, 0, f"Unexpected error: {str(e)}"
\ No newline at end of file
+            # Lost connection (or no connection at all): everything not yet reported failed
+            logger.error(f"Batch create aborted after {reported} of {len(documents)} documents: {e}")
+            for document in documents[reported:]:
+                yield self._document_failed(document, e)
@@ -1,10 +1,85 @@
-import pandas as pd
+import codecs
+import csv
+import hashlib
+import io
+import itertools
 import os
-from typing import Tuple, List, Dict, Any
+from typing import Tuple, List, Dict, Any, Iterator, Iterable, Optional, Union, BinaryIO
 import logging
 
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from app.services.parse_cache import parse_cache
+from app.services.parse_pool import parse_pool, ParseBusyError
+
 logger = logging.getLogger(__name__)
 
+# Rows searched for the header row (sheets often start with a title or supplier block)
+HEADER_SCAN_ROWS = 20
+# Uploads read as delimited text instead of a workbook
+DELIMITED_EXTENSIONS = {'.csv', '.tsv'}
+# Bytes read to sniff a delimited file's encoding and delimiter
+CSV_SNIFF_BYTES = 64 * 1024
+# Read size when hashing an upload for the parse cache
+HASH_CHUNK_BYTES = 1024 * 1024
+# Rejected rows listed individually in the upload report
+REJECTED_ROWS_SAMPLE = 100
+# Sheet rows cleaned at a time when a file is read in chunks
+PARSE_CHUNK_ROWS = int(os.environ.get('PARSE_CHUNK_ROWS', 5000))
+
+
+def empty_rejected_report() -> Dict[str, Any]:
+    return {'count': 0, 'reasons': {}, 'rows': []}
+
+
+def merge_rejected_reports(total: Dict[str, Any], chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """Add a chunk's rejected-rows report into a running one (in place)"""
+    total['count'] += chunk.get('count', 0)
+    for reason, count in chunk.get('reasons', {}).items():
+        total['reasons'][reason] = total['reasons'].get(reason, 0) + count
+    total['rows'].extend(chunk.get('rows', [])[:REJECTED_ROWS_SAMPLE - len(total['rows'])])
+    return total
+
+
+class ParsedRows:
+    """Cleaned upload rows held as columns: a list of UPC strings plus float / int arrays.
+    
+    Much smaller than one dict per row, and cheap to pickle back from a parse worker process.
+    """
+    
+    def __init__(self, upc: List[str], cost: np.ndarray, qty: np.ndarray, row_number: np.ndarray):
+        self.upc = upc
+        self.cost = cost
+        self.qty = qty
+        self.row_number = row_number
+    
+    def __len__(self) -> int:
+        return len(self.upc)
+    
+    @classmethod
+    def concat(cls, parts: List['ParsedRows']) -> 'ParsedRows':
+        if not parts:
+            return cls([], np.empty(0, dtype=float), np.empty(0, dtype=float), np.empty(0, dtype=np.int64))
+        return cls(
+            [upc for part in parts for upc in part.upc],
+            np.concatenate([part.cost for part in parts]),
+            np.concatenate([part.qty for part in parts]),
+            np.concatenate([part.row_number for part in parts])
+        )
+    
+    def records(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rows as the dicts the invoice / PO services consume"""
+        return [
+            {'UPC': upc, 'Cost': cost, 'QTY': qty, 'row_number': row_number}
+            for upc, cost, qty, row_number in zip(
+                self.upc[start:stop], self.cost[start:stop].tolist(),
+                self.qty[start:stop].tolist(), self.row_number[start:stop].tolist()
+            )
+        ]
+
+
 class ExcelService:
     """Service for processing Excel files"""
     
@@ -16,64 +91,249 @@ class ExcelService:
             'QTY': ['QTY', 'qty', 'Quantity', 'quantity', 'Qty', 'Amount', 'amount']
         }
     
-    def process_excel_file(self, filepath: str) -> Tuple[bool, List[Dict[str, Any]], str]:
-        """Process Excel file and extract UPC, Cost, QTY data"""
+    def _content_digest(self, source: Union[str, BinaryIO]) -> str:
+        """SHA-256 of the file's bytes, read in chunks"""
+        digest = hashlib.sha256()
+        stream = open(source, 'rb') if isinstance(source, str) else source
         try:
-            if not os.path.exists(filepath):
-                return False, [], "File not found"
-            
-            # First, read Excel file to identify columns
-            try:
-                df = pd.read_excel(filepath, engine='openpyxl')
-            except Exception as e:
-                # Try with xlrd engine for older Excel files
-                try:
-                    df = pd.read_excel(filepath, engine='xlrd')
-                except Exception as e2:
-                    return False, [], f"Failed to read Excel file: {str(e2)}"
-            
-            if df.empty:
-                return False, [], "Excel file is empty"
-            
-            # Find column mappings
-            column_map = self._find_column_mappings(df.columns.tolist())
-            
-            # If UPC column is found, re-read the file with UPC as string to preserve leading zeros
-            if 'UPC' in column_map:
-                upc_column = column_map['UPC']
-                try:
-                    df = pd.read_excel(filepath, engine='openpyxl', dtype={upc_column: str})
-                except Exception as e:
-                    # Try with xlrd engine for older Excel files
-                    try:
-                        df = pd.read_excel(filepath, engine='xlrd', dtype={upc_column: str})
-                    except Exception as e2:
-                        # If dtype specification fails, continue with original df
-                        logger.warning(f"Could not re-read with UPC as string: {str(e2)}")
-            
-            # Check if all required columns are found
-            missing_columns = []
-            for required_col in self.required_columns:
-                if required_col not in column_map:
-                    missing_columns.append(required_col)
-            
-            if missing_columns:
-                return False, [], f"Missing required columns: {', '.join(missing_columns)}. Available columns: {', '.join(df.columns.tolist())}"
-            
-            # Rename columns to standard names
-            df_renamed = df.rename(columns={v: k for k, v in column_map.items()})
-            
-            # Clean and validate data
-            processed_data = self._clean_and_validate_data(df_renamed)
-            
-            if not processed_data:
-                return False, [], "No valid data rows found in Excel file"
+            stream.seek(0)
+            for chunk in iter(lambda: stream.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+        finally:
+            if stream is not source:
+                stream.close()
+        return digest.hexdigest()
+    
+    def open_chunks(self, source: Union[str, BinaryIO], filename: Optional[str] = None,
+                    chunk_rows: int = PARSE_CHUNK_ROWS) -> Tuple[bool, Iterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]], str]:
+        """Parse a file in a worker process and hand its rows out in chunks of at most `chunk_rows`.
+        
+        Header and read problems are reported up front; the iterator then yields (rows, rejected report)
+        per chunk as the worker sends it. Raises ParseBusyError when no parse worker is free.
+        """
+        try:
+            filename = self._source_name(source, filename)
+            if isinstance(source, str) and not os.path.exists(source):
+                return False, iter(()), "File not found"
             
-            return True, processed_data, f"Successfully processed {len(processed_data)} rows"
+            cache_key = (self._content_digest(source), os.path.splitext(filename)[1].lower())
+            cached = parse_cache.get(cache_key)
+            if cached:
+                logger.info(f"Parse cache hit for {filename}")
+                parsed, rejected, message = cached
+                return True, self._iter_parsed_chunks(parsed, rejected, chunk_rows), message
             
+            # Parsing holds the GIL for seconds on a big sheet, so it runs outside this process
+            success, parts, message = parse_pool.parse_chunks(source, filename, chunk_rows)
+            if not success:
+                return False, iter(()), message
+            return True, self._iter_streamed_chunks(parts, cache_key), message
+        
+        except ParseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error processing Excel file: {e}")
-            return False, [], f"Error processing Excel file: {str(e)}"
+            return False, iter(()), f"Error processing Excel file: {str(e)}"
+    
+    def _iter_parsed_chunks(self, parsed: ParsedRows, rejected: Dict[str, Any],
+                            chunk_rows: int) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        yield parsed.records(0, chunk_rows), rejected
+        for start in range(chunk_rows, len(parsed), chunk_rows):
+            yield parsed.records(start, start + chunk_rows), empty_rejected_report()
+    
+    def _iter_streamed_chunks(self, parts: Iterator[Tuple[ParsedRows, Dict[str, Any]]],
+                              cache_key: Tuple[str, str]) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        """Hand out chunks as the worker sends them; the whole file is cached once the last one arrives"""
+        received, rejected = [], empty_rejected_report()
+        try:
+            for part, chunk_rejected in parts:
+                received.append(part)
+                merge_rejected_reports(rejected, chunk_rejected)
+                yield part.records(), chunk_rejected
+        finally:
+            parts.close()
+        
+        parsed = ParsedRows.concat(received)
+        if len(parsed):
+            parse_cache.put(cache_key, parsed, rejected, f"Successfully processed {len(parsed)} rows")
+    
+    def iter_parsed_parts(self, source: Union[str, BinaryIO], filename: Optional[str] = None,
+                          chunk_rows: int = PARSE_CHUNK_ROWS) -> Iterator[Tuple[Any, Any]]:
+        """Parse and clean a file `chunk_rows` sheet rows at a time.
+        
+        Yields (success, message) for the header first; when it was found, a (ParsedRows, rejected report)
+        pair follows for each chunk of the sheet.
+        """
+        filename = self._source_name(source, filename)
+        # One streaming pass: find the header, then read only the mapped cells of each row
+        success, rows, column_map, message = self._open_rows(source, filename)
+        yield success, message
+        if not success:
+            return
+        
+        first_row = 1
+        try:
+            while True:
+                columns = self._read_columns(itertools.islice(rows, chunk_rows), column_map)
+                if not columns['UPC']:
+                    break
+                part, chunk_rejected = self._clean_and_validate_data(columns, first_row)
+                first_row += len(columns['UPC'])
+                yield part, chunk_rejected
+        finally:
+            rows.close()
+    
+    def _open_rows(self, source: Union[str, BinaryIO], filename: str) -> Tuple[bool, Optional[Iterator[tuple]], Dict[str, int], str]:
+        """Open the sheet and find its header; returns the row reader positioned after it and the column indexes"""
+        rows = self._iter_sheet_rows(source, filename)
+        try:
+            header_row, header, column_map = self._find_header(rows)
+        except Exception as e:
+            rows.close()
+            return False, None, {}, f"Failed to read Excel file: {str(e)}"
+        
+        if header is None:
+            rows.close()
+            return False, None, {}, "Excel file is empty"
+        
+        # Check if all required columns are found
+        missing_columns = []
+        for required_col in self.required_columns:
+            if required_col not in column_map:
+                missing_columns.append(required_col)
+        
+        if missing_columns:
+            rows.close()
+            available_columns = [name for name in header if name]
+            return False, None, {}, f"Missing required columns: {', '.join(missing_columns)}. Available columns: {', '.join(available_columns)}"
+        
+        return True, rows, column_map, f"Header found in row {header_row}"
+    
+    def _source_name(self, source: Union[str, BinaryIO], filename: Optional[str]) -> str:
+        if filename:
+            return filename
+        return source if isinstance(source, str) else str(getattr(source, 'name', ''))
+    
+    def _iter_sheet_rows(self, source: Union[str, BinaryIO], filename: str) -> Iterator[tuple]:
+        """Stream the cell values of the first worksheet, one row tuple at a time"""
+        if not isinstance(source, str):
+            source.seek(0)
+        
+        if os.path.splitext(filename)[1].lower() in DELIMITED_EXTENSIONS:
+            if isinstance(source, str):
+                with open(source, 'rb') as stream:
+                    yield from self._iter_delimited_rows(stream, filename)
+            else:
+                yield from self._iter_delimited_rows(source, filename)
+            return
+        
+        try:
+            workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        except Exception as e:
+            # Try with xlrd for older .xls files (openpyxl only reads .xlsx)
+            logger.debug(f"openpyxl could not open {filename} ({e}), trying xlrd")
+            import xlrd
+            if isinstance(source, str):
+                book = xlrd.open_workbook(source, on_demand=True)
+            else:
+                source.seek(0)
+                book = xlrd.open_workbook(file_contents=source.read(), on_demand=True)
+            try:
+                sheet = book.sheet_by_index(0)
+                for index in range(sheet.nrows):
+                    # xlrd reports empty cells as ''
+                    yield tuple(None if value == '' else value for value in sheet.row_values(index))
+            finally:
+                book.release_resources()
+            return
+        
+        try:
+            sheet = workbook.worksheets[0]
+            # Some exporters write a wrong <dimension>; read every row that is actually there
+            sheet.reset_dimensions()
+            yield from sheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    
+    def _sniff_encoding(self, sample: bytes, complete: bool = False) -> str:
+        """Encoding of a delimited text file from its first bytes (`complete` when that is the whole file)"""
+        if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return 'utf-16'
+        try:
+            # A partial sample may end inside a multi-byte character; a whole file may not
+            codecs.getincrementaldecoder('utf-8-sig')().decode(sample, final=complete)
+            return 'utf-8-sig'
+        except UnicodeDecodeError:
+            # Spreadsheet exports that are not UTF-8 are almost always Windows-1252
+            return 'cp1252'
+    
+    def _iter_delimited_rows(self, stream: BinaryIO, filename: str) -> Iterator[tuple]:
+        """Stream the rows of a CSV / TSV file with its encoding and delimiter sniffed from the start of the file"""
+        sample = stream.read(CSV_SNIFF_BYTES)
+        stream.seek(0)
+        encoding = self._sniff_encoding(sample, len(sample) < CSV_SNIFF_BYTES)
+        
+        # Sniff on whole lines only; a cut-off last line can suggest the wrong delimiter
+        text_sample = sample.decode(encoding, errors='ignore')
+        if len(sample) == CSV_SNIFF_BYTES and '\n' in text_sample:
+            text_sample = text_sample[:text_sample.rindex('\n')]
+        try:
+            delimiter = csv.Sniffer().sniff(text_sample, delimiters=',;\t|').delimiter
+        except csv.Error:
+            delimiter = '\t' if filename.lower().endswith('.tsv') else ','
+        logger.debug(f"Reading {filename} as {encoding} with delimiter {delimiter!r}")
+        
+        # Every cell stays text, so UPCs keep their leading zeros; empty cells read as missing
+        text = io.TextIOWrapper(stream, encoding=encoding, errors='replace', newline='')
+        try:
+            for row in csv.reader(text, delimiter=delimiter):
+                yield tuple(value if value.strip() else None for value in row)
+        finally:
+            # Hand the stream back to its owner open
+            text.detach()
+    
+    def _find_header(self, rows: Iterator[tuple]) -> Tuple[int, Optional[List[str]], Dict[str, int]]:
+        """Read rows until the header is found; returns its 1-based row, names and required column indexes.
+        
+        The first row that maps every required column wins. If none of the first HEADER_SCAN_ROWS
+        rows does, the one mapping the most columns is returned so the caller can report what is missing.
+        """
+        best = (0, None, {})
+        for row_index, row in enumerate(rows, start=1):
+            header = [str(value).strip() if value is not None else '' for value in row]
+            if not any(header):
+                if row_index >= HEADER_SCAN_ROWS:
+                    break
+                continue
+            
+            names = self._find_column_mappings(header)
+            column_map = {required_col: header.index(name) for required_col, name in names.items()}
+            if len(column_map) == len(self.required_columns):
+                return row_index, header, column_map
+            if best[1] is None or len(column_map) > len(best[2]):
+                best = (row_index, header, column_map)
+            if row_index >= HEADER_SCAN_ROWS:
+                break
+        return best
+    
+    def _read_columns(self, rows: Iterable[tuple], column_map: Dict[str, int]) -> Dict[str, List[Any]]:
+        """Collect the UPC / Cost / QTY cells of each data row left in `rows` (the reader is past the header)"""
+        upc_index, cost_index, qty_index = column_map['UPC'], column_map['Cost'], column_map['QTY']
+        upcs, costs, qtys = [], [], []
+        for row in rows:
+            width = len(row)
+            upcs.append(self._upc_text(row[upc_index]) if upc_index < width else None)
+            costs.append(row[cost_index] if cost_index < width else None)
+            qtys.append(row[qty_index] if qty_index < width else None)
+        return {'UPC': upcs, 'Cost': costs, 'QTY': qtys}
+    
+    def _upc_text(self, value: Any) -> Optional[str]:
+        """UPC cell as text; numeric cells keep every digit (no float repr or exponent)"""
+        if value is None:
+            return None
+        if isinstance(value, float) and value.is_integer():
+            return '%d' % value
+        return str(value)
     
     def _find_column_mappings(self, available_columns: List[str]) -> Dict[str, str]:
         """Find mappings between required columns and available columns"""
@@ -89,75 +349,82 @@ class ExcelService:
         
         return column_map
     
-    def _clean_and_validate_data(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Clean and validate Excel data"""
-        processed_data = []
+    def _clean_and_validate_data(self, columns: Dict[str, List[Any]],
+                                 first_row: int = 1) -> Tuple[ParsedRows, Dict[str, Any]]:
+        """Clean and validate UPC / Cost / QTY columns; returns the valid rows as columns and a report of the rejected ones"""
+        df = pd.DataFrame(columns, dtype=object)
+        row_numbers = pd.RangeIndex(first_row, first_row + len(df))
         
-        for index, row in df.iterrows():
-            try:
-                # Skip empty rows
-                if pd.isna(row['UPC']) or pd.isna(row['Cost']) or pd.isna(row['QTY']):
-                    continue
-                
-                # Clean UPC (remove any leading/trailing whitespace and decimal points)
-                upc = str(row['UPC']).strip()
-                if not upc or upc.lower() == 'nan':
-                    continue
-                
-                # Remove period and everything after it (Excel formatting artifacts)
-                if '.' in upc:
-                    upc = upc.split('.')[0]
-                
-                # Clean and validate Cost
-                try:
-                    cost = float(row['Cost'])
-                    if cost < 0:
-                        logger.warning(f"Row {index + 1}: Negative cost value {cost}")
-                        continue
-                except (ValueError, TypeError):
-                    logger.warning(f"Row {index + 1}: Invalid cost value {row['Cost']}")
-                    continue
-                
-                # Clean and validate QTY
-                try:
-                    qty = float(row['QTY'])
-                    if qty <= 0:
-                        logger.warning(f"Row {index + 1}: Invalid quantity value {qty}")
-                        continue
-                except (ValueError, TypeError):
-                    logger.warning(f"Row {index + 1}: Invalid quantity value {row['QTY']}")
-                    continue
-                
-                # Add to processed data
-                processed_data.append({
-                    'UPC': upc,
-                    'Cost': cost,
-                    'QTY': qty,
-                    'row_number': index + 1
-                })
-                
-            except Exception as e:
-                logger.warning(f"Row {index + 1}: Error processing row - {str(e)}")
-                continue
+        # Clean UPC (strip whitespace; remove period and everything after it - Excel formatting artifacts)
+        upc = df['UPC'].str.strip().str.replace(r'\..*', '', regex=True).fillna('')
+        cost = pd.to_numeric(df['Cost'], errors='coerce').astype(float)
+        qty = pd.to_numeric(df['QTY'], errors='coerce').astype(float)
+        
+        # Rows with nothing in any of the three columns are spacing, not errors
+        present = df.notna()
+        blank = ~present.any(axis=1)
+        missing = ~present.all(axis=1) | (upc == '') | (upc.str.lower() == 'nan')
+        
+        # First failing check names the reason, in the order the rows used to be validated
+        reasons = np.select(
+            # NaN and infinite values are not numbers a document can carry
+            [mask.to_numpy(dtype=bool) for mask in (blank, missing, ~np.isfinite(cost), cost < 0, ~np.isfinite(qty), qty <= 0)],
+            ['blank', 'missing_value', 'invalid_cost', 'negative_cost', 'invalid_qty', 'non_positive_qty'],
+            default=''
+        )
+        valid = reasons == ''
+        rejected = ~valid & (reasons != 'blank')
+        
+        processed_data = ParsedRows(
+            upc[valid].tolist(), cost[valid].to_numpy(), qty[valid].to_numpy(), row_numbers[valid].to_numpy(dtype=np.int64)
+        )
         
-        return processed_data
+        # A sample is enough to find the problem in the sheet; the counts cover the rest
+        # (records rather than DataFrame.map, which would turn empty cells into NaN)
+        sample = zip(
+            row_numbers[rejected][:REJECTED_ROWS_SAMPLE].tolist(),
+            reasons[rejected][:REJECTED_ROWS_SAMPLE].tolist(),
+            df[rejected].head(REJECTED_ROWS_SAMPLE).to_dict('records')
+        )
+        report = {
+            'count': int(rejected.sum()),
+            'reasons': {reason: int(count) for reason, count in pd.Series(reasons[rejected]).value_counts().items()},
+            'rows': [
+                {'row_number': row_number, 'reason': reason, **{column: self._report_value(value) for column, value in record.items()}}
+                for row_number, reason, record in sample
+            ]
+        }
+        if report['count']:
+            logger.info(f"Rejected {report['count']} of {len(df)} rows: {report['reasons']}")
+        
+        return processed_data, report
+    
+    def _report_value(self, value: Any) -> Any:
+        """Cell value as it can be returned in JSON"""
+        if isinstance(value, float) and value != value:
+            return None
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        return str(value)
     
-    def validate_excel_structure(self, filepath: str) -> Tuple[bool, Dict[str, Any], str]:
+    def validate_excel_structure(self, source: Union[str, BinaryIO],
+                                 filename: Optional[str] = None) -> Tuple[bool, Dict[str, Any], str]:
         """Validate Excel file structure without processing data"""
         try:
-            if not os.path.exists(filepath):
+            filename = self._source_name(source, filename)
+            if isinstance(source, str) and not os.path.exists(source):
                 return False, {}, "File not found"
             
-            # Read just the header (nrows=0 only gets column names, no need for dtype here)
+            # Only the rows up to the header are read
+            rows = self._iter_sheet_rows(source, filename)
             try:
-                df = pd.read_excel(filepath, nrows=0, engine='openpyxl')
+                header_row, header, column_indexes = self._find_header(rows)
             except Exception as e:
-                try:
-                    df = pd.read_excel(filepath, nrows=0, engine='xlrd')
-                except Exception as e2:
-                    return False, {}, f"Failed to read Excel file: {str(e2)}"
+                return False, {}, f"Failed to read Excel file: {str(e)}"
+            finally:
+                rows.close()
             
-            available_columns = df.columns.tolist()
+            available_columns = [name for name in header or [] if name]
             column_map = self._find_column_mappings(available_columns)
             
             # Check which columns are found/missing
@@ -174,14 +441,15 @@ class ExcelService:
                 'available_columns': available_columns,
                 'found_columns': found_columns,
                 'missing_columns': missing_columns,
-                'column_mappings': column_map
+                'column_mappings': column_map,
+                'header_row': header_row
             }
             
             if missing_columns:
                 return False, validation_result, f"Missing required columns: {', '.join(missing_columns)}"
             
             return True, validation_result, "Excel file structure is valid"
-            
+        
         except Exception as e:
             logger.error(f"Error validating Excel structure: {e}")
-            return False, {}, f"Error validating Excel file: {str(e)}"
\ No newline at end of file
+            return False, {}, f"Error validating Excel file: {str(e)}"
@@ -2,13 +2,17 @@ from typing import Tuple, List, Dict, Any
 from datetime import datetime
 import logging
 
+from app.services.line_columns import NULL_VALUES
+from app.services.line_items import InvoiceCopyLine
+from app.utils.upc import UpcIndex
+
 logger = logging.getLogger(__name__)
 
 
 class InvoiceCopyService:
 
     def _safe_float_convert(self, value):
-        if value in [None, '', 'NULL', 'null']:
+        if value is None or value in NULL_VALUES:
             return 0.0
         try:
             return float(value)
@@ -16,7 +20,7 @@ class InvoiceCopyService:
             return 0.0
 
     def _safe_int_convert(self, value):
-        if value in [None, '', 'NULL', 'null']:
+        if value is None or value in NULL_VALUES:
             return 0
         try:
             return int(float(value))
@@ -24,9 +28,9 @@ class InvoiceCopyService:
             return 0
 
     def _safe_string_convert(self, value):
-        if value in [None, 'NULL', 'null', '']:
+        if value is None or value in NULL_VALUES:
             return ''
-        return str(value) if value is not None else ''
+        return str(value)
 
     def build_copy_preview(
         self,
@@ -36,7 +40,7 @@ class InvoiceCopyService:
         next_number: int,
         source_invoice_number: str
     ) -> Tuple[bool, Dict[str, Any], List[Dict[str, Any]], str]:
-        upc_to_dest_item = {item['ProductUPC']: item for item in dest_items}
+        upc_index = UpcIndex(dest_items)
 
         invoice_lines = []
         missing_upcs = []
@@ -51,8 +55,8 @@ class InvoiceCopyService:
             if not upc:
                 continue
 
-            if upc in upc_to_dest_item:
-                dest_item = upc_to_dest_item[upc]
+            dest_item, upc_match = upc_index.match(upc)
+            if dest_item:
 
                 unit_price = self._safe_float_convert(source_line.get('UnitPrice'))
                 unit_cost = self._safe_float_convert(source_line.get('UnitCost'))
@@ -63,32 +67,35 @@ class InvoiceCopyService:
                 extended_price = unit_price * qty_ordered
                 extended_cost = unit_cost * qty_ordered
 
-                invoice_line = {
-                    'ProductID': self._safe_int_convert(dest_item['ProductID']),
-                    'CateID': self._safe_int_convert(dest_item['CateID']),
-                    'SubCateID': self._safe_int_convert(dest_item['SubCateID']),
-                    'ProductSKU': self._safe_string_convert(dest_item['ProductSKU']),
-                    'ProductUPC': self._safe_string_convert(dest_item['ProductUPC']),
-                    'ProductDescription': self._safe_string_convert(dest_item['ProductDescription']),
-                    'ItemSize': self._safe_string_convert(dest_item['ItemSize']),
-                    'UnitPrice': unit_price,
-                    'OriginalPrice': original_price,
-                    'UnitCost': unit_cost,
-                    'QtyOrdered': qty_ordered,
-                    'QtyShipped': qty_shipped,
-                    'ExtendedPrice': extended_price,
-                    'ExtendedCost': extended_cost,
-                    'ItemWeight': self._safe_float_convert(dest_item.get('ItemWeight')),
-                    'ItemTaxID': self._safe_int_convert(dest_item.get('ItemTaxID')),
-                    'Taxable': False,
-                    'SPPromoted': dest_item.get('SPPromoted', False),
-                    'SPPromotionDescription': self._safe_string_convert(dest_item.get('SPPromotionDescription', '')),
-                    'ProductMessage': self._safe_string_convert(dest_item.get('ProductMessage', '')),
-                    'LineMessage': self._safe_string_convert(dest_item.get('ProductMessage', '')),
-                    'UnitDesc': self._safe_string_convert(dest_item.get('UnitDesc', '')),
-                    'UnitQty': 1.0,
-                    'CountInUnit': self._safe_int_convert(dest_item.get('CountInUnit')),
-                }
+                invoice_line = InvoiceCopyLine.from_fields(
+                    ProductID=self._safe_int_convert(dest_item['ProductID']),
+                    CateID=self._safe_int_convert(dest_item['CateID']),
+                    SubCateID=self._safe_int_convert(dest_item['SubCateID']),
+                    ProductSKU=self._safe_string_convert(dest_item['ProductSKU']),
+                    ProductUPC=self._safe_string_convert(dest_item['ProductUPC']),
+                    ProductDescription=self._safe_string_convert(dest_item['ProductDescription']),
+                    ItemSize=self._safe_string_convert(dest_item['ItemSize']),
+                    UnitPrice=unit_price,
+                    OriginalPrice=original_price,
+                    UnitCost=unit_cost,
+                    QtyOrdered=qty_ordered,
+                    QtyShipped=qty_shipped,
+                    ExtendedPrice=extended_price,
+                    ExtendedCost=extended_cost,
+                    ItemWeight=self._safe_float_convert(dest_item.get('ItemWeight')),
+                    ItemTaxID=self._safe_int_convert(dest_item.get('ItemTaxID')),
+                    Taxable=False,
+                    SPPromoted=dest_item.get('SPPromoted', False),
+                    SPPromotionDescription=self._safe_string_convert(dest_item.get('SPPromotionDescription', '')),
+                    ProductMessage=self._safe_string_convert(dest_item.get('ProductMessage', '')),
+                    LineMessage=self._safe_string_convert(dest_item.get('ProductMessage', '')),
+                    UnitDesc=self._safe_string_convert(dest_item.get('UnitDesc', '')),
+                    UnitQty=1.0,
+                    CountInUnit=self._safe_int_convert(dest_item.get('CountInUnit')),
+                    excel_row=None,
+                    SourceUPC=upc,
+                    UPCMatch=upc_match
+                )
 
                 invoice_lines.append(invoice_line)
 
@@ -182,6 +189,10 @@ class InvoiceCopyService:
 
         invoice_details = []
         for line in invoice_preview['lines']:
+            # Lines built by build_copy_preview already hold converted values
+            if isinstance(line, InvoiceCopyLine):
+                invoice_details.append(line)
+                continue
             detail = {
                 'CateID': self._safe_int_convert(line['CateID']),
                 'SubCateID': self._safe_int_convert(line['SubCateID']),
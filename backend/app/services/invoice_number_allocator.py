@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds between full MAX(InvoiceNumber) rescans; in between only rows with a newer
+# InvoiceID are examined
+INVOICE_NUMBER_RESCAN_INTERVAL = float(os.environ.get('INVOICE_NUMBER_RESCAN_INTERVAL', 3600))
+# Milliseconds a create waits for another writer's number reservation
+INVOICE_NUMBER_LOCK_TIMEOUT = int(os.environ.get('INVOICE_NUMBER_LOCK_TIMEOUT', 10000))
+
+# sp_getapplock resources are scoped to the current database
+_APPLOCK_RESOURCE = 'BackOffice.InvoiceNumber'
+
+_FULL_SCAN_QUERY = """
+SELECT
+    MAX(CAST(InvoiceNumber AS INT)) AS MaxInvoiceNumber,
+    (SELECT MAX(InvoiceID) FROM Invoices_tbl) AS MaxInvoiceID
+FROM Invoices_tbl
+WHERE ISNUMERIC(InvoiceNumber) = 1
+"""
+
+# Clustered-index seek on InvoiceID: only rows added since the last look are read
+_INCREMENTAL_QUERY = """
+SELECT
+    (SELECT MAX(InvoiceID) FROM Invoices_tbl) AS MaxInvoiceID,
+    (SELECT MAX(CASE WHEN ISNUMERIC(InvoiceNumber) = 1 THEN CAST(InvoiceNumber AS INT) END)
+     FROM Invoices_tbl WHERE InvoiceID > ?) AS NewMaxInvoiceNumber
+"""
+
+# Session-owned: in manual-commit mode no transaction is open yet when the lock is taken.
+# A session that already holds it (earlier invoice in the same batch group) does not take it twice.
+_APPLOCK_QUERY = """
+SET NOCOUNT ON;
+DECLARE @resource nvarchar(255) = ?;
+DECLARE @result int = 0;
+IF APPLOCK_MODE('public', @resource, 'Session') = 'NoLock'
+    EXEC @result = sp_getapplock @Resource = @resource, @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = ?;
+SELECT @result AS LockResult;
+"""
+
+_APPLOCK_RELEASE_QUERY = """
+SET NOCOUNT ON;
+DECLARE @resource nvarchar(255) = ?;
+IF APPLOCK_MODE('public', @resource, 'Session') <> 'NoLock'
+    EXEC sp_releaseapplock @Resource = @resource, @LockOwner = 'Session';
+"""
+
+
+class InvoiceNumberAllocator:
+    """Cached invoice-number high-water mark for one database config"""
+
+    def __init__(self, config_id: int):
+        self.config_id = config_id
+        self.db_max = None          # Highest numeric InvoiceNumber seen in Invoices_tbl
+        self.high_water = 0         # Highest number committed or reserved by this process
+        self.last_invoice_id = 0    # Highest InvoiceID examined
+        self.scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def _full_scan(self, cursor):
+        cursor.execute(_FULL_SCAN_QUERY)
+        row = cursor.fetchone()
+        with self._lock:
+            self.db_max = int(row.MaxInvoiceNumber or 0)
+            self.last_invoice_id = int(row.MaxInvoiceID or 0)
+            self.scanned_at = time.monotonic()
+        logger.info(f"Invoice numbers for config {self.config_id} rescanned: max {self.db_max}")
+
+    def refresh(self, cursor):
+        """Bring the high-water mark up to date, rescanning only on cold start or drift"""
+        with self._lock:
+            cold = self.db_max is None or time.monotonic() - self.scanned_at > INVOICE_NUMBER_RESCAN_INTERVAL
+            last_invoice_id = self.last_invoice_id
+        if cold:
+            self._full_scan(cursor)
+            return
+
+        cursor.execute(_INCREMENTAL_QUERY, (last_invoice_id,))
+        row = cursor.fetchone()
+        max_invoice_id = int(row.MaxInvoiceID or 0)
+        if max_invoice_id < last_invoice_id:
+            # Rows were deleted or the database was restored: the cached mark may be too high
+            logger.info(f"Invoice IDs for config {self.config_id} went backwards, rescanning")
+            self._full_scan(cursor)
+            return
+
+        with self._lock:
+            if row.NewMaxInvoiceNumber is not None:
+                self.db_max = max(self.db_max, int(row.NewMaxInvoiceNumber))
+            self.last_invoice_id = max(self.last_invoice_id, max_invoice_id)
+
+    def peek_next(self, cursor) -> int:
+        """Next free number for a preview; nothing is reserved"""
+        self.refresh(cursor)
+        with self._lock:
+            return max(self.high_water, self.db_max) + 1
+
+    def reserve_block(self, cursor, count: int) -> int:
+        """Hand out `count` consecutive numbers to this process and return the first"""
+        self.refresh(cursor)
+        with self._lock:
+            first = max(self.high_water, self.db_max) + 1
+            self.high_water = first + count - 1
+            return first
+
+    def _lock_numbers(self, cursor):
+        """Serialize number assignment across app instances until unlock() after commit or rollback"""
+        cursor.execute(_APPLOCK_QUERY, (_APPLOCK_RESOURCE, INVOICE_NUMBER_LOCK_TIMEOUT))
+        result = cursor.fetchone().LockResult
+        if result < 0:
+            raise TimeoutError(f"Could not lock invoice numbers (sp_getapplock returned {result})")
+
+    def unlock(self, cursor):
+        """Release the number lock taken by assign(), if this session holds it"""
+        cursor.execute(_APPLOCK_RELEASE_QUERY, (_APPLOCK_RESOURCE,))
+
+    def assign(self, cursor, requested) -> Tuple[str, bool]:
+        """Lock and confirm the number for an invoice inside the caller's transaction.
+
+        Returns the number to insert and whether it differs from the requested one. The
+        lock is held until the caller calls unlock(); nothing is recorded until confirm().
+        """
+        self._lock_numbers(cursor)
+        self.refresh(cursor)
+
+        requested = str(requested or '').strip()
+        if not requested.isdigit():
+            # Non-numeric numbers are not managed by the allocator
+            return requested, False
+
+        number = int(requested)
+        with self._lock:
+            db_max = self.db_max
+        # Anything above the highest number in the table cannot be taken
+        if number > db_max:
+            return requested, False
+
+        cursor.execute("SELECT TOP 1 1 AS Taken FROM Invoices_tbl WHERE InvoiceNumber = ?", (requested,))
+        if cursor.fetchone() is None:
+            return requested, False
+
+        with self._lock:
+            replacement = max(self.high_water, self.db_max) + 1
+        # Earlier invoices of the same uncommitted batch group are visible here and skipped
+        cursor.execute("SELECT TOP 1 1 AS Taken FROM Invoices_tbl WHERE InvoiceNumber = ?", (str(replacement),))
+        while cursor.fetchone() is not None:
+            replacement += 1
+            cursor.execute("SELECT TOP 1 1 AS Taken FROM Invoices_tbl WHERE InvoiceNumber = ?", (str(replacement),))
+        logger.info(f"Invoice number {requested} already exists for config {self.config_id}, using {replacement}")
+        return str(replacement), True
+
+    def confirm(self, number: str):
+        """Record a committed invoice number"""
+        if str(number).isdigit():
+            with self._lock:
+                self.db_max = max(self.db_max or 0, int(number))
+                self.high_water = max(self.high_water, int(number))
+
+    def discard(self):
+        """Rescan on the next refresh after a rollback; the cached maximum may include rows that were never committed.
+
+        db_max itself stays set for readers already past refresh(); until the rescan it can only be too high.
+        """
+        with self._lock:
+            self.scanned_at = 0.0
+
+
+_allocators: Dict[int, InvoiceNumberAllocator] = {}
+_allocators_lock = threading.Lock()
+
+
+def get_invoice_allocator(config_id: int) -> InvoiceNumberAllocator:
+    with _allocators_lock:
+        allocator = _allocators.get(config_id)
+        if allocator is None:
+            allocator = InvoiceNumberAllocator(config_id)
+            _allocators[config_id] = allocator
+        return allocator
+
+
+def reset_invoice_allocator(config_id: int) -> Optional[InvoiceNumberAllocator]:
+    with _allocators_lock:
+        return _allocators.pop(config_id, None)
@@ -1,7 +1,12 @@
-from typing import Tuple, List, Dict, Any
+from typing import Tuple, List, Dict, Any, Iterable
 from datetime import datetime
 import logging
 
+import numpy as np
+
+from app.services.line_columns import NULL_VALUES, join_items, field, float_column, int_column, string_column, object_column
+from app.services.line_items import InvoiceLine
+
 logger = logging.getLogger(__name__)
 
 class InvoiceService:
@@ -12,7 +17,7 @@ class InvoiceService:
     
     def _safe_float_convert(self, value):
         """Safely convert a value to float, handling None, empty strings, and invalid values"""
-        if value in [None, '', 'NULL', 'null']:
+        if value is None or value in NULL_VALUES:
             return 0.0
         try:
             return float(value)
@@ -21,7 +26,7 @@ class InvoiceService:
     
     def _safe_int_convert(self, value):
         """Safely convert a value to int, handling None, empty strings, and invalid values"""
-        if value in [None, '', 'NULL', 'null']:
+        if value is None or value in NULL_VALUES:
             return 0
         try:
             return int(float(value))  # Convert to float first to handle decimal strings
@@ -30,97 +35,116 @@ class InvoiceService:
     
     def _safe_string_convert(self, value):
         """Safely convert a value to string, handling None and NULL values"""
-        if value in [None, 'NULL', 'null', '']:
+        if value is None or value in NULL_VALUES:
             return ''
-        return str(value) if value is not None else ''
+        return str(value)
     
-    def process_excel_data(self, excel_data: List[Dict[str, Any]], items: List[Dict[str, Any]], customer_data: Dict[str, Any] = None) -> Tuple[bool, Dict[str, Any], List[str], str]:
-        """Process Excel data and create invoice preview"""
-        try:
-            # Create UPC to item mapping
-            upc_to_item = {item['ProductUPC']: item for item in items}
+    def build_lines(self, chunks: Iterable[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]) -> Tuple[List[InvoiceLine], List[Dict[str, Any]], Dict[str, float]]:
+        """Build invoice lines from (Excel rows, matching items) chunks as they arrive; returns lines, missing UPCs and totals"""
+        invoice_lines = []
+        missing_upcs = []
+        total_qty_ordered = 0.0
+        total_cost = 0.0
+        total_price = 0.0
+        total_weight = 0.0
+        
+        for excel_data, items in chunks:
+            # Excel rows joined to their items by UPC (padded / truncated codes still match)
+            upcs = [row['UPC'] for row in excel_data]
+            item, upc_matches, items = join_items(upcs, items)
+            found = item >= 0
+            item = item[found]
             
-            # Process each Excel row
-            invoice_lines = []
-            missing_upcs = []
-            total_qty_ordered = 0
-            total_qty_shipped = 0
-            total_cost = 0
-            total_price = 0
-            total_weight = 0
+            # For invoices: price comes from Excel (column 'Cost' holds the selling price), cost from the database
+            price = np.array([row['Cost'] for row in excel_data], dtype=float)
+            qty = np.array([row['QTY'] for row in excel_data], dtype=float)
+            row_numbers = np.array([row['row_number'] for row in excel_data], dtype=object)
+            line_price, line_qty = price[found], qty[found]
             
-            for excel_row in excel_data:
-                upc = excel_row['UPC']
-                # For invoices: price comes from Excel, cost comes from database
-                price_from_excel = excel_row['Cost']  # Note: Excel column is named 'Cost' but contains selling price
-                qty = excel_row['QTY']
-                
-                if upc in upc_to_item:
-                    item = upc_to_item[upc]
-                    
-                    # Get cost from database (UnitCost field in Items_tbl)
-                    unit_cost = self._safe_float_convert(item.get('UnitCost', 0))
-                    
-                    # Calculate extended values
-                    extended_cost = unit_cost * qty
-                    extended_price = price_from_excel * qty
-                    
-                    # Create invoice line (convert all fields to proper types based on expected data type)
-                    invoice_line = {
-                        'ProductID': self._safe_int_convert(item['ProductID']),           # Integer
-                        'CateID': self._safe_int_convert(item['CateID']),                 # Integer  
-                        'SubCateID': self._safe_int_convert(item['SubCateID']),           # Integer
-                        'ProductSKU': self._safe_string_convert(item['ProductSKU']),      # String/VARCHAR
-                        'ProductUPC': self._safe_string_convert(item['ProductUPC']),      # String/VARCHAR
-                        'ProductDescription': self._safe_string_convert(item['ProductDescription']), # String/VARCHAR
-                        'ItemSize': self._safe_string_convert(item['ItemSize']),          # String/VARCHAR
-                        'UnitPrice': price_from_excel,                                    # Float (from Excel - selling price)
-                        'OriginalPrice': self._safe_float_convert(item.get('OriginalPrice')), # Float (from Items_tbl)
-                        'UnitCost': unit_cost,                                            # Float (from Items_tbl database)
-                        'QtyOrdered': qty,                                                # Float (from Excel)
-                        'QtyShipped': qty,                                                # Float (from Excel)
-                        'ExtendedPrice': extended_price,                                  # Float (calculated: price * qty)
-                        'ExtendedCost': extended_cost,                                    # Float (calculated: cost * qty)
-                        'ItemWeight': self._safe_float_convert(item['ItemWeight']),       # Float
-                        'ItemTaxID': self._safe_int_convert(item['ItemTaxID']),           # Integer
-                        'Taxable': False,                                                 # Boolean - default to False
-                        'SPPromoted': item.get('SPPromoted', False),                      # Boolean
-                        'SPPromotionDescription': self._safe_string_convert(item.get('SPPromotionDescription', '')), # String
-                        'ProductMessage': self._safe_string_convert(item.get('ProductMessage', '')), # String/VARCHAR
-                        'LineMessage': self._safe_string_convert(item.get('ProductMessage', '')), # String (copy of ProductMessage)
-                        'UnitDesc': self._safe_string_convert(item.get('UnitDesc', '')),  # String (from Units_tbl join)
-                        'UnitQty': 1.0,                                                    # Float (always set to 1)
-                        'CountInUnit': self._safe_int_convert(item.get('CountInUnit')),   # Integer
-                        'excel_row': excel_row['row_number']                              # Integer (from Excel)
-                    }
-                    
-                    invoice_lines.append(invoice_line)
-                    
-                    # Update totals
-                    total_qty_ordered += qty
-                    total_qty_shipped += qty  # Assuming shipped = ordered for this import
-                    total_cost += extended_cost
-                    total_price += extended_price
-                    
-                    # Add weight (convert to float safely)
-                    item_weight = self._safe_float_convert(item.get('ItemWeight', 0))
-                    total_weight += item_weight * qty
-                    
-                else:
-                    missing_upcs.append({
-                        'upc': upc,
-                        'row_number': excel_row['row_number'],
-                        'price': price_from_excel,  # This is the selling price from Excel
-                        'qty': qty
-                    })
+            # Item fields are converted once per item, then taken for each of its lines
+            unit_cost = float_column(field(items, 'UnitCost', 0))[item]
+            item_weight = float_column(field(items, 'ItemWeight'))[item]
+            product_message = string_column(field(items, 'ProductMessage', ''))[item].tolist()
+            
+            # Extended values and totals are array math over the matched rows
+            extended_price = line_price * line_qty
+            extended_cost = unit_cost * line_qty
+            total_qty_ordered += float(line_qty.sum())
+            total_price += float(extended_price.sum())
+            total_cost += float(extended_cost.sum())
+            total_weight += float((item_weight * line_qty).sum())
+            
+            line_count = len(item)
+            invoice_lines.extend(InvoiceLine.from_columns({
+                'ProductID': int_column(field(items, 'ProductID'))[item].tolist(),
+                'CateID': int_column(field(items, 'CateID'))[item].tolist(),
+                'SubCateID': int_column(field(items, 'SubCateID'))[item].tolist(),
+                'ProductSKU': string_column(field(items, 'ProductSKU'))[item].tolist(),
+                'ProductUPC': string_column(field(items, 'ProductUPC'))[item].tolist(),
+                'ProductDescription': string_column(field(items, 'ProductDescription'))[item].tolist(),
+                'ItemSize': string_column(field(items, 'ItemSize'))[item].tolist(),
+                'UnitPrice': line_price.tolist(),                                          # From Excel - selling price
+                'OriginalPrice': float_column(field(items, 'OriginalPrice'))[item].tolist(),
+                'UnitCost': unit_cost.tolist(),                                            # From Items_tbl database
+                'QtyOrdered': line_qty.tolist(),
+                'QtyShipped': line_qty.tolist(),
+                'ExtendedPrice': extended_price.tolist(),                                  # price * qty
+                'ExtendedCost': extended_cost.tolist(),                                    # cost * qty
+                'ItemWeight': item_weight.tolist(),
+                'ItemTaxID': int_column(field(items, 'ItemTaxID'))[item].tolist(),
+                'Taxable': [False] * line_count,                                           # Default to False
+                'SPPromoted': object_column(field(items, 'SPPromoted', False))[item].tolist(),
+                'SPPromotionDescription': string_column(field(items, 'SPPromotionDescription', ''))[item].tolist(),
+                'ProductMessage': product_message,
+                'LineMessage': product_message,                                            # Copy of ProductMessage
+                'UnitDesc': string_column(field(items, 'UnitDesc', ''))[item].tolist(),    # From Units_tbl join
+                'UnitQty': [1.0] * line_count,                                             # Always set to 1
+                'CountInUnit': int_column(field(items, 'CountInUnit'))[item].tolist(),
+                'excel_row': row_numbers[found].tolist(),
+                'SourceUPC': [upc for upc, hit in zip(upcs, found.tolist()) if hit],       # UPC as uploaded
+                'UPCMatch': [upc_match for upc_match in upc_matches if upc_match]          # exact / normalized / check_digit
+            }))
+            
+            missing_upcs.extend(
+                {
+                    'upc': upc,
+                    'row_number': row_number,
+                    'price': row_price,  # This is the selling price from Excel
+                    'qty': row_qty
+                }
+                for upc, row_number, row_price, row_qty, hit in zip(
+                    upcs, row_numbers.tolist(), price.tolist(), qty.tolist(), found.tolist()
+                )
+                if not hit
+            )
+        
+        totals = {
+            'total_qty_ordered': total_qty_ordered,
+            'total_qty_shipped': total_qty_ordered,  # Assuming shipped = ordered for this import
+            'total_cost': total_cost,
+            'total_price': total_price,
+            'total_weight': total_weight
+        }
+        return invoice_lines, missing_upcs, totals
+    
+    def build_preview(self, invoice_lines: List[Dict[str, Any]], missing_upcs: List[Dict[str, Any]], totals: Dict[str, float],
+                      customer_data: Dict[str, Any] = None, next_number: int = None) -> Tuple[bool, Dict[str, Any], List[str], str]:
+        """Create the invoice preview from built lines and totals"""
+        try:
+            total_qty_ordered = totals['total_qty_ordered']
+            total_qty_shipped = totals['total_qty_shipped']
+            total_cost = totals['total_cost']
+            total_price = totals['total_price']
+            total_weight = totals['total_weight']
             
             if not invoice_lines:
                 return False, {}, missing_upcs, "No valid items found to create invoice"
             
-            # Get next invoice number
-            success, next_number, message = self.db_service.get_next_invoice_number()
-            if not success:
-                return False, {}, missing_upcs, f"Failed to get next invoice number: {message}"
+            # Get next invoice number (unless the caller already fetched it)
+            if next_number is None:
+                success, next_number, message = self.db_service.get_next_invoice_number()
+                if not success:
+                    return False, {}, missing_upcs, f"Failed to get next invoice number: {message}"
             
             # Calculate taxes (assuming 0% for now, can be configured)
             tax_rate = 0.0
@@ -171,6 +195,16 @@ class InvoiceService:
             logger.error(f"Error processing Excel data: {e}")
             return False, {}, [], f"Error processing Excel data: {str(e)}"
     
+    def process_excel_data(self, excel_data: List[Dict[str, Any]], items: List[Dict[str, Any]], customer_data: Dict[str, Any] = None, next_number: int = None) -> Tuple[bool, Dict[str, Any], List[str], str]:
+        """Process Excel data and create invoice preview"""
+        try:
+            invoice_lines, missing_upcs, totals = self.build_lines([(excel_data, items)])
+            return self.build_preview(invoice_lines, missing_upcs, totals, customer_data, next_number)
+            
+        except Exception as e:
+            logger.error(f"Error processing Excel data: {e}")
+            return False, {}, [], f"Error processing Excel data: {str(e)}"
+    
     def prepare_invoice_data(self, invoice_preview: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
         """Prepare invoice data for database insertion"""
         try:
@@ -204,6 +238,10 @@ class InvoiceService:
             # Prepare invoice details data with additional fields
             invoice_details = []
             for line in invoice_preview['lines']:
+                # Lines built by this service already hold converted values and go to the database as they are
+                if isinstance(line, InvoiceLine):
+                    invoice_details.append(line)
+                    continue
                 detail = {
                     'CateID': self._safe_int_convert(line['CateID']),
                     'SubCateID': self._safe_int_convert(line['SubCateID']),
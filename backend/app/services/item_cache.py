@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Tuple, Iterable
+import logging
+
+from app.utils.upc import gtin_key
+
+logger = logging.getLogger(__name__)
+
+# Bounds and lifetimes (seconds) for cached UPC lookups, overridable from the environment
+ITEM_CACHE_MAX_ENTRIES = int(os.environ.get('ITEM_CACHE_MAX_ENTRIES', 50000))
+ITEM_CACHE_TTL = float(os.environ.get('ITEM_CACHE_TTL', 300))
+# "Not found" results expire sooner so newly added items show up quickly
+ITEM_CACHE_NEGATIVE_TTL = float(os.environ.get('ITEM_CACHE_NEGATIVE_TTL', 60))
+
+
+class ItemCache:
+    """Thread-safe LRU cache of Items_tbl rows keyed by (config id, projection profile, normalized UPC key)"""
+
+    def __init__(self, max_entries: int = ITEM_CACHE_MAX_ENTRIES, ttl: float = ITEM_CACHE_TTL,
+                 negative_ttl: float = ITEM_CACHE_NEGATIVE_TTL):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        # (config_id, profile, key) -> (expires_at, items); an empty list means "not found"
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_many(self, config_id: int, profile: str, keys: Iterable[str]) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str]]:
+        """Split keys into cached results and the ones that still need a lookup"""
+        cached = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get((config_id, profile, key))
+                if entry is None or entry[0] <= now:
+                    if entry is not None:
+                        del self._entries[(config_id, profile, key)]
+                    missing.append(key)
+                    self._misses += 1
+                    continue
+                self._entries.move_to_end((config_id, profile, key))
+                cached[key] = entry[1]
+                if entry[1]:
+                    self._hits += 1
+                else:
+                    self._negative_hits += 1
+        # Copies so callers can modify rows without touching the cache
+        return {key: [dict(item) for item in items] for key, items in cached.items()}, missing
+
+    def put_many(self, config_id: int, profile: str, keys: Iterable[str], items: List[Dict[str, Any]]):
+        """Cache lookup results; requested keys without a matching item are cached as not found"""
+        if not self.max_entries:
+            return
+        found = {}
+        for item in items:
+            found.setdefault(gtin_key(item.get('ProductUPC')), []).append(dict(item))
+
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                matches = found.get(key, [])
+                expires_at = now + (self.ttl if matches else self.negative_ttl)
+                self._entries[(config_id, profile, key)] = (expires_at, matches)
+                self._entries.move_to_end((config_id, profile, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, config_id: int, keys: Iterable[str]):
+        """Drop keys from every profile of a config"""
+        keys = set(keys)
+        with self._lock:
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] == config_id and entry_key[2] in keys]:
+                del self._entries[entry_key]
+
+    def clear_config(self, config_id: int):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == config_id]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._negative_hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'negative_hits': self._negative_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': round((self._hits + self._negative_hits) / lookups, 4) if lookups else 0.0
+            }
+
+
+item_cache = ItemCache()
@@ -0,0 +1,214 @@
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable
+import logging
+
+import pyodbc
+
+from app.services.circuit_breaker import is_connection_error
+from app.services.database_service import CommitOutcomeUnknownError
+
+logger = logging.getLogger(__name__)
+
+# Commit jobs running at once per worker process, across all databases
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 8))
+# Commit jobs running at once against one database config
+JOB_MAX_CONCURRENCY_PER_DATABASE = int(os.environ.get('JOB_MAX_CONCURRENCY_PER_DATABASE', 2))
+# Attempts per job, including the first, when the failure is transient
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 4))
+# First retry delay in seconds; doubles per attempt (with jitter) up to JOB_RETRY_MAX_DELAY
+JOB_RETRY_BASE_DELAY = float(os.environ.get('JOB_RETRY_BASE_DELAY', 2))
+JOB_RETRY_MAX_DELAY = float(os.environ.get('JOB_RETRY_MAX_DELAY', 60))
+# Seconds a finished job stays available to the status endpoint
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 3600))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+RETRYING = 'retrying'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# Deadlock victim: the transaction was rolled back and can simply run again
+_DEADLOCK_SQLSTATE = '40001'
+
+
+class JobError(Exception):
+    """Permanent job failure; `details` are returned to the client with the error"""
+
+    def __init__(self, message: str, details: Dict[str, Any] = None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+def is_transient_error(error: Exception) -> bool:
+    """True if running the job again may succeed (lost connection, timeout, deadlock)"""
+    if is_connection_error(error):
+        return True
+    return isinstance(error, pyodbc.Error) and bool(error.args) and str(error.args[0]) == _DEADLOCK_SQLSTATE
+
+
+class Job:
+    """One background commit and its progress"""
+
+    def __init__(self, user_id: int, config_id: int, kind: str, func: Callable[[], Dict[str, Any]],
+                 on_finish: Callable[['Job'], None] = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.config_id = config_id
+        self.kind = kind
+        self.func = func
+        self.on_finish = on_finish      # called once the job has succeeded or finally failed
+        self.status = QUEUED
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.error_details = {}
+        self.outcome_unknown = False    # the connection dropped during COMMIT; the document may exist
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self.next_attempt_at = None     # monotonic time of a scheduled retry
+        self.finished_monotonic = None
+
+    def to_dict(self, position: Optional[int] = None) -> Dict[str, Any]:
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': JOB_MAX_ATTEMPTS,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if position is not None:
+            data['queue_position'] = position
+        if self.status == RETRYING and self.next_attempt_at:
+            data['retry_in'] = round(max(0.0, self.next_attempt_at - time.monotonic()), 1)
+        if self.status == SUCCEEDED:
+            data['result'] = self.result
+        if self.error:
+            data['error'] = self.error
+            data.update(self.error_details)
+        return data
+
+
+class JobQueue:
+    """Background commit queue with bounded concurrency per database and retry with backoff"""
+
+    def __init__(self, workers: int = JOB_WORKERS, per_database: int = JOB_MAX_CONCURRENCY_PER_DATABASE):
+        self.per_database = max(1, per_database)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='commit-job')
+        self._jobs: Dict[str, Job] = {}
+        self._pending: Dict[int, deque] = {}
+        self._running: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_id: int, config_id: int, kind: str, func: Callable[[], Dict[str, Any]],
+               on_finish: Callable[[Job], None] = None) -> Job:
+        """Queue a commit; `func` returns the result dict or raises"""
+        job = Job(user_id, config_id, kind, func, on_finish)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._pending.setdefault(config_id, deque()).append(job)
+        logger.info(f"Queued {kind} job {job.id} for config {config_id}")
+        self._dispatch(config_id)
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """Status of a user's job, or None if it does not exist or belongs to someone else"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.user_id != user_id:
+                return None
+            position = None
+            if job.status == QUEUED:
+                pending = self._pending.get(job.config_id, ())
+                position = next((index for index, queued in enumerate(pending) if queued is job), None)
+            return job.to_dict(position)
+
+    def _prune(self):
+        """Forget finished jobs older than JOB_RESULT_TTL (caller holds the lock)"""
+        cutoff = time.monotonic() - JOB_RESULT_TTL
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_monotonic is not None and job.finished_monotonic < cutoff]:
+            del self._jobs[job_id]
+
+    def _dispatch(self, config_id: int):
+        """Start queued jobs for a database while it is below its concurrency limit"""
+        with self._lock:
+            pending = self._pending.get(config_id)
+            while pending and self._running.get(config_id, 0) < self.per_database:
+                job = pending.popleft()
+                job.status = RUNNING
+                self._running[config_id] = self._running.get(config_id, 0) + 1
+                self._executor.submit(self._run, job)
+            if not pending:
+                self._pending.pop(config_id, None)
+
+    def _requeue(self, job: Job):
+        with self._lock:
+            job.status = QUEUED
+            job.next_attempt_at = None
+            self._pending.setdefault(job.config_id, deque()).append(job)
+        self._dispatch(job.config_id)
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = datetime.utcnow()
+        job.finished_monotonic = time.monotonic()
+        job.func = None
+        if job.on_finish:
+            try:
+                job.on_finish(job)
+            except Exception as e:
+                logger.error(f"Job {job.id} completion callback failed: {e}")
+            job.on_finish = None
+
+    def _run(self, job: Job):
+        job.attempts += 1
+        try:
+            job.result = job.func()
+            job.error = None
+            self._finish(job, SUCCEEDED)
+            logger.info(f"Job {job.id} succeeded after {job.attempts} attempt(s)")
+        except JobError as e:
+            job.error = str(e)
+            job.error_details = e.details
+            self._finish(job, FAILED)
+        except CommitOutcomeUnknownError as e:
+            # Never retried: running it again could write the same document twice
+            logger.error(f"Job {job.id} commit outcome unknown: {e}")
+            job.error = f"{e}. The document may have been created; check the database before creating it again."
+            job.error_details = {'outcome_unknown': True}
+            job.outcome_unknown = True
+            self._finish(job, FAILED)
+        except Exception as e:
+            if is_transient_error(e) and job.attempts < JOB_MAX_ATTEMPTS:
+                delay = min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * 2 ** (job.attempts - 1))
+                delay *= random.uniform(0.5, 1.0)
+                job.error = str(e)
+                job.status = RETRYING
+                job.next_attempt_at = time.monotonic() + delay
+                logger.warning(f"Job {job.id} attempt {job.attempts} failed ({e}); retrying in {delay:.1f}s")
+                timer = threading.Timer(delay, self._requeue, args=(job,))
+                timer.daemon = True
+                timer.start()
+            else:
+                logger.error(f"Job {job.id} failed after {job.attempts} attempt(s): {e}")
+                job.error = str(e)
+                self._finish(job, FAILED)
+        finally:
+            with self._lock:
+                self._running[job.config_id] -= 1
+                if not self._running[job.config_id]:
+                    del self._running[job.config_id]
+            self._dispatch(job.config_id)
+
+
+job_queue = JobQueue()
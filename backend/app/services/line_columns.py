@@ -0,0 +1,72 @@
+from typing import Tuple, List, Dict, Any, Sequence, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+from app.utils.upc import UpcIndex
+
+logger = logging.getLogger(__name__)
+
+# Database values treated as empty when converting item fields
+NULL_VALUES = frozenset(['', 'NULL', 'null'])
+
+
+def join_items(upcs: List[str], items: List[Dict[str, Any]]) -> Tuple[np.ndarray, List[Optional[str]], List[Dict[str, Any]]]:
+    """Match every uploaded code to its catalog item, resolving each distinct code only once.
+
+    Returns, per code, the position of its item in the returned list of matched items
+    (-1 when nothing matched) and how it matched (exact / normalized / check_digit).
+    """
+    upc_index = UpcIndex(items)
+    matched_items = []
+    positions = {}
+    resolved = {}
+    for upc in dict.fromkeys(upcs):
+        item, upc_match = upc_index.match(upc)
+        if item is None:
+            resolved[upc] = (-1, None)
+            continue
+        # Codes that resolve to the same item share one converted copy of it
+        position = positions.get(id(item))
+        if position is None:
+            position = positions[id(item)] = len(matched_items)
+            matched_items.append(item)
+        resolved[upc] = (position, upc_match)
+
+    item_positions = np.fromiter((resolved[upc][0] for upc in upcs), dtype=np.int64, count=len(upcs))
+    return item_positions, [resolved[upc][1] for upc in upcs], matched_items
+
+
+def field(items: List[Dict[str, Any]], name: str, default: Any = None) -> List[Any]:
+    """One field of every item"""
+    return [item.get(name, default) for item in items]
+
+
+def float_column(values: Sequence[Any]) -> np.ndarray:
+    """Vectorized _safe_float_convert: empty, NULL and unparseable values become 0.0"""
+    try:
+        # Numbers, numeric strings, Decimals and None (as NaN) convert in one step
+        numbers = np.array(values, dtype=float)
+    except (ValueError, TypeError):
+        numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float, copy=True)
+    numbers[np.isnan(numbers)] = 0.0
+    return numbers
+
+
+def int_column(values: Sequence[Any]) -> np.ndarray:
+    """Vectorized _safe_int_convert: truncates like int(float(value)), with 0 for empty or unparseable values"""
+    numbers = float_column(values)
+    return np.trunc(np.where(np.isfinite(numbers), numbers, 0.0)).astype(np.int64)
+
+
+def string_column(values: Sequence[Any]) -> np.ndarray:
+    """Vectorized _safe_string_convert: None and NULL values become ''"""
+    return np.array(['' if value is None or value in NULL_VALUES else str(value) for value in values], dtype=object)
+
+
+def object_column(values: Sequence[Any]) -> np.ndarray:
+    """Values kept as they are, in an array that can be indexed by item position"""
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
@@ -0,0 +1,111 @@
+import operator
+from typing import Tuple, List, Dict, Any, Iterable, Sequence, Optional
+
+
+class LineItem(tuple):
+    """A preview line held as a tuple of typed field values instead of a dict of ~25 keys.
+
+    Subclasses list their fields in FIELDS. Lines read like a read-only mapping
+    (line['UnitCost'], line.get(...), 'UnitCost' in line) so the database layer
+    takes them and client-sent dicts alike; they only become dicts at the HTTP boundary.
+    """
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+    # Fields copied from the catalog item, re-checked against Items_tbl before commit
+    ITEM_FIELDS: Tuple[str, ...] = ()
+    _INDEX: Dict[str, int] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._INDEX = {name: index for index, name in enumerate(cls.FIELDS)}
+        for index, name in enumerate(cls.FIELDS):
+            setattr(cls, name, property(operator.itemgetter(index)))
+
+    @classmethod
+    def from_fields(cls, **fields) -> 'LineItem':
+        """One line from keyword fields (every field in FIELDS is required)"""
+        return cls(tuple(fields[name] for name in cls.FIELDS))
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence[Any]]) -> List['LineItem']:
+        """Lines from equal-length columns keyed by field name"""
+        return list(map(cls, zip(*(columns[name] for name in cls.FIELDS))))
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._INDEX[key])
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, name) -> bool:
+        return name in self._INDEX
+
+    def get(self, name: str, default: Any = None) -> Any:
+        index = self._INDEX.get(name)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.FIELDS
+
+    def to_dict(self, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """JSON-ready dict of all fields, or of the given ones this line has"""
+        if fields is None:
+            return dict(zip(self.FIELDS, self))
+        return {name: tuple.__getitem__(self, self._INDEX[name]) for name in fields if name in self._INDEX}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class InvoiceLine(LineItem):
+    """Invoice line built from an upload"""
+    __slots__ = ()
+    FIELDS = (
+        'ProductID', 'CateID', 'SubCateID',                                # Integer
+        'ProductSKU', 'ProductUPC', 'ProductDescription', 'ItemSize',      # String/VARCHAR
+        'UnitPrice', 'OriginalPrice', 'UnitCost',                          # Float
+        'QtyOrdered', 'QtyShipped', 'ExtendedPrice', 'ExtendedCost',       # Float
+        'ItemWeight',                                                      # Float
+        'ItemTaxID',                                                       # Integer
+        'Taxable', 'SPPromoted',                                           # Boolean
+        'SPPromotionDescription', 'ProductMessage', 'LineMessage', 'UnitDesc',  # String
+        'UnitQty',                                                         # Float
+        'CountInUnit',                                                     # Integer
+        'excel_row',                                                       # Integer (None for copied lines)
+        'SourceUPC', 'UPCMatch'                                            # String
+    )
+    ITEM_FIELDS = (
+        'ProductUPC', 'ProductSKU', 'ProductDescription', 'ItemSize', 'CateID', 'SubCateID',
+        'ItemWeight', 'UnitDesc', 'ItemTaxID', 'UnitCost', 'OriginalPrice'
+    )
+
+
+class InvoiceCopyLine(InvoiceLine):
+    """Invoice line copied from another invoice; its prices and cost come from the source invoice"""
+    __slots__ = ()
+    ITEM_FIELDS = (
+        'ProductUPC', 'ProductSKU', 'ProductDescription', 'ItemSize', 'CateID', 'SubCateID',
+        'ItemWeight', 'UnitDesc', 'ItemTaxID'
+    )
+
+
+class PurchaseOrderLine(LineItem):
+    """Purchase order line built from an upload"""
+    __slots__ = ()
+    FIELDS = (
+        'ProductID', 'CateID', 'SubCateID',                                # Integer
+        'ProductSKU', 'ProductUPC', 'SupplierSKU', 'ProductDescription', 'ItemSize',  # String/VARCHAR
+        'UnitCost', 'ExtendedCost', 'QtyOrdered', 'QtyReceived',           # Float
+        'ItemWeight',                                                      # Float
+        'UnitDesc',                                                        # String
+        'UnitQty',                                                         # Float
+        'ExpDate',                                                         # String
+        'ReasonID',                                                        # Integer
+        'DateReceived',                                                    # Date
+        'Committedln', 'Flag',                                             # Boolean
+        'excel_row',                                                       # Integer
+        'SourceUPC', 'UPCMatch'                                            # String
+    )
+    ITEM_FIELDS = (
+        'ProductUPC', 'ProductSKU', 'ProductDescription', 'ItemSize', 'CateID', 'SubCateID',
+        'ItemWeight', 'UnitDesc'
+    )
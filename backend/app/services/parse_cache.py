@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Tuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Approximate memory for cached parse results; least recently used files are dropped first
+PARSE_CACHE_MAX_BYTES = int(os.environ.get('PARSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Seconds a parsed upload is reused for an identical re-upload
+PARSE_CACHE_TTL = float(os.environ.get('PARSE_CACHE_TTL', 900))
+
+# Rough in-memory size of one parsed row held as columns (UPC string plus its cost / qty / row number)
+_ROW_BYTES = 100
+# ... and of one sampled rejected row dict
+_REJECTED_ROW_BYTES = 400
+
+# (ParsedRows, rejected report, message)
+ParseResult = Tuple[Any, Dict[str, Any], str]
+
+
+class ParseCache:
+    """Thread-safe LRU of successfully parsed uploads keyed by (content hash, file format)"""
+
+    def __init__(self, max_bytes: int = PARSE_CACHE_MAX_BYTES, ttl: float = PARSE_CACHE_TTL):
+        self.max_bytes = max(0, max_bytes)
+        self.ttl = ttl
+
+        # (digest, format) -> (expires_at, size, (parsed rows, rejected, message))
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[ParseResult]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self._bytes -= self._entries.pop(key)[1]
+                return None
+            self._entries.move_to_end(key)
+            # Parsed columns are never modified in place, so they are shared rather than copied
+            return entry[2]
+
+    def put(self, key: Tuple[str, str], parsed: Any, rejected: Dict[str, Any], message: str):
+        size = len(parsed) * _ROW_BYTES + len(rejected.get('rows', [])) * _REJECTED_ROW_BYTES
+        # A file bigger than the whole budget would only push everything else out
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._bytes -= previous[1]
+            self._entries[key] = (time.monotonic() + self.ttl, size, (parsed, rejected, message))
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._bytes -= self._entries.popitem(last=False)[1][1]
+
+
+parse_cache = ParseCache()
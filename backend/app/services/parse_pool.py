@@ -0,0 +1,150 @@
+import io
+import multiprocessing
+import os
+import threading
+from typing import Dict, Any, Tuple, Union, BinaryIO, Iterator
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upload parses running at once in worker processes; further uploads wait for a slot (0 parses in-process)
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', 2))
+# Seconds a parse worker may take to send its next chunk before it is killed
+PARSE_TIMEOUT = float(os.environ.get('PARSE_TIMEOUT', 120))
+# Seconds an upload waits for a free parse slot before it is turned away as "server busy"
+PARSE_QUEUE_TIMEOUT = float(os.environ.get('PARSE_QUEUE_TIMEOUT', 30))
+
+
+class ParseBusyError(Exception):
+    """Every parse slot stayed busy for PARSE_QUEUE_TIMEOUT"""
+
+
+class ParseError(Exception):
+    """A parse worker failed part-way through a file"""
+
+
+def _parse_worker(conn, source: Union[str, bytes], filename: str, chunk_rows: int):
+    """Worker process entry point: send the header result, then each (ParsedRows, rejected) chunk, then None.
+
+    A failure is sent as its message string.
+    """
+    from app.services.excel_service import ExcelService
+    try:
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        for message in ExcelService().iter_parsed_parts(source, filename, chunk_rows):
+            conn.send(message)
+        conn.send(None)
+    except Exception as e:
+        conn.send(f"Error processing Excel file: {str(e)}")
+    finally:
+        conn.close()
+
+
+class ParsePool:
+    """Runs upload parsing in short-lived worker processes so it never holds the web process's GIL.
+
+    Each file gets its own process, forked from a server that already has pandas and openpyxl
+    imported, so a parse that overruns PARSE_TIMEOUT can be killed without touching any other.
+    Parsed chunks are streamed back as they are read, so their item lookups start before the file is done.
+    """
+
+    def __init__(self, workers: int = PARSE_WORKERS, timeout: float = PARSE_TIMEOUT,
+                 queue_timeout: float = PARSE_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+        self._context = None
+        self._context_lock = threading.Lock()
+
+    def _get_context(self):
+        with self._context_lock:
+            if self._context is None:
+                # Forking the threaded web process itself is unsafe (pyodbc, the pools' locks)
+                self._context = multiprocessing.get_context('forkserver')
+                # Imported once by the fork server rather than by every worker ('__main__' is app.py, which is guarded)
+                self._context.set_forkserver_preload(['__main__', 'app.services.excel_service'])
+            return self._context
+
+    def parse_chunks(self, source: Union[str, BinaryIO], filename: str,
+                     chunk_rows: int) -> Tuple[bool, Iterator[Tuple[Any, Dict[str, Any]]], str]:
+        """Parse a file (path or binary file object) in a worker process; see ExcelService.iter_parsed_parts.
+
+        Header problems are returned up front; the iterator then yields (ParsedRows, rejected report) chunks
+        and raises ParseError if the worker fails. Raises ParseBusyError when no parse slot frees up in time.
+        """
+        if self.workers <= 0:
+            from app.services.excel_service import ExcelService
+            parts = ExcelService().iter_parsed_parts(source, filename, chunk_rows)
+        else:
+            parts = self._stream(source, filename, chunk_rows)
+
+        success, message = next(parts)
+        if not success:
+            parts.close()
+            return False, iter(()), message
+        return True, parts, message
+
+    def _stream(self, source: Union[str, BinaryIO], filename: str, chunk_rows: int):
+        if not isinstance(source, str):
+            path = getattr(source, 'name', None)
+            if isinstance(path, str) and os.path.isfile(path):
+                # Spilled to a named temp file: the worker reads it from disk rather than getting a copy
+                source.flush()
+                source = path
+            else:
+                # In-memory file objects cannot cross the process boundary; their bytes can
+                source.seek(0)
+                source = source.read()
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            logger.warning(f"No parse slot freed up for {filename} within {self.queue_timeout:g}s")
+            raise ParseBusyError("Server busy: too many files are being processed, please try again shortly")
+        try:
+            context = self._get_context()
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_parse_worker, args=(sender, source, filename, chunk_rows), daemon=True)
+            process.start()
+            sender.close()
+            try:
+                try:
+                    header = self._receive(process, receiver, filename)
+                except ParseError as e:
+                    yield False, str(e)
+                    return
+                if isinstance(header, str):
+                    yield False, header
+                    return
+                yield header
+
+                while True:
+                    message = self._receive(process, receiver, filename)
+                    if message is None:
+                        return
+                    if isinstance(message, str):
+                        raise ParseError(message)
+                    yield message
+            finally:
+                receiver.close()
+                # A reader that stopped early leaves the worker blocked on its next send
+                if process.is_alive():
+                    process.kill()
+                process.join()
+        finally:
+            self._slots.release()
+
+    def _receive(self, process, receiver, filename: str):
+        try:
+            if not receiver.poll(self.timeout):
+                logger.error(f"Parsing {filename} exceeded {self.timeout:g}s, stopping its worker")
+                process.kill()
+                raise ParseError(f"File took longer than {self.timeout:g} seconds to process")
+            return receiver.recv()
+        except EOFError:
+            process.join()
+            logger.error(f"Parse worker for {filename} exited with code {process.exitcode}")
+            raise ParseError("Error processing Excel file: parse worker exited unexpectedly")
+
+
+parse_pool = ParsePool()
@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Seconds a cached PO number maximum is trusted before it is recomputed on the server;
+# bounds how long POs created by other applications can go unnoticed
+PO_NUMBER_CACHE_TTL = float(os.environ.get('PO_NUMBER_CACHE_TTL', 300))
+
+
+class PoNumberCache:
+    """Cached highest numeric PoNumber for one database config"""
+
+    def __init__(self, config_id: int, ttl: float = PO_NUMBER_CACHE_TTL):
+        self.config_id = config_id
+        self.ttl = ttl
+        self.max_number = None      # Highest numeric PoNumber read from the server or created here
+        self.read_at = 0.0          # Monotonic time max_number was read from the server
+        self.reserved = 0           # Highest number handed out to a batch import by this process
+        self._lock = threading.Lock()
+
+    def get_cached_max(self) -> Optional[int]:
+        """Cached highest PO number (including reserved ones), or None if it has to be recomputed"""
+        with self._lock:
+            if self.max_number is None or time.monotonic() - self.read_at > self.ttl:
+                return None
+            return max(self.max_number, self.reserved)
+
+    def store_max(self, max_number: int):
+        with self._lock:
+            self.max_number = max_number
+            self.read_at = time.monotonic()
+
+    def reserve_block(self, next_number: int, count: int) -> int:
+        """Hand out `count` consecutive numbers from `next_number` (or above earlier reservations) and return the first"""
+        with self._lock:
+            first = max(next_number, self.reserved + 1)
+            self.reserved = first + count - 1
+            return first
+
+    def advance(self, po_number):
+        """Raise the cached maximum after a PO is created, keeping its age"""
+        po_number = str(po_number or '').strip()
+        if not po_number.isdigit() or len(po_number) > 10 or int(po_number) > 2147483647:
+            return
+        with self._lock:
+            if self.max_number is not None and int(po_number) > self.max_number:
+                self.max_number = int(po_number)
+
+
+_caches: Dict[int, PoNumberCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_po_number_cache(config_id: int) -> PoNumberCache:
+    with _caches_lock:
+        cache = _caches.get(config_id)
+        if cache is None:
+            cache = PoNumberCache(config_id)
+            _caches[config_id] = cache
+        return cache
+
+
+def reset_po_number_cache(config_id: int) -> Optional[PoNumberCache]:
+    with _caches_lock:
+        return _caches.pop(config_id, None)
@@ -0,0 +1,168 @@
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds an unused preview can still be turned into a document
+PREVIEW_TTL = float(os.environ.get('PREVIEW_TTL', 1800))
+# Approximate bytes of previews kept per worker process; the oldest are dropped first
+PREVIEW_STORE_MAX_BYTES = int(os.environ.get('PREVIEW_STORE_MAX_BYTES', 256 * 1024 * 1024))
+# Previews kept per user; uploading more drops that user's oldest
+PREVIEW_MAX_PER_USER = int(os.environ.get('PREVIEW_MAX_PER_USER', 20))
+
+_INVOICE_HEADER_FIELDS = (
+    'invoice_number', 'invoice_date', 'invoice_type', 'invoice_title', 'customer_id',
+    'business_name', 'account_no', 'ship_to', 'ship_address1', 'ship_address2',
+    'ship_city', 'ship_state', 'ship_zipcode', 'ship_phone', 'term_id', 'sales_rep_id',
+    'total_qty_ordered', 'total_qty_shipped', 'no_lines', 'total_weight',
+    'invoice_subtotal', 'total_taxes', 'invoice_total'
+)
+
+# Header fields /create reads from a stored preview, per preview kind
+PREVIEW_HEADER_FIELDS = {
+    'invoice': _INVOICE_HEADER_FIELDS,
+    'invoice_copy': _INVOICE_HEADER_FIELDS,
+    'purchase_order': (
+        'po_number', 'po_date', 'required_date', 'po_title', 'status', 'supplier_id',
+        'business_name', 'account_no', 'ship_to', 'ship_address1', 'ship_address2',
+        'ship_contact', 'ship_city', 'ship_state', 'ship_zipcode', 'ship_phone',
+        'employee_id', 'term_id', 'shipper_id', 'total_qty_ordered', 'total_qty_received',
+        'no_lines', 'po_total'
+    )
+}
+
+# Fixed by the lines and the chosen customer / supplier, so not editable at /create
+_DERIVED_FIELDS = {
+    'customer_id', 'supplier_id', 'business_name', 'account_no', 'no_lines',
+    'total_qty_ordered', 'total_qty_shipped', 'total_qty_received', 'total_weight',
+    'invoice_subtotal', 'total_taxes', 'invoice_total', 'po_total'
+}
+
+# Line fields the preview tables render; the rest of each line stays on the server
+PREVIEW_LINE_FIELDS = (
+    'ProductID', 'ProductUPC', 'SourceUPC', 'UPCMatch', 'ProductDescription', 'ItemSize',
+    'UnitCost', 'UnitPrice', 'QtyOrdered', 'QtyReceived', 'ExtendedCost', 'ExtendedPrice'
+)
+
+# Approximate memory of one stored line (a LineItem tuple and its values)
+_LINE_BYTES = 600
+
+
+def slim_preview(preview: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a preview with only the line fields the browser displays"""
+    slim = dict(preview)
+    slim['lines'] = [line.to_dict(PREVIEW_LINE_FIELDS) for line in preview['lines']]
+    return slim
+
+
+class PreviewStore:
+    """Previews kept server-side under an opaque per-user token until /create turns them into a document"""
+
+    def __init__(self, ttl: float = PREVIEW_TTL, max_bytes: int = PREVIEW_STORE_MAX_BYTES,
+                 max_per_user: int = PREVIEW_MAX_PER_USER):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_per_user = max(1, max_per_user)
+
+        # token -> {'user_id', 'config_id', 'kind', 'preview', 'size', 'expires_at', 'claimed'}
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry:
+            self._bytes -= entry['size']
+
+    def _evict(self, user_id: int):
+        """Drop expired previews, then the oldest ones over the per-user and memory limits (caller holds the lock)"""
+        now = time.monotonic()
+        for token in [token for token, entry in self._entries.items() if entry['expires_at'] <= now and not entry['claimed']]:
+            self._remove(token)
+
+        user_tokens = [token for token, entry in self._entries.items() if entry['user_id'] == user_id and not entry['claimed']]
+        for token in user_tokens[:max(0, len(user_tokens) - self.max_per_user)]:
+            self._remove(token)
+
+        # Previews being committed are never dropped
+        for token in [token for token, entry in self._entries.items() if not entry['claimed']]:
+            if self._bytes <= self.max_bytes:
+                break
+            logger.info(f"Preview store over its memory budget, dropping preview {token[:8]}")
+            self._remove(token)
+
+    def put(self, user_id: int, config_id: int, kind: str, preview: Dict[str, Any]) -> str:
+        """Store a preview and return its token"""
+        token = secrets.token_urlsafe(24)
+        # Lines are estimated rather than serialized; only the header is measured
+        header = {key: value for key, value in preview.items() if key != 'lines'}
+        size = len(json.dumps(header, default=str)) + len(preview.get('lines') or ()) * _LINE_BYTES
+        with self._lock:
+            self._entries[token] = {
+                'user_id': user_id,
+                'config_id': config_id,
+                'kind': kind,
+                'preview': preview,
+                'size': size,
+                'expires_at': time.monotonic() + self.ttl,
+                'claimed': False
+            }
+            self._bytes += size
+            self._evict(user_id)
+        return token
+
+    def get(self, token: str, user_id: int, kind: str) -> Tuple[bool, Dict[str, Any], str]:
+        """Look up a user's preview of the given kind"""
+        with self._lock:
+            entry = self._entries.get(token)
+            # Another user's token behaves exactly like an unknown one
+            if not entry or entry['user_id'] != user_id or entry['kind'] != kind:
+                return False, {}, "Preview not found or expired. Please upload the file again."
+            if entry['expires_at'] <= time.monotonic() and not entry['claimed']:
+                self._remove(token)
+                return False, {}, "Preview not found or expired. Please upload the file again."
+            return True, entry, "Preview found"
+
+    def claim(self, token: str) -> bool:
+        """Reserve a preview for one /create until finish() is called; False if it is already taken or gone"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if not entry or entry['claimed']:
+                return False
+            entry['claimed'] = True
+            return True
+
+    def finish(self, token: str, succeeded: bool):
+        """Drop a claimed preview once its document exists, or make it usable again after a failure"""
+        with self._lock:
+            if succeeded:
+                self._remove(token)
+                return
+            entry = self._entries.get(token)
+            if entry:
+                entry['claimed'] = False
+                entry['expires_at'] = max(entry['expires_at'], time.monotonic() + self.ttl)
+
+    def header(self, entry: Dict[str, Any], edits: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Header data for /create from a stored preview, with the caller's edits applied.
+
+        Raises ValueError for unknown or derived fields.
+        """
+        if edits is not None and not isinstance(edits, dict):
+            raise ValueError("edits must be an object")
+        fields = PREVIEW_HEADER_FIELDS[entry['kind']]
+        header = {field: entry['preview'].get(field) for field in fields}
+        for field, value in (edits or {}).items():
+            if field not in fields or field in _DERIVED_FIELDS:
+                raise ValueError(f"Field cannot be edited: {field}")
+            header[field] = value
+        return header
+
+
+preview_store = PreviewStore()
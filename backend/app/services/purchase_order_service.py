@@ -1,7 +1,12 @@
-from typing import Tuple, List, Dict, Any
+from typing import Tuple, List, Dict, Any, Iterable
 from datetime import datetime
 import logging
 
+import numpy as np
+
+from app.services.line_columns import NULL_VALUES, join_items, field, float_column, int_column, string_column
+from app.services.line_items import PurchaseOrderLine
+
 logger = logging.getLogger(__name__)
 
 class PurchaseOrderService:
@@ -12,7 +17,7 @@ class PurchaseOrderService:
     
     def _safe_float_convert(self, value):
         """Safely convert a value to float, handling None, empty strings, and invalid values"""
-        if value in [None, '', 'NULL', 'null']:
+        if value is None or value in NULL_VALUES:
             return 0.0
         try:
             return float(value)
@@ -21,7 +26,7 @@ class PurchaseOrderService:
     
     def _safe_int_convert(self, value):
         """Safely convert a value to int, handling None, empty strings, and invalid values"""
-        if value in [None, '', 'NULL', 'null']:
+        if value is None or value in NULL_VALUES:
             return 0
         try:
             return int(float(value))  # Convert to float first to handle decimal strings
@@ -30,82 +35,100 @@ class PurchaseOrderService:
     
     def _safe_string_convert(self, value):
         """Safely convert a value to string, handling None and NULL values"""
-        if value in [None, 'NULL', 'null', '']:
+        if value is None or value in NULL_VALUES:
             return ''
-        return str(value) if value is not None else ''
+        return str(value)
     
-    def process_excel_data(self, excel_data: List[Dict[str, Any]], items: List[Dict[str, Any]], supplier_data: Dict[str, Any] = None) -> Tuple[bool, Dict[str, Any], List[str], str]:
-        """Process Excel data and create purchase order preview"""
-        try:
-            # Create UPC to item mapping
-            upc_to_item = {item['ProductUPC']: item for item in items}
+    def build_lines(self, chunks: Iterable[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]) -> Tuple[List[PurchaseOrderLine], List[Dict[str, Any]], Dict[str, float]]:
+        """Build purchase order lines from (Excel rows, matching items) chunks as they arrive; returns lines, missing UPCs and totals"""
+        po_lines = []
+        missing_upcs = []
+        total_qty_ordered = 0.0
+        total_cost = 0.0
+        date_received = datetime.now()
+        
+        for excel_data, items in chunks:
+            # Excel rows joined to their items by UPC (padded / truncated codes still match)
+            upcs = [row['UPC'] for row in excel_data]
+            item, upc_matches, items = join_items(upcs, items)
+            found = item >= 0
+            item = item[found]
             
-            # Process each Excel row
-            po_lines = []
-            missing_upcs = []
-            total_qty_ordered = 0
-            total_qty_received = 0
-            total_cost = 0
+            # For purchase orders: cost comes from Excel (what we're paying the supplier)
+            cost = np.array([row['Cost'] for row in excel_data], dtype=float)
+            qty = np.array([row['QTY'] for row in excel_data], dtype=float)
+            row_numbers = np.array([row['row_number'] for row in excel_data], dtype=object)
+            line_cost, line_qty = cost[found], qty[found]
             
-            for excel_row in excel_data:
-                upc = excel_row['UPC']
-                # For purchase orders: cost comes from Excel (what we're paying the supplier)
-                cost_from_excel = excel_row['Cost']
-                qty = excel_row['QTY']
-                
-                if upc in upc_to_item:
-                    item = upc_to_item[upc]
-                    
-                    # Calculate extended cost
-                    extended_cost = cost_from_excel * qty
-                    
-                    # Create purchase order line (convert all fields to proper types)
-                    po_line = {
-                        'ProductID': self._safe_int_convert(item['ProductID']),           # Integer
-                        'CateID': self._safe_int_convert(item['CateID']),                 # Integer  
-                        'SubCateID': self._safe_int_convert(item['SubCateID']),           # Integer
-                        'ProductSKU': self._safe_string_convert(item['ProductSKU']),      # String/VARCHAR
-                        'ProductUPC': self._safe_string_convert(item['ProductUPC']),      # String/VARCHAR
-                        'SupplierSKU': self._safe_string_convert(item.get('SupplierSKU', '')), # String/VARCHAR
-                        'ProductDescription': self._safe_string_convert(item['ProductDescription']), # String/VARCHAR
-                        'ItemSize': self._safe_string_convert(item['ItemSize']),          # String/VARCHAR
-                        'UnitCost': cost_from_excel,                                      # Float (from Excel - cost we pay)
-                        'ExtendedCost': extended_cost,                                    # Float (calculated: cost * qty)
-                        'QtyOrdered': qty,                                                # Float (from Excel)
-                        'QtyReceived': qty,                                               # Float (same as ordered - both identical)
-                        'ItemWeight': self._safe_float_convert(item.get('ItemWeight', 0)), # Float
-                        'UnitDesc': self._safe_string_convert(item.get('UnitDesc', '')),  # String (from Units_tbl join)
-                        'UnitQty': 1.0,                                                    # Float (always set to 1)
-                        'ExpDate': self._safe_string_convert(''),                         # String - empty for now
-                        'ReasonID': self._safe_int_convert(0),                            # Integer - default 0
-                        'DateReceived': datetime.now(),                                   # Date - today's date
-                        'Committedln': False,                                             # Boolean - default False
-                        'Flag': False,                                                    # Boolean - default False
-                        'excel_row': excel_row['row_number']                              # Integer (from Excel)
-                    }
-                    
-                    po_lines.append(po_line)
-                    
-                    # Update totals
-                    total_qty_ordered += qty
-                    total_qty_received += qty  # Same as ordered for new POs
-                    total_cost += extended_cost
-                    
-                else:
-                    missing_upcs.append({
-                        'upc': upc,
-                        'row_number': excel_row['row_number'],
-                        'cost': cost_from_excel,  # This is the cost we're paying
-                        'qty': qty
-                    })
+            # Extended cost and totals are array math over the matched rows
+            extended_cost = line_cost * line_qty
+            total_qty_ordered += float(line_qty.sum())
+            total_cost += float(extended_cost.sum())
+            
+            # Item fields are converted once per item, then taken for each of its lines
+            line_count = len(item)
+            po_lines.extend(PurchaseOrderLine.from_columns({
+                'ProductID': int_column(field(items, 'ProductID'))[item].tolist(),
+                'CateID': int_column(field(items, 'CateID'))[item].tolist(),
+                'SubCateID': int_column(field(items, 'SubCateID'))[item].tolist(),
+                'ProductSKU': string_column(field(items, 'ProductSKU'))[item].tolist(),
+                'ProductUPC': string_column(field(items, 'ProductUPC'))[item].tolist(),
+                'SupplierSKU': string_column(field(items, 'SupplierSKU', ''))[item].tolist(),
+                'ProductDescription': string_column(field(items, 'ProductDescription'))[item].tolist(),
+                'ItemSize': string_column(field(items, 'ItemSize'))[item].tolist(),
+                'UnitCost': line_cost.tolist(),                                            # From Excel - cost we pay
+                'ExtendedCost': extended_cost.tolist(),                                    # cost * qty
+                'QtyOrdered': line_qty.tolist(),
+                'QtyReceived': line_qty.tolist(),                                          # Same as ordered
+                'ItemWeight': float_column(field(items, 'ItemWeight', 0))[item].tolist(),
+                'UnitDesc': string_column(field(items, 'UnitDesc', ''))[item].tolist(),    # From Units_tbl join
+                'UnitQty': [1.0] * line_count,                                             # Always set to 1
+                'ExpDate': [''] * line_count,                                              # Empty for now
+                'ReasonID': [0] * line_count,
+                'DateReceived': [date_received] * line_count,                              # Today's date
+                'Committedln': [False] * line_count,
+                'Flag': [False] * line_count,
+                'excel_row': row_numbers[found].tolist(),
+                'SourceUPC': [upc for upc, hit in zip(upcs, found.tolist()) if hit],       # UPC as uploaded
+                'UPCMatch': [upc_match for upc_match in upc_matches if upc_match]          # exact / normalized / check_digit
+            }))
+            
+            missing_upcs.extend(
+                {
+                    'upc': upc,
+                    'row_number': row_number,
+                    'cost': row_cost,  # This is the cost we're paying
+                    'qty': row_qty
+                }
+                for upc, row_number, row_cost, row_qty, hit in zip(
+                    upcs, row_numbers.tolist(), cost.tolist(), qty.tolist(), found.tolist()
+                )
+                if not hit
+            )
+        
+        totals = {
+            'total_qty_ordered': total_qty_ordered,
+            'total_qty_received': total_qty_ordered,  # Same as ordered for new POs
+            'total_cost': total_cost
+        }
+        return po_lines, missing_upcs, totals
+    
+    def build_preview(self, po_lines: List[Dict[str, Any]], missing_upcs: List[Dict[str, Any]], totals: Dict[str, float],
+                      supplier_data: Dict[str, Any] = None, next_number: int = None) -> Tuple[bool, Dict[str, Any], List[str], str]:
+        """Create the purchase order preview from built lines and totals"""
+        try:
+            total_qty_ordered = totals['total_qty_ordered']
+            total_qty_received = totals['total_qty_received']
+            total_cost = totals['total_cost']
             
             if not po_lines:
                 return False, {}, missing_upcs, "No valid items found to create purchase order"
             
-            # Get next PO number
-            success, next_number, message = self.db_service.get_next_po_number()
-            if not success:
-                return False, {}, missing_upcs, f"Failed to get next PO number: {message}"
+            # Get next PO number (unless the caller already fetched it)
+            if next_number is None:
+                success, next_number, message = self.db_service.get_next_po_number()
+                if not success:
+                    return False, {}, missing_upcs, f"Failed to get next PO number: {message}"
             
             # Create purchase order preview with supplier information
             po_preview = {
@@ -148,6 +171,16 @@ class PurchaseOrderService:
             logger.error(f"Error processing Excel data: {e}")
             return False, {}, [], f"Error processing Excel data: {str(e)}"
     
+    def process_excel_data(self, excel_data: List[Dict[str, Any]], items: List[Dict[str, Any]], supplier_data: Dict[str, Any] = None, next_number: int = None) -> Tuple[bool, Dict[str, Any], List[str], str]:
+        """Process Excel data and create purchase order preview"""
+        try:
+            po_lines, missing_upcs, totals = self.build_lines([(excel_data, items)])
+            return self.build_preview(po_lines, missing_upcs, totals, supplier_data, next_number)
+            
+        except Exception as e:
+            logger.error(f"Error processing Excel data: {e}")
+            return False, {}, [], f"Error processing Excel data: {str(e)}"
+    
     def prepare_po_data(self, po_preview: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
         """Prepare purchase order data for database insertion"""
         try:
@@ -181,6 +214,10 @@ class PurchaseOrderService:
             # Prepare purchase order details data
             po_details = []
             for line in po_preview['lines']:
+                # Lines built by this service already hold converted values and go to the database as they are
+                if isinstance(line, PurchaseOrderLine):
+                    po_details.append(line)
+                    continue
                 detail = {
                     'ProductID': self._safe_int_convert(line['ProductID']),
                     'CateID': self._safe_int_convert(line['CateID']),
@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+import logging
+
+from app.models import DatabaseConfig
+from app.services.connection_pool import close_pool
+from app.services.circuit_breaker import reset_breaker
+from app.services.catalog_mirror import drop_mirror
+from app.services.item_cache import item_cache
+from app.services.invoice_number_allocator import reset_invoice_allocator
+from app.services.po_number_cache import reset_po_number_cache
+from app.services.database_service import DatabaseService
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached service is trusted before its config is re-read from SQLite.
+# PUT/DELETE invalidate immediately in this process; the TTL bounds staleness
+# in other worker processes.
+SERVICE_REGISTRY_TTL = float(os.environ.get('SERVICE_REGISTRY_TTL', 300))
+
+_services: Dict[Tuple[int, int], Tuple[DatabaseService, float]] = {}
+_lock = threading.Lock()
+
+
+def _snapshot_config(db_config: DatabaseConfig) -> SimpleNamespace:
+    """Copy the config columns so the service does not hold a session-bound model instance"""
+    return SimpleNamespace(**{column.name: getattr(db_config, column.name) for column in DatabaseConfig.__table__.columns})
+
+
+def get_database_service(user_id: int, config_id) -> Optional[DatabaseService]:
+    """Get the long-lived DatabaseService for a user's config, or None if the config does not exist"""
+    try:
+        config_id = int(config_id)
+    except (TypeError, ValueError):
+        return None
+
+    key = (user_id, config_id)
+    now = time.monotonic()
+
+    with _lock:
+        entry = _services.get(key)
+        if entry and now - entry[1] < SERVICE_REGISTRY_TTL:
+            return entry[0]
+
+    db_config = DatabaseConfig.query.filter_by(id=config_id, user_id=user_id).first()
+    if not db_config:
+        with _lock:
+            _services.pop(key, None)
+        return None
+
+    service = DatabaseService(_snapshot_config(db_config))
+    with _lock:
+        _services[key] = (service, now)
+    return service
+
+
+def invalidate_config(config_id: int, drop_catalog: bool = False):
+    """Drop cached services and pooled connections for a config after it is changed or deleted"""
+    with _lock:
+        for key in [key for key in _services if key[1] == config_id]:
+            del _services[key]
+    close_pool(config_id)
+    reset_breaker(config_id)
+    item_cache.clear_config(config_id)
+    reset_invoice_allocator(config_id)
+    reset_po_number_cache(config_id)
+    if drop_catalog:
+        drop_mirror(config_id)
+    logger.info(f"Invalidated cached database service for config {config_id}")
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, List, Dict, Any, Iterator, Callable, Optional, BinaryIO, Union
+import logging
+
+from app.services.excel_service import ExcelService, PARSE_CHUNK_ROWS, empty_rejected_report, merge_rejected_reports
+
+logger = logging.getLogger(__name__)
+
+Chunk = Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+class ItemLookupError(Exception):
+    """The item query for a chunk of uploaded rows failed"""
+
+
+class UploadPipeline:
+    """Parse an upload off-process, then look up its items chunk by chunk while earlier chunks become lines"""
+
+    def __init__(self, database_service, profile: str, chunk_rows: int = PARSE_CHUNK_ROWS):
+        self.db_service = database_service
+        self.profile = profile
+        self.chunk_rows = chunk_rows
+        self.excel_service = ExcelService()
+
+    def run(self, source: Union[str, BinaryIO], filename: Optional[str],
+            build_lines: Callable[[Iterator[Chunk]], Tuple[Any, ...]]) -> Tuple[bool, Tuple[Any, ...], Dict[str, Any], str]:
+        """Feed (rows, items) chunks of an upload into `build_lines` and return what it built.
+
+        Rows are held as compact columns and only turned into dicts a chunk at a time; parse problems
+        come back as (False, (), rejected, message), a failed item query raises ItemLookupError and
+        ParseBusyError means no parse worker was free.
+        """
+        success, chunks, message = self.excel_service.open_chunks(source, filename, self.chunk_rows)
+        if not success:
+            return False, (), {}, message
+
+        rejected = empty_rejected_report()
+        counts = {'rows': 0}
+        try:
+            built = build_lines(self._looked_up_chunks(chunks, rejected, counts))
+        except ItemLookupError:
+            raise
+        except Exception as e:
+            # A chunk that cannot be turned into lines fails the upload like a sheet that never opened
+            logger.error(f"Error processing Excel file: {e}")
+            return False, (), rejected, f"Error processing Excel file: {str(e)}"
+        finally:
+            # Stops a parse worker that is still sending chunks nobody will read
+            chunks.close()
+
+        if not counts['rows']:
+            return False, (), rejected, "No valid data rows found in Excel file"
+
+        logger.info(f"Processed {counts['rows']} rows from {filename}")
+        return True, built, rejected, f"Successfully processed {counts['rows']} rows"
+
+    def _looked_up_chunks(self, chunks: Iterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]],
+                          rejected: Dict[str, Any], counts: Dict[str, int]) -> Iterator[Chunk]:
+        # One lookup in flight at a time: chunk N+1 is queried while chunk N is built into lines
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='upc-lookup') as executor:
+            pending = None
+            for rows, chunk_rejected in chunks:
+                merge_rejected_reports(rejected, chunk_rejected)
+                if not rows:
+                    continue
+                counts['rows'] += len(rows)
+                future = executor.submit(self._lookup, rows)
+                if pending:
+                    yield pending[0], pending[1].result()
+                pending = (rows, future)
+            if pending:
+                yield pending[0], pending[1].result()
+
+    def _lookup(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        upcs = list(dict.fromkeys(row['UPC'] for row in rows if row['UPC']))
+        success, items, message = self.db_service.get_items_by_upcs(upcs, self.profile)
+        if not success:
+            raise ItemLookupError(message)
+        return items
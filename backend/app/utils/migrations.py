@@ -14,6 +14,8 @@ def run_migrations():
         add_connection_security_columns()
         # Migration 2: Update ODBC Driver 17 to Driver 18
         migrate_odbc_driver_v17_to_v18()
+        # Migration 3: Add catalog mirror flag
+        add_catalog_mirror_column()
         print("All migrations completed")
         
     except Exception as e:
@@ -96,4 +98,27 @@ def add_connection_security_columns():
             
     except Exception as e:
         logger.error(f"Failed to add connection security columns: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+def add_catalog_mirror_column():
+    """Add catalog_mirror_enabled column to database_configs table"""
+    try:
+        with db.engine.connect() as conn:
+            result = conn.execute(text("PRAGMA table_info(database_configs)"))
+            columns = [row[1] for row in result]
+            
+            if 'catalog_mirror_enabled' not in columns:
+                conn.execute(text(
+                    "ALTER TABLE database_configs ADD COLUMN catalog_mirror_enabled BOOLEAN DEFAULT 0"
+                ))
+                conn.commit()
+                print("Added catalog_mirror_enabled column")
+                logger.info("Added catalog_mirror_enabled column")
+            else:
+                print("Catalog mirror column already exists")
+                logger.info("Catalog mirror column already exists")
+            
+    except Exception as e:
+        logger.error(f"Failed to add catalog mirror column: {e}")
+        raise e
@@ -0,0 +1,105 @@
+"""UPC / EAN / GTIN normalization for matching uploaded codes against Items_tbl"""
+
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Zero-padded lengths a catalog may store a code at: UPC-A, EAN-13, GTIN-14
+GTIN_LENGTHS = (12, 13, 14)
+
+# How an uploaded code resolved to a catalog item
+MATCH_EXACT = 'exact'               # Same string as Items_tbl.ProductUPC
+MATCH_NORMALIZED = 'normalized'     # Same digits once leading zeros / padding are ignored
+MATCH_CHECK_DIGIT = 'check_digit'   # Uploaded code was missing its check digit
+
+
+def clean_upc(value) -> str:
+    """Trim a UPC cell and drop separators people type into barcodes"""
+    if value is None:
+        return ''
+    return str(value).strip().replace(' ', '').replace('-', '')
+
+
+def gtin_key(value) -> str:
+    """Normalized key: digits without leading zeros, so UPC-A, EAN-13 and GTIN-14 forms of a code agree"""
+    upc = clean_upc(value)
+    if upc.isdigit():
+        return upc.lstrip('0') or '0'
+    # Non-numeric codes only match themselves (SQL Server compares them case-insensitively)
+    return upc.upper()
+
+
+def gtin_check_digit(digits: str) -> int:
+    """GS1 check digit for a code without its check digit"""
+    total = sum(int(digit) * (3 if position % 2 == 0 else 1) for position, digit in enumerate(reversed(digits)))
+    return (10 - total % 10) % 10
+
+
+def has_valid_check_digit(key: str) -> bool:
+    return key.isdigit() and len(key) >= 2 and gtin_check_digit(key[:-1]) == int(key[-1])
+
+
+def lookup_keys(value) -> List[Tuple[str, str]]:
+    """Keys to look an uploaded code up by, most specific first"""
+    key = gtin_key(value)
+    if not key:
+        return []
+    keys = [(key, MATCH_NORMALIZED)]
+    # A numeric code that fails its own check digit is most likely truncated
+    # (e.g. an 11-digit UPC); only then is the completed code tried as well
+    if key.isdigit() and len(key) < GTIN_LENGTHS[-1] and not has_valid_check_digit(key):
+        keys.append((key + str(gtin_check_digit(key)), MATCH_CHECK_DIGIT))
+    return keys
+
+
+def key_variants(key: str) -> List[str]:
+    """Strings a catalog may store for a key: as-is and zero-padded to each GTIN length"""
+    if not key.isdigit():
+        return [key]
+    variants = [key]
+    for length in GTIN_LENGTHS:
+        if len(key) < length:
+            variants.append(key.zfill(length))
+    return variants
+
+
+def _exact_form(value) -> str:
+    """ProductUPC as SQL Server compares it: trimmed, case-insensitive"""
+    return '' if value is None else str(value).strip().upper()
+
+
+class UpcIndex:
+    """Catalog items indexed by ProductUPC as stored, without separators, and by normalized key.
+
+    When several items share a form the first one is kept; a code that only matches such a
+    shared normalized key is logged as ambiguous.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.by_exact = {}
+        self.by_upc = {}
+        self.by_key = {}
+        self.ambiguous_keys = set()
+        for item in items:
+            upc = clean_upc(item.get('ProductUPC'))
+            self.by_exact.setdefault(_exact_form(item.get('ProductUPC')), item)
+            self.by_upc.setdefault(upc, item)
+            key = gtin_key(upc)
+            if self.by_key.setdefault(key, item) is not item:
+                self.ambiguous_keys.add(key)
+
+    def match(self, value) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Find the item for an uploaded code and report which variant matched"""
+        exact = _exact_form(value)
+        if exact in self.by_exact:
+            return self.by_exact[exact], MATCH_EXACT
+        upc = clean_upc(value)
+        if upc in self.by_upc:
+            return self.by_upc[upc], MATCH_EXACT
+        for key, variant in lookup_keys(upc):
+            if key in self.by_key:
+                if key in self.ambiguous_keys:
+                    logger.warning(f"UPC {upc} matches several catalog items; using ProductID {self.by_key[key].get('ProductID')}")
+                return self.by_key[key], variant
+        return None, None
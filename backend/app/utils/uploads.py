@@ -0,0 +1,21 @@
+"""Request class that keeps uploaded files in memory instead of writing them to disk first"""
+
+import os
+from tempfile import SpooledTemporaryFile, NamedTemporaryFile
+from typing import IO, Optional
+
+from flask import Request
+
+# Uploads up to this size stay in memory; larger ones are written to a per-request temp file
+UPLOAD_SPOOL_MAX_BYTES = int(os.environ.get('UPLOAD_SPOOL_MAX_BYTES', 8 * 1024 * 1024))
+
+
+class SpooledUploadRequest(Request):
+    """Flask request whose uploaded files are spooled in memory up to UPLOAD_SPOOL_MAX_BYTES"""
+
+    def _get_file_stream(self, total_content_length: Optional[int], content_type: Optional[str],
+                         filename: Optional[str] = None, content_length: Optional[int] = None) -> IO[bytes]:
+        if total_content_length is not None and total_content_length > UPLOAD_SPOOL_MAX_BYTES:
+            # A named file (removed when the request closes it) lets a parse worker read it by path
+            return NamedTemporaryFile(mode='rb+')
+        return SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES, mode='rb+')
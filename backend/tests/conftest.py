@@ -0,0 +1,11 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def clock():
+    """Controllable stand-in for a module's `time`; advance it with clock.now += seconds"""
+    fake = SimpleNamespace(now=1000.0)
+    fake.monotonic = lambda: fake.now
+    return fake
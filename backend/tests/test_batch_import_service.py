@@ -0,0 +1,116 @@
+import json
+
+from app.services.batch_import_service import BatchImportService
+
+
+class StubDatabase:
+    """Just enough of DatabaseService for a batch run; records what would be inserted"""
+
+    def __init__(self, items, reserve_invoice=None, reserve_po=None):
+        self.items = items
+        self.reserve_invoice = reserve_invoice or (lambda count: (True, 500, "Reserved"))
+        self.reserve_po = reserve_po or (lambda count: (True, 70, "Reserved"))
+        self.inserted = []
+
+    def get_customer_by_id(self, customer_id):
+        return True, {'CustomerID': customer_id, 'BusinessName': 'Corner Store'}, "Found"
+
+    def get_supplier_by_id(self, supplier_id):
+        return True, {'SupplierID': supplier_id, 'BusinessName': 'ACME'}, "Found"
+
+    def get_items_by_upcs(self, upcs, profile='full'):
+        return True, self.items, "Found"
+
+    def verify_items_live(self, lines):
+        return True, [], "Verified"
+
+    def reserve_invoice_numbers(self, count):
+        return self.reserve_invoice(count)
+
+    def reserve_po_numbers(self, count):
+        return self.reserve_po(count)
+
+    def create_documents(self, documents, group_size):
+        for document in documents:
+            self.inserted.append(document)
+            yield {'index': document['index'], 'success': True}
+
+
+ITEMS = [
+    {'ProductID': 1, 'ProductUPC': '012345678905', 'UnitCost': 1.0},
+    {'ProductID': 2, 'ProductUPC': '0012345678905', 'UnitCost': 2.0},
+    {'ProductID': 3, 'ProductUPC': '041234567890', 'UnitCost': 3.0},
+]
+
+
+def _run(db, *documents):
+    service = BatchImportService(db)
+    parsed, errors = service.parse([json.dumps(document) for document in documents])
+    results = list(service.run(parsed, errors))
+    return results[:-1], results[-1]['summary']
+
+
+def _invoice(*upcs):
+    return {'type': 'invoice', 'customer_id': 1, 'lines': [{'UPC': upc, 'Cost': 2, 'QTY': 1} for upc in upcs]}
+
+
+def _purchase_order(*upcs):
+    return {'type': 'purchase_order', 'supplier_id': 3, 'lines': [{'UPC': upc, 'Cost': 2, 'QTY': 1} for upc in upcs]}
+
+
+def _raise(count):
+    raise RuntimeError('boom')
+
+
+def test_failed_number_reservation_inserts_nothing():
+    db = StubDatabase(ITEMS, reserve_invoice=lambda count: (False, 0, 'boom'))
+    results, summary = _run(db, _invoice('012345678905'), _purchase_order('41234567890'))
+
+    assert [document['type'] for document in db.inserted] == ['purchase_order']
+    assert db.inserted[0]['header']['po_number'] == '70'
+    assert [(result['type'], result['success']) for result in results] == [('invoice', False), ('purchase_order', True)]
+    assert 'boom' in results[0]['error']
+    assert summary == {'documents': 2, 'created': 1, 'failed': 1, 'outcome_unknown': 0}
+
+
+def test_reservation_error_fails_the_batch_without_inserting():
+    db = StubDatabase(ITEMS, reserve_invoice=_raise)
+    results, summary = _run(db, _invoice('012345678905'), _purchase_order('41234567890'))
+
+    assert db.inserted == []
+    assert all(not result['success'] and 'boom' in result['error'] for result in results)
+    assert summary == {'documents': 2, 'created': 0, 'failed': 2, 'outcome_unknown': 0}
+
+
+def test_documents_get_consecutive_reserved_numbers():
+    db = StubDatabase(ITEMS)
+    _, summary = _run(db, _invoice('012345678905'), _invoice('41234567890'))
+
+    assert [document['header']['invoice_number'] for document in db.inserted] == ['500', '501']
+    assert summary['created'] == 2
+
+
+def test_each_document_matches_only_its_own_items():
+    db = StubDatabase(ITEMS)
+    _run(db, _invoice('0012345678905', '999'), _invoice('12345678905'), _purchase_order('41234567890'))
+
+    product_ids = [[line['ProductID'] for line in document['details']] for document in db.inserted]
+    # Exact forms win; a shared normalized key resolves to the first catalog item, as for a single upload
+    assert product_ids == [[2], [1], [3]]
+
+
+def test_parse_cleans_lines_per_document():
+    service = BatchImportService(StubDatabase(ITEMS))
+    documents, errors = service.parse([
+        json.dumps({'type': 'invoice', 'customer_id': 1, 'lines': [{'UPC': '1', 'Cost': 2, 'QTY': 1}, {'UPC': '2', 'Cost': -1, 'QTY': 1}]}),
+        json.dumps({'type': 'invoice', 'customer_id': 1, 'lines': [{'UPC': '3', 'Cost': 'x', 'QTY': 1}]}),
+        'not json',
+        json.dumps({'type': 'invoice', 'customer_id': 1, 'lines': ['oops', {'UPC': '4', 'Cost': float('inf'), 'QTY': 1}, {'UPC': '5', 'Cost': 1, 'QTY': 2}]}),
+    ])
+
+    assert [(document['index'], document['rejected_lines']) for document in documents] == [(1, [2]), (4, [1, 2])]
+    assert [[(row['UPC'], row['row_number']) for row in document['rows']] for document in documents] == [[('1', 1)], [('5', 3)]]
+    assert [(error['index'], error['error']) for error in errors] == [
+        (2, 'No valid UPC / Cost / QTY lines'), (3, errors[1]['error'])
+    ]
+    assert errors[1]['error'].startswith('Invalid JSON')
@@ -0,0 +1,73 @@
+import io
+
+import numpy as np
+
+from app.services.excel_service import ExcelService
+
+
+def _clean(upc, cost, qty):
+    return ExcelService()._clean_and_validate_data({'UPC': upc, 'Cost': cost, 'QTY': qty}, first_row=2)
+
+
+def test_clean_and_validate_reasons():
+    parsed, report = _clean(
+        ['111', None, None, '222', '333', '444', '555', '666', '777.0'],
+        ['1.5', None, '2', 'abc', '-1', '1', '1', 'inf', '3'],
+        ['2', None, '1', '1', '1', 'x', '0', '1', '4']
+    )
+
+    assert parsed.upc == ['111', '777']
+    assert parsed.cost.tolist() == [1.5, 3.0]
+    assert parsed.qty.tolist() == [2.0, 4.0]
+    assert parsed.row_number.tolist() == [2, 10]
+    # The blank row (3) is skipped without being reported
+    assert report['count'] == 6
+    assert report['reasons'] == {
+        'missing_value': 1, 'invalid_cost': 2, 'negative_cost': 1, 'invalid_qty': 1, 'non_positive_qty': 1
+    }
+    assert [(row['row_number'], row['reason']) for row in report['rows']] == [
+        (4, 'missing_value'), (5, 'invalid_cost'), (6, 'negative_cost'),
+        (7, 'invalid_qty'), (8, 'non_positive_qty'), (9, 'invalid_cost')
+    ]
+
+
+def test_clean_rejects_non_finite_numbers():
+    parsed, report = _clean(['111', '222', '333'], [float('nan'), float('inf'), 1.0], [1, 1, float('-inf')])
+
+    assert len(parsed) == 0
+    assert report['reasons'] == {'missing_value': 1, 'invalid_cost': 1, 'invalid_qty': 1}
+    # NaN cells are reported as empty, which JSON can carry
+    assert report['rows'][0]['Cost'] is None
+
+
+def _rows(data: bytes, filename: str = 'upload.csv'):
+    return list(ExcelService()._iter_sheet_rows(io.BytesIO(data), filename))
+
+
+def test_csv_sniffs_delimiter_and_keeps_leading_zeros():
+    assert _rows(b'UPC;Cost;QTY\n0041234567890;1,5;2\n') == [('UPC', 'Cost', 'QTY'), ('0041234567890', '1,5', '2')]
+    assert _rows(b'UPC\tCost\tQTY\n012\t1\t\n', 'upload.tsv') == [('UPC', 'Cost', 'QTY'), ('012', '1', None)]
+
+
+def test_csv_sniffs_encoding():
+    service = ExcelService()
+    assert service._sniff_encoding('﻿UPC'.encode('utf-8')) == 'utf-8-sig'
+    assert service._sniff_encoding('UPC,Café'.encode('utf-16')) == 'utf-16'
+    assert service._sniff_encoding('UPC,Café'.encode('cp1252'), complete=True) == 'cp1252'
+    # A sample cut inside a multi-byte character is still UTF-8
+    assert service._sniff_encoding('Café'.encode('utf-8')[:-1]) == 'utf-8-sig'
+
+    assert _rows('UPC,Cost,QTY,Name\n1,2,3,Café\n'.encode('cp1252'))[1] == ('1', '2', '3', 'Café')
+    assert _rows('UPC,Cost,QTY\n1,2,3\n'.encode('utf-16'))[1] == ('1', '2', '3')
+
+
+def test_parsed_parts_from_csv():
+    data = b'Supplier: ACME\n\nBarcode,Price,Quantity\n012345678905,1.25,2\n,,\n999,-1,1\n'
+    parts = ExcelService().iter_parsed_parts(io.BytesIO(data), 'upload.csv', chunk_rows=2)
+
+    assert next(parts) == (True, 'Header found in row 3')
+    chunks = list(parts)
+    assert [len(part) for part, _ in chunks] == [1, 0]
+    assert chunks[0][0].upc == ['012345678905']
+    assert chunks[1][1]['reasons'] == {'negative_cost': 1}
+    assert np.array_equal(chunks[0][0].row_number, [1])
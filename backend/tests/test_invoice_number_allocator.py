@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+from app.services.invoice_number_allocator import InvoiceNumberAllocator
+
+
+class FakeCursor:
+    """Answers the allocator's scan queries from a list of (InvoiceID, InvoiceNumber) rows"""
+
+    def __init__(self, invoices):
+        self.invoices = invoices
+        self.full_scans = 0
+        self._row = None
+
+    def execute(self, query, params=()):
+        numbers = [(invoice_id, int(number)) for invoice_id, number in self.invoices if number.isdigit()]
+        max_invoice_id = max((invoice_id for invoice_id, _ in self.invoices), default=None)
+        if 'NewMaxInvoiceNumber' in query:
+            newer = [number for invoice_id, number in numbers if invoice_id > params[0]]
+            self._row = SimpleNamespace(MaxInvoiceID=max_invoice_id, NewMaxInvoiceNumber=max(newer, default=None))
+        elif 'MaxInvoiceNumber' in query:
+            self.full_scans += 1
+            self._row = SimpleNamespace(MaxInvoiceNumber=max((number for _, number in numbers), default=None),
+                                        MaxInvoiceID=max_invoice_id)
+        elif 'LockResult' in query:
+            self._row = SimpleNamespace(LockResult=0)
+        else:
+            taken = any(number == params[0] for _, number in self.invoices)
+            self._row = SimpleNamespace(Taken=1) if taken else None
+        return self
+
+    def fetchone(self):
+        return self._row
+
+
+def test_discard_between_refresh_and_read(monkeypatch):
+    cursor = FakeCursor([(1, '10'), (2, '11')])
+    allocator = InvoiceNumberAllocator(1)
+    refresh = allocator.refresh
+
+    def refresh_then_rollback(cursor):
+        # A rollback on another thread lands after this reader's refresh, before it reads db_max
+        refresh(cursor)
+        allocator.discard()
+    monkeypatch.setattr(allocator, 'refresh', refresh_then_rollback)
+
+    assert allocator.peek_next(cursor) == 12
+    assert allocator.reserve_block(cursor, 2) == 12
+    assert allocator.assign(cursor, '11') == ('14', True)
+    assert allocator.assign(cursor, '40') == ('40', False)
+
+
+def test_discard_rescans_on_next_refresh():
+    cursor = FakeCursor([(1, '10')])
+    allocator = InvoiceNumberAllocator(1)
+    assert allocator.peek_next(cursor) == 11
+    assert allocator.peek_next(cursor) == 11
+    assert cursor.full_scans == 1
+
+    # An invoice seen inside a transaction that was then rolled back
+    cursor.invoices.append((2, '50'))
+    assert allocator.peek_next(cursor) == 51
+    cursor.invoices.pop()
+    allocator.discard()
+
+    assert allocator.peek_next(cursor) == 11
+    assert cursor.full_scans == 2
+
+
+def test_incremental_refresh_and_confirm():
+    cursor = FakeCursor([(1, '10')])
+    allocator = InvoiceNumberAllocator(1)
+    allocator.refresh(cursor)
+    cursor.invoices.append((2, '20'))
+
+    assert allocator.peek_next(cursor) == 21
+    allocator.confirm('25')
+    assert allocator.peek_next(cursor) == 26
+    assert cursor.full_scans == 1
@@ -0,0 +1,55 @@
+from app.services import item_cache as item_cache_module
+from app.services.item_cache import ItemCache
+
+
+def test_hits_misses_and_negative_results(clock, monkeypatch):
+    monkeypatch.setattr(item_cache_module, 'time', clock)
+    cache = ItemCache(ttl=300, negative_ttl=60)
+    cache.put_many(1, 'invoice', ['12345678905', '999'], [{'ProductID': 1, 'ProductUPC': '012345678905'}])
+
+    cached, missing = cache.get_many(1, 'invoice', ['12345678905', '999', '42'])
+    assert cached == {'12345678905': [{'ProductID': 1, 'ProductUPC': '012345678905'}], '999': []}
+    assert missing == ['42']
+    # Other configs and projection profiles are cached separately
+    assert cache.get_many(2, 'invoice', ['12345678905'])[1] == ['12345678905']
+    assert cache.get_many(1, 'purchase_order', ['12345678905'])[1] == ['12345678905']
+
+    # "Not found" expires first
+    clock.now += 61
+    cached, missing = cache.get_many(1, 'invoice', ['12345678905', '999'])
+    assert list(cached) == ['12345678905'] and missing == ['999']
+    clock.now += 240
+    assert cache.get_many(1, 'invoice', ['12345678905'])[1] == ['12345678905']
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['negative_hits']) == (2, 1)
+
+
+def test_returns_copies():
+    cache = ItemCache()
+    cache.put_many(1, 'invoice', ['1'], [{'ProductID': 1, 'ProductUPC': '1'}])
+    cache.get_many(1, 'invoice', ['1'])[0]['1'][0]['ProductID'] = 99
+
+    assert cache.get_many(1, 'invoice', ['1'])[0]['1'][0]['ProductID'] == 1
+
+
+def test_lru_eviction_and_invalidation():
+    cache = ItemCache(max_entries=2)
+    cache.put_many(1, 'invoice', ['1', '2'], [])
+    cache.get_many(1, 'invoice', ['1'])
+    cache.put_many(1, 'invoice', ['3'], [])
+
+    assert cache.get_many(1, 'invoice', ['1', '2', '3'])[1] == ['2']
+    assert cache.stats()['evictions'] == 1
+
+    cache.put_many(1, 'purchase_order', ['3'], [])
+    cache.invalidate(1, ['3'])
+    assert cache.get_many(1, 'invoice', ['3'])[1] == ['3']
+    assert cache.get_many(1, 'purchase_order', ['3'])[1] == ['3']
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ItemCache(max_entries=0)
+    cache.put_many(1, 'invoice', ['1'], [])
+
+    assert cache.get_many(1, 'invoice', ['1'])[1] == ['1']
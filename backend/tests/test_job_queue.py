@@ -0,0 +1,87 @@
+import time
+
+import pyodbc
+import pytest
+
+from app.services import job_queue as job_queue_module
+from app.services.database_service import CommitOutcomeUnknownError
+from app.services.job_queue import JobQueue, JobError, is_transient_error, SUCCEEDED, FAILED
+
+
+@pytest.mark.parametrize('error, transient', [
+    (pyodbc.OperationalError('08S01', 'Communication link failure'), True),
+    (pyodbc.OperationalError('HYT00', 'Query timeout expired'), True),
+    (pyodbc.Error('40001', 'Transaction was deadlocked'), True),
+    (pyodbc.IntegrityError('23000', 'Violation of PRIMARY KEY constraint'), False),
+    (pyodbc.ProgrammingError('42S02', 'Invalid object name'), False),
+    (ValueError('bad input'), False),
+])
+def test_is_transient_error(error, transient):
+    assert is_transient_error(error) is transient
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(job_queue_module, 'JOB_RETRY_BASE_DELAY', 0.01)
+    monkeypatch.setattr(job_queue_module, 'JOB_MAX_ATTEMPTS', 3)
+    return JobQueue(workers=2, per_database=1)
+
+
+def _wait(queue, job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = queue.get(job.id, job.user_id)
+        if status['status'] in (SUCCEEDED, FAILED):
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job still {status['status']}")
+
+
+def _failing(*errors, result=None):
+    """Job function raising each error in turn, then returning `result`"""
+    errors = list(errors)
+
+    def run():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return run
+
+
+def test_transient_failure_is_retried(queue):
+    finished = []
+    job = queue.submit(1, 5, 'invoice', _failing(pyodbc.OperationalError('08S01', 'lost'), result={'id': 7}),
+                       on_finish=finished.append)
+
+    status = _wait(queue, job)
+    assert (status['status'], status['attempts'], status['result']) == (SUCCEEDED, 2, {'id': 7})
+    assert finished == [job]
+
+
+def test_retries_stop_at_max_attempts(queue):
+    job = queue.submit(1, 5, 'invoice', _failing(*[pyodbc.OperationalError('08S01', 'lost')] * 5))
+
+    status = _wait(queue, job)
+    assert (status['status'], status['attempts']) == (FAILED, 3)
+
+
+@pytest.mark.parametrize('error', [
+    pyodbc.IntegrityError('23000', 'duplicate'),
+    JobError('Customer not found', {'missing_upcs': ['1']}),
+    CommitOutcomeUnknownError('Connection lost while committing'),
+])
+def test_permanent_failure_is_not_retried(queue, error):
+    job = queue.submit(1, 5, 'invoice', _failing(error, result={}))
+
+    status = _wait(queue, job)
+    assert (status['status'], status['attempts']) == (FAILED, 1)
+    assert job.outcome_unknown is isinstance(error, CommitOutcomeUnknownError)
+    if isinstance(error, JobError):
+        assert status['missing_upcs'] == ['1']
+
+
+def test_status_is_private_to_its_user(queue):
+    job = queue.submit(1, 5, 'invoice', _failing(result={}))
+    _wait(queue, job)
+
+    assert queue.get(job.id, 2) is None
@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+from app.services.invoice_service import InvoiceService
+from app.services.purchase_order_service import PurchaseOrderService
+from app.services.line_items import InvoiceLine, PurchaseOrderLine, InvoiceCopyLine
+
+
+def _item(**fields):
+    item = {
+        'ProductID': 1000, 'CateID': 3, 'SubCateID': 'NULL', 'ProductSKU': 'SKU-1',
+        'ProductUPC': '012345678905', 'ProductDescription': 'Cola 12oz', 'ItemSize': None,
+        'UnitCost': Decimal('1.25'), 'OriginalPrice': Decimal('2.50'), 'ItemWeight': 'NULL',
+        'ItemTaxID': Decimal('2'), 'SPPromoted': False, 'SPPromotionDescription': None,
+        'ProductMessage': 'NULL', 'CountInUnit': 12, 'UnitDesc': 'CASE'
+    }
+    item.update(fields)
+    return item
+
+
+def test_invoice_line_from_database_values():
+    rows = [{'UPC': '012345678905', 'Cost': 3.0, 'QTY': 2.0, 'row_number': 4}]
+    lines, missing, totals = InvoiceService(None).build_lines([(rows, [_item()])])
+
+    assert lines == [InvoiceLine.from_fields(
+        ProductID=1000, CateID=3, SubCateID=0,
+        ProductSKU='SKU-1', ProductUPC='012345678905', ProductDescription='Cola 12oz', ItemSize='',
+        UnitPrice=3.0, OriginalPrice=2.5, UnitCost=1.25,
+        QtyOrdered=2.0, QtyShipped=2.0, ExtendedPrice=6.0, ExtendedCost=2.5,
+        ItemWeight=0.0, ItemTaxID=2, Taxable=False, SPPromoted=False,
+        SPPromotionDescription='', ProductMessage='', LineMessage='', UnitDesc='CASE',
+        UnitQty=1.0, CountInUnit=12, excel_row=4, SourceUPC='012345678905', UPCMatch='exact'
+    )]
+    assert missing == []
+    assert totals == {
+        'total_qty_ordered': 2.0, 'total_qty_shipped': 2.0, 'total_cost': 2.5,
+        'total_price': 6.0, 'total_weight': 0.0
+    }
+
+
+def test_invoice_lines_match_padded_and_truncated_codes():
+    rows = [
+        {'UPC': '12345678905', 'Cost': 1.0, 'QTY': 1.0, 'row_number': 1},
+        {'UPC': '1234567890', 'Cost': 1.0, 'QTY': 1.0, 'row_number': 2},
+        {'UPC': '999', 'Cost': 4.0, 'QTY': 5.0, 'row_number': 3},
+    ]
+    lines, missing, _ = InvoiceService(None).build_lines([(rows, [_item()])])
+
+    assert [(line.SourceUPC, line.UPCMatch, line.ProductID) for line in lines] == [
+        ('12345678905', 'normalized', 1000),
+        ('1234567890', 'check_digit', 1000),
+    ]
+    assert missing == [{'upc': '999', 'row_number': 3, 'price': 4.0, 'qty': 5.0}]
+
+
+def test_purchase_order_line_takes_cost_from_upload():
+    rows = [{'UPC': '012345678905', 'Cost': 0.8, 'QTY': 10.0, 'row_number': 2}]
+    lines, missing, totals = PurchaseOrderService(None).build_lines([(rows, [_item()])])
+
+    line = lines[0]
+    assert isinstance(line, PurchaseOrderLine)
+    assert (line.UnitCost, line.QtyOrdered, line.ExtendedCost) == (0.8, 10.0, 8.0)
+    assert (line.CateID, line.SubCateID, line.ItemWeight, line.UnitDesc) == (3, 0, 0.0, 'CASE')
+    assert totals['total_cost'] == 8.0
+    assert missing == []
+
+
+def test_line_item_reads_like_a_mapping():
+    line = InvoiceCopyLine.from_fields(**{name: None for name in InvoiceLine.FIELDS})
+
+    assert line['UnitCost'] is None and line.get('Missing', 'x') == 'x'
+    assert 'ProductID' in line and 'Missing' not in line
+    assert line.to_dict(['ProductID', 'Missing']) == {'ProductID': None}
+    assert 'UnitCost' not in InvoiceCopyLine.ITEM_FIELDS
+    assert 'UnitCost' in InvoiceLine.ITEM_FIELDS
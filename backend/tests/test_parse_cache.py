@@ -0,0 +1,43 @@
+import numpy as np
+
+from app.services import parse_cache as parse_cache_module
+from app.services.excel_service import ParsedRows
+from app.services.parse_cache import ParseCache
+
+
+def _parsed(rows):
+    return ParsedRows(['1'] * rows, np.ones(rows), np.ones(rows), np.arange(rows))
+
+
+def _report():
+    return {'count': 0, 'reasons': {}, 'rows': []}
+
+
+def test_lru_drops_least_recently_used(monkeypatch):
+    monkeypatch.setattr(parse_cache_module, '_ROW_BYTES', 1)
+    cache = ParseCache(max_bytes=20)
+    cache.put(('a', '.csv'), _parsed(8), _report(), 'a')
+    cache.put(('b', '.csv'), _parsed(8), _report(), 'b')
+    assert cache.get(('a', '.csv'))[2] == 'a'
+
+    cache.put(('c', '.csv'), _parsed(8), _report(), 'c')
+    assert cache.get(('b', '.csv')) is None
+    assert cache.get(('a', '.csv')) and cache.get(('c', '.csv'))
+
+    # A file bigger than the whole budget is not cached at all
+    cache.put(('d', '.csv'), _parsed(30), _report(), 'd')
+    assert cache.get(('d', '.csv')) is None
+    assert cache.get(('a', '.csv'))
+
+
+def test_entries_expire(clock, monkeypatch):
+    monkeypatch.setattr(parse_cache_module, 'time', clock)
+    cache = ParseCache(ttl=10)
+    parsed = _parsed(2)
+    cache.put(('a', '.xlsx'), parsed, _report(), 'a')
+    assert cache.get(('a', '.xlsx'))[0] is parsed
+    assert cache.get(('a', '.csv')) is None
+
+    clock.now += 11
+    assert cache.get(('a', '.xlsx')) is None
+    assert cache._bytes == 0
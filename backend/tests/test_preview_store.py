@@ -0,0 +1,87 @@
+import pytest
+
+from app.services import preview_store as preview_store_module
+from app.services.preview_store import PreviewStore
+
+
+def _preview(lines=1):
+    return {'invoice_number': '10', 'lines': [None] * lines}
+
+
+def test_claim_and_finish(clock, monkeypatch):
+    monkeypatch.setattr(preview_store_module, 'time', clock)
+    store = PreviewStore(ttl=60)
+    token = store.put(1, 5, 'invoice', _preview())
+
+    assert store.claim(token)
+    assert not store.claim(token)
+
+    # A failed commit makes the preview usable again, with a fresh lifetime
+    clock.now += 50
+    store.finish(token, False)
+    clock.now += 50
+    assert store.get(token, 1, 'invoice')[0]
+    assert store.claim(token)
+
+    store.finish(token, True)
+    assert not store.get(token, 1, 'invoice')[0]
+    assert not store.claim(token)
+
+
+def test_get_checks_owner_kind_and_expiry(clock, monkeypatch):
+    monkeypatch.setattr(preview_store_module, 'time', clock)
+    store = PreviewStore(ttl=60)
+    token = store.put(1, 5, 'invoice', _preview())
+
+    assert not store.get(token, 2, 'invoice')[0]
+    assert not store.get(token, 1, 'purchase_order')[0]
+    assert store.get(token, 1, 'invoice')[1]['preview']['invoice_number'] == '10'
+
+    clock.now += 61
+    assert not store.get(token, 1, 'invoice')[0]
+
+
+def test_claimed_preview_outlives_its_ttl(clock, monkeypatch):
+    monkeypatch.setattr(preview_store_module, 'time', clock)
+    store = PreviewStore(ttl=60)
+    token = store.put(1, 5, 'invoice', _preview())
+    store.claim(token)
+
+    clock.now += 120
+    store.put(1, 5, 'invoice', _preview())
+    assert store.get(token, 1, 'invoice')[0]
+
+
+def test_evicts_per_user_and_over_budget():
+    store = PreviewStore(max_per_user=2)
+    first, second, third = (store.put(1, 5, 'invoice', _preview()) for _ in range(3))
+    other = store.put(2, 5, 'invoice', _preview())
+
+    assert not store.get(first, 1, 'invoice')[0]
+    assert store.get(second, 1, 'invoice')[0] and store.get(third, 1, 'invoice')[0]
+    assert store.get(other, 2, 'invoice')[0]
+
+    # Over the memory budget the oldest unclaimed previews go first
+    small = PreviewStore(max_bytes=2000)
+    kept = small.put(1, 5, 'invoice', _preview(2))
+    small.claim(kept)
+    dropped = small.put(1, 5, 'invoice', _preview(2))
+    newest = small.put(1, 5, 'invoice', _preview(1))
+    assert small.get(kept, 1, 'invoice')[0]
+    assert not small.get(dropped, 1, 'invoice')[0]
+    assert small.get(newest, 1, 'invoice')[0]
+
+
+def test_header_applies_edits():
+    entry = {'kind': 'invoice', 'preview': {'invoice_number': '10', 'customer_id': 7}}
+    header = PreviewStore().header(entry, {'invoice_title': 'Restock'})
+
+    assert (header['invoice_number'], header['invoice_title'], header['customer_id']) == ('10', 'Restock', 7)
+
+
+@pytest.mark.parametrize('edits', [{'customer_id': 8}, {'lines': []}, ['invoice_title']])
+def test_header_rejects_derived_and_unknown_fields(edits):
+    entry = {'kind': 'invoice', 'preview': {'invoice_number': '10', 'customer_id': 7}}
+
+    with pytest.raises(ValueError):
+        PreviewStore().header(entry, edits)
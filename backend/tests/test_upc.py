@@ -0,0 +1,31 @@
+import logging
+
+from app.utils.upc import UpcIndex, MATCH_EXACT, MATCH_NORMALIZED, MATCH_CHECK_DIGIT
+
+
+def test_match_variants():
+    cola = {'ProductID': 1, 'ProductUPC': '012345678905'}
+    index = UpcIndex([cola, {'ProductID': 2, 'ProductUPC': 'abc-1'}])
+
+    assert index.match('012345678905') == (cola, MATCH_EXACT)
+    assert index.match(' 0123-4567 8905 ') == (cola, MATCH_EXACT)
+    assert index.match('0012345678905') == (cola, MATCH_NORMALIZED)
+    assert index.match('1234567890') == (cola, MATCH_CHECK_DIGIT)
+    assert index.match('ABC-1')[0]['ProductID'] == 2
+    assert index.match('999') == (None, None)
+    assert index.match(None) == (None, None)
+
+
+def test_exact_match_wins_over_shared_key(caplog):
+    upc_a = {'ProductID': 1, 'ProductUPC': '012345678905'}
+    ean = {'ProductID': 2, 'ProductUPC': '0012345678905'}
+    index = UpcIndex([upc_a, ean])
+
+    with caplog.at_level(logging.WARNING, logger='app.utils.upc'):
+        assert index.match('0012345678905') == (ean, MATCH_EXACT)
+        assert index.match('012345678905') == (upc_a, MATCH_EXACT)
+    assert not caplog.records
+
+    with caplog.at_level(logging.WARNING, logger='app.utils.upc'):
+        assert index.match('12345678905') == (upc_a, MATCH_NORMALIZED)
+    assert 'several catalog items' in caplog.text
@@ -31,6 +31,33 @@ class ApiService {
         }
     }
 
+    // Poll a background commit job until it finishes; resolves with the job result
+    async waitForJob(jobId) {
+        let delay = 500;
+        while (true) {
+            const { job } = await this.request(`/jobs/${jobId}`);
+
+            if (job.status === 'succeeded') {
+                return job.result;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Job failed');
+            }
+
+            await new Promise(resolve => setTimeout(resolve, delay));
+            delay = Math.min(delay * 1.5, 3000);
+        }
+    }
+
+    // Submit a create request and wait for its background commit
+    async submitJob(endpoint, data) {
+        const { job_id } = await this.request(endpoint, {
+            method: 'POST',
+            body: JSON.stringify(data)
+        });
+        return this.waitForJob(job_id);
+    }
+
     // Auth endpoints
     async login(credentials) {
         return this.request('/auth/login', {
@@ -87,6 +114,10 @@ class ApiService {
         });
     }
 
+    async getDatabaseHealth() {
+        return this.request('/database/configs/health');
+    }
+
     // Invoice endpoints
     async uploadExcel(formData) {
         // Remove Content-Type header for FormData
@@ -101,10 +132,7 @@ class ApiService {
     }
 
     async createInvoice(invoiceData) {
-        return this.request('/invoice/create', {
-            method: 'POST',
-            body: JSON.stringify(invoiceData)
-        });
+        return this.submitJob('/invoice/create', invoiceData);
     }
 
     async getNextInvoiceNumber(databaseConfigId) {
@@ -151,10 +179,7 @@ class ApiService {
     }
 
     async createPurchaseOrder(poData) {
-        return this.request('/po/create', {
-            method: 'POST',
-            body: JSON.stringify(poData)
-        });
+        return this.submitJob('/po/create', poData);
     }
 
     async getNextPONumber(databaseConfigId) {
@@ -206,10 +231,7 @@ class ApiService {
     }
 
     async createCopiedInvoice(data) {
-        return this.request('/invoice-copy/create', {
-            method: 'POST',
-            body: JSON.stringify(data)
-        });
+        return this.submitJob('/invoice-copy/create', data);
     }
 
     // Health check
@@ -189,6 +189,16 @@ const utils = {
         URL.revokeObjectURL(url);
     },
 
+    // Preview UPC cell, flagging lines matched through a padded / truncated code
+    formatUpcCell(line) {
+        if (!line.UPCMatch || line.UPCMatch === 'exact') {
+            return line.ProductUPC;
+        }
+        const label = line.UPCMatch === 'check_digit' ? 'check digit added' : 'normalized';
+        const source = utils.escapeHtml(String(line.SourceUPC || ''));
+        return `${line.ProductUPC} <span class="badge bg-info" title="Uploaded as ${source}">${label}</span>`;
+    },
+
     // Escape HTML
     escapeHtml(unsafe) {
         return unsafe
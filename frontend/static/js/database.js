@@ -48,6 +48,11 @@ class DatabaseManager {
             const response = await api.getDatabaseConfigs();
             this.databases = response.configs;
             this.renderDatabaseList();
+
+            // Keep reachability current so unreachable databases stay greyed out
+            if (!this.healthTimer) {
+                this.healthTimer = setInterval(() => this.refreshHealth(), 30000);
+            }
         } catch (error) {
             authManager.showAlert('Failed to load database configurations: ' + error.message, 'danger');
         } finally {
@@ -88,6 +93,11 @@ class DatabaseManager {
                                 <span class="database-status ${config.is_active ? 'active' : 'inactive'}">
                                     ${config.is_active ? 'Active' : 'Inactive'}
                                 </span>
+                                ${config.health && !config.health.available ? `
+                                    <span class="database-status unreachable ms-2" title="${utils.escapeHtml(String(config.health.last_error || ''))}">
+                                        Unreachable
+                                    </span>
+                                ` : ''}
                                 ${config.last_tested ? `
                                     <small class="text-muted ms-3">
                                         <i class="fas fa-clock me-1"></i>
@@ -152,7 +162,8 @@ class DatabaseManager {
             driver: document.getElementById('databaseDriver').value,
             encrypt_connection: document.getElementById('encryptConnection').checked,
             trust_server_certificate: document.getElementById('trustServerCertificate').checked,
-            tls_min_protocol: document.getElementById('tlsMinProtocol').value || null
+            tls_min_protocol: document.getElementById('tlsMinProtocol').value || null,
+            catalog_mirror_enabled: document.getElementById('catalogMirrorEnabled').checked
         };
 
         // Only include password if it's provided (for edits, blank means keep existing)
@@ -267,6 +278,7 @@ class DatabaseManager {
         document.getElementById('encryptConnection').checked = config.encrypt_connection !== undefined ? config.encrypt_connection : true;
         document.getElementById('trustServerCertificate').checked = config.trust_server_certificate !== undefined ? config.trust_server_certificate : true;
         document.getElementById('tlsMinProtocol').value = config.tls_min_protocol || '';
+        document.getElementById('catalogMirrorEnabled').checked = !!config.catalog_mirror_enabled;
         
         // Update modal title
         const modalTitle = document.querySelector('#databaseModal .modal-title');
@@ -296,6 +308,7 @@ class DatabaseManager {
         document.getElementById('encryptConnection').checked = true;
         document.getElementById('trustServerCertificate').checked = true;
         document.getElementById('tlsMinProtocol').value = '';
+        document.getElementById('catalogMirrorEnabled').checked = false;
         
         // Reset modal title
         const modalTitle = document.querySelector('#databaseModal .modal-title');
@@ -304,12 +317,25 @@ class DatabaseManager {
         }
     }
 
+    async refreshHealth() {
+        try {
+            const response = await api.getDatabaseHealth();
+            this.databases.forEach(db => {
+                db.health = response.health[String(db.id)] || db.health;
+            });
+            this.renderDatabaseList();
+        } catch (error) {
+            console.error('Failed to refresh database health:', error);
+        }
+    }
+
     getDatabaseOptions() {
         return this.databases.filter(db => db.is_active).map(db => ({
             id: db.id,
             name: db.name,
             server: db.server,
-            database: db.database
+            database: db.database,
+            available: !db.health || db.health.available
         }));
     }
 }
@@ -3,6 +3,7 @@
 class InvoiceManager {
     constructor() {
         this.currentPreview = null;
+        this.previewToken = null;
         this.selectedDatabaseId = null;
         this.selectedCustomer = null;
         this.uploadedFile = null;
@@ -62,7 +63,7 @@ class InvoiceManager {
                         <select class="form-select" id="databaseSelect" required>
                             <option value="">Select a database...</option>
                             ${databaseOptions.map(db => `
-                                <option value="${db.id}">${db.name} (${db.server}/${db.database})</option>
+                                <option value="${db.id}" ${db.available ? '' : 'disabled'}>${db.name} (${db.server}/${db.database})${db.available ? '' : ' - unreachable'}</option>
                             `).join('')}
                         </select>
                     </div>
@@ -114,8 +115,8 @@ class InvoiceManager {
                         <i class="fas fa-cloud-upload-alt"></i>
                     </div>
                     <h5>Drop Excel file here or click to browse</h5>
-                    <p class="text-muted">Supported formats: .xlsx, .xls<br>Required columns: UPC, Cost, QTY</p>
-                    <input type="file" id="fileInput" accept=".xlsx,.xls" class="d-none">
+                    <p class="text-muted">Supported formats: .xlsx, .xls, .csv, .tsv<br>Required columns: UPC, Cost, QTY</p>
+                    <input type="file" id="fileInput" accept=".xlsx,.xls,.csv,.tsv" class="d-none">
                     <button type="button" class="btn btn-outline-primary" id="browseButton">
                         <i class="fas fa-folder-open me-2"></i>Browse Files
                     </button>
@@ -401,13 +402,12 @@ class InvoiceManager {
     handleFileSelection(file) {
         if (!file) return;
 
-        const allowedTypes = [
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'application/vnd.ms-excel'
-        ];
+        // Browsers report CSV files under several MIME types (or none), so check the extension
+        const allowedExtensions = ['xlsx', 'xls', 'csv', 'tsv'];
+        const extension = file.name.split('.').pop().toLowerCase();
 
-        if (!allowedTypes.includes(file.type)) {
-            authManager.showAlert('Please select a valid Excel file (.xlsx or .xls)', 'danger');
+        if (!allowedExtensions.includes(extension)) {
+            authManager.showAlert('Please select an Excel or CSV file (.xlsx, .xls, .csv or .tsv)', 'danger');
             return;
         }
 
@@ -438,10 +438,15 @@ class InvoiceManager {
             const response = await api.uploadExcel(formData);
             
             this.currentPreview = response.preview;
+            this.previewToken = response.preview_token;
             this.renderInvoicePreview(response.preview, response.missing_upcs);
             this.activateStep(4);
             
-            authManager.showAlert('Excel file processed successfully', 'success');
+            const skipped = response.rejected_rows ? response.rejected_rows.count : 0;
+            authManager.showAlert(
+                skipped ? `Excel file processed successfully (${skipped} invalid rows skipped)` : 'Excel file processed successfully',
+                skipped ? 'warning' : 'success'
+            );
             
         } catch (error) {
             authManager.showAlert('Failed to process Excel file: ' + error.message, 'danger');
@@ -523,7 +528,7 @@ class InvoiceManager {
                         <tbody>
                             ${preview.lines.map(line => `
                                 <tr>
-                                    <td>${line.ProductUPC}</td>
+                                    <td>${utils.formatUpcCell(line)}</td>
                                     <td>${line.ProductDescription || 'N/A'}</td>
                                     <td>${line.ItemSize || 'N/A'}</td>
                                     <td>$${line.UnitCost.toFixed(2)}</td>
@@ -590,7 +595,7 @@ class InvoiceManager {
     }
 
     async createInvoice() {
-        if (!this.currentPreview || !this.selectedDatabaseId) {
+        if (!this.currentPreview || !this.previewToken) {
             authManager.showAlert('No invoice data available', 'danger');
             return;
         }
@@ -601,34 +606,9 @@ class InvoiceManager {
         try {
             authManager.showLoading(true);
             
+            // The full preview stays on the server; only its token is sent back
             const invoiceData = {
-                database_config_id: this.selectedDatabaseId,
-                invoice_data: {
-                    invoice_number: this.currentPreview.invoice_number,
-                    invoice_date: this.currentPreview.invoice_date,
-                    invoice_type: this.currentPreview.invoice_type,
-                    invoice_title: this.currentPreview.invoice_title,
-                    customer_id: this.currentPreview.customer_id,
-                    business_name: this.currentPreview.business_name,
-                    account_no: this.currentPreview.account_no,
-                    ship_to: this.currentPreview.ship_to,
-                    ship_address1: this.currentPreview.ship_address1,
-                    ship_address2: this.currentPreview.ship_address2,
-                    ship_city: this.currentPreview.ship_city,
-                    ship_state: this.currentPreview.ship_state,
-                    ship_zipcode: this.currentPreview.ship_zipcode,
-                    ship_phone: this.currentPreview.ship_phone,
-                    term_id: this.currentPreview.term_id,
-                    sales_rep_id: this.currentPreview.sales_rep_id,
-                    total_qty_ordered: this.currentPreview.total_qty_ordered,
-                    total_qty_shipped: this.currentPreview.total_qty_shipped,
-                    no_lines: this.currentPreview.no_lines,
-                    total_weight: this.currentPreview.total_weight,
-                    invoice_subtotal: this.currentPreview.invoice_subtotal,
-                    total_taxes: this.currentPreview.total_taxes,
-                    invoice_total: this.currentPreview.invoice_total
-                },
-                invoice_details: this.currentPreview.lines
+                preview_token: this.previewToken
             };
 
             const response = await api.createInvoice(invoiceData);
@@ -645,6 +625,7 @@ class InvoiceManager {
 
     resetWorkflow() {
         this.currentPreview = null;
+        this.previewToken = null;
         this.selectedDatabaseId = null;
         this.selectedCustomer = null;
         this.uploadedFile = null;
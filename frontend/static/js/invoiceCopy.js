@@ -5,6 +5,7 @@ class InvoiceCopyManager {
         this.selectedInvoice = null;
         this.selectedCustomer = null;
         this.currentPreview = null;
+        this.previewToken = null;
         this.currentPage = 1;
         this.searchTerm = '';
         this.currentStep = 1;
@@ -97,7 +98,7 @@ class InvoiceCopyManager {
                         <select class="form-select" id="icSourceDb" required>
                             <option value="">Select source database...</option>
                             ${databaseOptions.map(db => `
-                                <option value="${db.id}" ${String(db.id) === String(this.sourceConfigId) ? 'selected' : ''}>${db.name} (${db.server}/${db.database})</option>
+                                <option value="${db.id}" ${String(db.id) === String(this.sourceConfigId) ? 'selected' : ''} ${db.available ? '' : 'disabled'}>${db.name} (${db.server}/${db.database})${db.available ? '' : ' - unreachable'}</option>
                             `).join('')}
                         </select>
                     </div>
@@ -434,6 +435,7 @@ class InvoiceCopyManager {
 
             this.selectedCustomer = null;
             this.currentPreview = null;
+            this.previewToken = null;
 
             const rows = document.querySelectorAll('.invoice-browse-row');
             rows.forEach(r => r.classList.remove('selected'));
@@ -472,7 +474,7 @@ class InvoiceCopyManager {
         databaseOptions.forEach(db => {
             if (String(db.id) !== String(this.sourceConfigId)) {
                 const isSelected = String(db.id) === String(this.destConfigId);
-                html += `<option value="${db.id}" ${isSelected ? 'selected' : ''}>${db.name} (${db.server}/${db.database})</option>`;
+                html += `<option value="${db.id}" ${isSelected ? 'selected' : ''} ${db.available ? '' : 'disabled'}>${db.name} (${db.server}/${db.database})${db.available ? '' : ' - unreachable'}</option>`;
             }
         });
 
@@ -610,6 +612,7 @@ class InvoiceCopyManager {
             }
 
             this.currentPreview = response.preview;
+            this.previewToken = response.preview_token;
             this.renderCopyPreview(response.preview, response.missing_upcs);
             this.goToStep(3);
 
@@ -726,7 +729,7 @@ class InvoiceCopyManager {
                         <tbody>
                             ${preview.lines.map(line => `
                                 <tr>
-                                    <td>${line.ProductUPC}</td>
+                                    <td>${utils.formatUpcCell(line)}</td>
                                     <td>${line.ProductDescription || 'N/A'}</td>
                                     <td>${line.ItemSize || 'N/A'}</td>
                                     <td>$${parseFloat(line.UnitCost || 0).toFixed(2)}</td>
@@ -785,7 +788,7 @@ class InvoiceCopyManager {
     }
 
     async createInvoice() {
-        if (!this.currentPreview || !this.destConfigId) {
+        if (!this.currentPreview || !this.previewToken) {
             authManager.showAlert('No invoice data available', 'danger');
             return;
         }
@@ -796,34 +799,9 @@ class InvoiceCopyManager {
         try {
             authManager.showLoading(true);
 
+            // The full preview stays on the server; only its token is sent back
             const invoiceData = {
-                dest_config_id: this.destConfigId,
-                invoice_data: {
-                    invoice_number: this.currentPreview.invoice_number,
-                    invoice_date: this.currentPreview.invoice_date,
-                    invoice_type: this.currentPreview.invoice_type,
-                    invoice_title: this.currentPreview.invoice_title,
-                    customer_id: this.currentPreview.customer_id,
-                    business_name: this.currentPreview.business_name,
-                    account_no: this.currentPreview.account_no,
-                    ship_to: this.currentPreview.ship_to,
-                    ship_address1: this.currentPreview.ship_address1,
-                    ship_address2: this.currentPreview.ship_address2,
-                    ship_city: this.currentPreview.ship_city,
-                    ship_state: this.currentPreview.ship_state,
-                    ship_zipcode: this.currentPreview.ship_zipcode,
-                    ship_phone: this.currentPreview.ship_phone,
-                    term_id: this.currentPreview.term_id,
-                    sales_rep_id: this.currentPreview.sales_rep_id,
-                    total_qty_ordered: this.currentPreview.total_qty_ordered,
-                    total_qty_shipped: this.currentPreview.total_qty_shipped,
-                    no_lines: this.currentPreview.no_lines,
-                    total_weight: this.currentPreview.total_weight,
-                    invoice_subtotal: this.currentPreview.invoice_subtotal,
-                    total_taxes: this.currentPreview.total_taxes,
-                    invoice_total: this.currentPreview.invoice_total
-                },
-                invoice_details: this.currentPreview.lines
+                preview_token: this.previewToken
             };
 
             const response = await api.createCopiedInvoice(invoiceData);
@@ -842,6 +820,7 @@ class InvoiceCopyManager {
         this.selectedInvoice = null;
         this.selectedCustomer = null;
         this.currentPreview = null;
+        this.previewToken = null;
         this.currentPage = 1;
         this.searchTerm = '';
         this.currentStep = 1;
@@ -3,6 +3,7 @@
 class PurchaseOrderManager {
     constructor() {
         this.currentPreview = null;
+        this.previewToken = null;
         this.selectedDatabaseId = null;
         this.selectedSupplier = null;
         this.uploadedFile = null;
@@ -62,7 +63,7 @@ class PurchaseOrderManager {
                         <select class="form-select" id="poDatabaseSelect" required>
                             <option value="">Select a database...</option>
                             ${databaseOptions.map(db => `
-                                <option value="${db.id}">${db.name} (${db.server}/${db.database})</option>
+                                <option value="${db.id}" ${db.available ? '' : 'disabled'}>${db.name} (${db.server}/${db.database})${db.available ? '' : ' - unreachable'}</option>
                             `).join('')}
                         </select>
                     </div>
@@ -114,8 +115,8 @@ class PurchaseOrderManager {
                         <i class="fas fa-cloud-upload-alt"></i>
                     </div>
                     <h5>Drop Excel file here or click to browse</h5>
-                    <p class="text-muted">Supported formats: .xlsx, .xls<br>Required columns: UPC, Cost, QTY</p>
-                    <input type="file" id="poFileInput" accept=".xlsx,.xls" class="d-none">
+                    <p class="text-muted">Supported formats: .xlsx, .xls, .csv, .tsv<br>Required columns: UPC, Cost, QTY</p>
+                    <input type="file" id="poFileInput" accept=".xlsx,.xls,.csv,.tsv" class="d-none">
                     <button type="button" class="btn btn-outline-primary" id="poBrowseButton">
                         <i class="fas fa-folder-open me-2"></i>Browse Files
                     </button>
@@ -399,13 +400,12 @@ class PurchaseOrderManager {
     handleFileSelection(file) {
         if (!file) return;
 
-        const allowedTypes = [
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'application/vnd.ms-excel'
-        ];
+        // Browsers report CSV files under several MIME types (or none), so check the extension
+        const allowedExtensions = ['xlsx', 'xls', 'csv', 'tsv'];
+        const extension = file.name.split('.').pop().toLowerCase();
 
-        if (!allowedTypes.includes(file.type)) {
-            authManager.showAlert('Please select a valid Excel file (.xlsx or .xls)', 'danger');
+        if (!allowedExtensions.includes(extension)) {
+            authManager.showAlert('Please select an Excel or CSV file (.xlsx, .xls, .csv or .tsv)', 'danger');
             return;
         }
 
@@ -436,10 +436,15 @@ class PurchaseOrderManager {
             const response = await api.uploadExcelPO(formData);
             
             this.currentPreview = response.preview;
+            this.previewToken = response.preview_token;
             this.renderPurchaseOrderPreview(response.preview, response.missing_upcs);
             this.activateStep(4);
             
-            authManager.showAlert('Excel file processed successfully', 'success');
+            const skipped = response.rejected_rows ? response.rejected_rows.count : 0;
+            authManager.showAlert(
+                skipped ? `Excel file processed successfully (${skipped} invalid rows skipped)` : 'Excel file processed successfully',
+                skipped ? 'warning' : 'success'
+            );
             
         } catch (error) {
             authManager.showAlert('Failed to process Excel file: ' + error.message, 'danger');
@@ -520,7 +525,7 @@ class PurchaseOrderManager {
                         <tbody>
                             ${preview.lines.map(line => `
                                 <tr>
-                                    <td>${line.ProductUPC}</td>
+                                    <td>${utils.formatUpcCell(line)}</td>
                                     <td>${line.ProductDescription || 'N/A'}</td>
                                     <td>${line.ItemSize || 'N/A'}</td>
                                     <td>$${line.UnitCost.toFixed(2)}</td>
@@ -570,7 +575,7 @@ class PurchaseOrderManager {
     }
 
     async createPurchaseOrder() {
-        if (!this.currentPreview || !this.selectedDatabaseId) {
+        if (!this.currentPreview || !this.previewToken) {
             authManager.showAlert('No purchase order data available', 'danger');
             return;
         }
@@ -581,34 +586,9 @@ class PurchaseOrderManager {
         try {
             authManager.showLoading(true);
             
+            // The full preview stays on the server; only its token is sent back
             const poData = {
-                database_config_id: this.selectedDatabaseId,
-                po_data: {
-                    po_number: this.currentPreview.po_number,
-                    po_date: this.currentPreview.po_date,
-                    required_date: this.currentPreview.required_date,
-                    po_title: this.currentPreview.po_title,
-                    status: this.currentPreview.status,
-                    supplier_id: this.currentPreview.supplier_id,
-                    business_name: this.currentPreview.business_name,
-                    account_no: this.currentPreview.account_no,
-                    ship_to: this.currentPreview.ship_to,
-                    ship_address1: this.currentPreview.ship_address1,
-                    ship_address2: this.currentPreview.ship_address2,
-                    ship_contact: this.currentPreview.ship_contact,
-                    ship_city: this.currentPreview.ship_city,
-                    ship_state: this.currentPreview.ship_state,
-                    ship_zipcode: this.currentPreview.ship_zipcode,
-                    ship_phone: this.currentPreview.ship_phone,
-                    employee_id: this.currentPreview.employee_id,
-                    term_id: this.currentPreview.term_id,
-                    shipper_id: this.currentPreview.shipper_id,
-                    total_qty_ordered: this.currentPreview.total_qty_ordered,
-                    total_qty_received: this.currentPreview.total_qty_received,
-                    no_lines: this.currentPreview.no_lines,
-                    po_total: this.currentPreview.po_total
-                },
-                po_details: this.currentPreview.lines
+                preview_token: this.previewToken
             };
 
             const response = await api.createPurchaseOrder(poData);
@@ -625,6 +605,7 @@ class PurchaseOrderManager {
 
     resetWorkflow() {
         this.currentPreview = null;
+        this.previewToken = null;
         this.selectedDatabaseId = null;
         this.selectedSupplier = null;
         this.uploadedFile = null;